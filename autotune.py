@@ -0,0 +1,207 @@
+"""
+按完成时间自动选择编码预设
+先用短样本测量本机在各x264预设下的编码吞吐量，再为每个文件选择
+能在截止时间前完成整批任务的最慢（压缩效率最高）预设。
+转码过程中根据实际耗时修正吞吐量模型，并定期重新分配剩余文件的预设。
+此模块不依赖tkinter。
+"""
+
+import datetime
+import heapq
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from job_planner import PRESET_COST
+from sample_preview import sample_command, sample_offsets
+
+# 从慢到快排列的预设，最慢不超过所选质量等级自身的预设
+PRESET_LADDER = ["veryslow", "slower", "slow", "medium", "fast", "faster", "veryfast", "ultrafast"]
+
+# 每个预设的校准样本时长（秒）
+CALIBRATION_SECONDS = 2
+
+# 重新分配剩余文件预设的最小间隔（秒）
+RETUNE_INTERVAL = 30.0
+
+# 实测吞吐量修正模型时的权重
+LEARNING_RATE = 0.3
+
+
+def parse_deadline(text, now=None):
+    """
+    解析完成时间
+
+    支持 "HH:MM"（今天，已过去时为明天）和 "YYYY-MM-DD HH:MM"，返回时间戳；格式错误时抛出ValueError
+    """
+    text = text.strip()
+    now = now or datetime.datetime.now()
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    clock = datetime.datetime.strptime(text, "%H:%M")
+    target = now.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return target.timestamp()
+
+
+def with_preset(params, preset):
+    """返回把 -preset 的值替换为 preset 的参数列表副本"""
+    params = list(params)
+    if "-preset" in params:
+        index = params.index("-preset")
+        if index + 1 < len(params):
+            params[index + 1] = preset
+    return params
+
+
+def ladder_from(preset):
+    """返回从指定预设开始、依次更快的预设列表"""
+    if preset not in PRESET_LADDER:
+        return [preset]
+    return PRESET_LADDER[PRESET_LADDER.index(preset):]
+
+
+def plan_work(plan):
+    """返回计划的编码工作量（目标像素数 × 时长），未知时返回None"""
+    if plan.target_width and plan.target_height and plan.duration:
+        return plan.target_width * plan.target_height * plan.duration
+    return None
+
+
+class DeadlineTuner:
+    """在截止时间内为每个文件选择预设"""
+
+    def __init__(self, deadline, base_preset, jobs, log=print):
+        """
+        参数:
+            deadline: 截止时间戳
+            base_preset: 质量等级对应的预设，也是可选的最慢预设
+            jobs: 并发任务数
+            log: 日志回调函数
+        """
+        self.deadline = deadline
+        self.ladder = ladder_from(base_preset)
+        self.jobs = max(1, jobs)
+        self.log = log
+        self.throughput = {}  # 预设 -> 单个任务每秒完成的工作量（像素·秒）
+        self.pending = {}  # 尚未开始的文件 -> 工作量
+        self.running = {}  # 正在编码的文件 -> (开始时间, 预计耗时, 预设, 工作量)
+        self.segmented = set()  # 分段编码的文件同时占用全部并发任务
+        self.assignment = {}
+        self.assigned_at = None
+        self._lock = threading.Lock()
+
+    def calibrate(self, engine, plans, threads):
+        """用工作量最大的需重新编码文件测量各预设的吞吐量"""
+        candidates = [p for p in plans if not p.stream_plan.video_copy and plan_work(p)]
+        for plan in candidates:
+            self.pending[plan.input_file] = plan_work(plan)
+            if plan.segmented:
+                self.segmented.add(plan.input_file)
+        if not candidates:
+            return
+        plan = max(candidates, key=plan_work)
+
+        temp_dir = tempfile.mkdtemp(prefix="video_converter_calibrate_")
+        try:
+            start, length = sample_offsets(plan.duration, 1, CALIBRATION_SECONDS)[0]
+            for preset in self.ladder:
+                engine.preset_overrides[plan.input_file] = preset
+                cmd = engine.build_command(plan.input_file, plan.output_file, threads)
+                sample_file = os.path.join(temp_dir, f"calibrate_{preset}.{engine.settings.output_format}")
+                started = time.perf_counter()
+                return_code = engine.run_ffmpeg(sample_command(cmd, start, length, sample_file),
+                                                plan.input_file, duration=length, on_snapshot=lambda snapshot: None)
+                elapsed = time.perf_counter() - started
+                if return_code == 0 and elapsed > 0:
+                    self.throughput[preset] = plan.target_width * plan.target_height * length / elapsed
+                    self.log(f"校准 {preset}: {length / elapsed:.2f}x 实时")
+        finally:
+            engine.preset_overrides.pop(plan.input_file, None)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        self._fill_missing()
+
+    def _fill_missing(self):
+        """校准失败的预设按典型的相对耗时从已测得的预设推算"""
+        if not self.throughput:
+            return
+        reference, value = next(iter(self.throughput.items()))
+        for preset in self.ladder:
+            if preset not in self.throughput:
+                self.throughput[preset] = value * PRESET_COST.get(reference, 1.0) / PRESET_COST.get(preset, 1.0)
+
+    def _retune(self, now):
+        """重新为尚未开始的文件分配预设，使预计总耗时不超过剩余时间"""
+        # 剩余可用的任务时间：并发任务数 × 剩余时间，减去正在编码的文件预计还需的时间
+        budget = self.jobs * (self.deadline - now)
+        for started, expected, _, _ in self.running.values():
+            budget -= max(0.0, expected - (now - started))
+
+        levels = {path: 0 for path in self.pending}
+        total = sum(work / self.throughput[self.ladder[0]] for work in self.pending.values())
+
+        # 每次把节省时间最多的文件换成更快一级的预设，直到预计耗时不超过剩余时间
+        heap = []
+        for path, work in self.pending.items():
+            self._push_step(heap, path, work, 0)
+        while total > budget and heap:
+            saving, path, level = heapq.heappop(heap)
+            levels[path] = level + 1
+            total += saving  # saving 为负数
+            self._push_step(heap, path, self.pending[path], level + 1)
+
+        self.assignment = {path: self.ladder[level] for path, level in levels.items()}
+        self.assigned_at = now
+        if total > budget:
+            self.log("警告: 即使全部使用最快的预设也无法在截止时间前完成")
+
+    def _push_step(self, heap, path, work, level):
+        if level + 1 < len(self.ladder):
+            saving = work / self.throughput[self.ladder[level + 1]] - work / self.throughput[self.ladder[level]]
+            heapq.heappush(heap, (saving, path, level))
+
+    def choose(self, input_file):
+        """文件开始编码前调用，返回为其选择的预设；无法估算时返回None（使用质量等级的预设）"""
+        with self._lock:
+            if not self.throughput or input_file not in self.pending:
+                return None
+            now = time.time()
+            if self.assigned_at is None or now - self.assigned_at >= RETUNE_INTERVAL:
+                self._retune(now)
+            preset = self.assignment.get(input_file, self.ladder[-1])
+            work = self.pending.pop(input_file)
+            self.running[input_file] = (now, work / self.throughput[preset], preset, work)
+            return preset
+
+    def discard(self, input_file):
+        """文件在开始前被取消时调用，不再为其预留时间"""
+        with self._lock:
+            if self.pending.pop(input_file, None) is not None:
+                self.assigned_at = None
+
+    def finish(self, input_file, success):
+        """文件编码结束后调用，用实际耗时修正吞吐量模型；跳过或失败的文件不参与修正"""
+        with self._lock:
+            entry = self.running.pop(input_file, None)
+            if not entry or not success:
+                return
+            started, expected, preset, work = entry
+            elapsed = time.time() - started
+            if input_file in self.segmented:
+                elapsed *= self.jobs  # 换算为单个任务的耗时
+            if elapsed <= 0:
+                return
+            # 实测与预计的比值同样作用于其他预设，反映机器负载等整体变化
+            ratio = (work / elapsed) / self.throughput[preset]
+            for name in self.throughput:
+                self.throughput[name] *= ratio ** LEARNING_RATE
+            # 模型变化较大时尽快重新分配
+            if abs(ratio - 1) > 0.2:
+                self.assigned_at = None
+
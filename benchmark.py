@@ -0,0 +1,264 @@
+"""
+转码性能基准测试
+使用ffmpeg的lavfi测试源在本地生成确定性的720p/1080p/4K测试片段，
+用与正式转码相同的命令构建逻辑测量各质量等级和超分设置的编码速度，
+结果保存为JSON，并可与保存的基线比较以发现性能退化。
+此模块不依赖tkinter。
+
+示例:
+    python benchmark.py run --output bench.json
+    python benchmark.py compare baseline.json bench.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from converter_engine import (
+    ConversionSettings, ConverterEngine, find_ffmpeg,
+    QUALITY_LEVELS, SR_SCALES, SR_ALGORITHMS,
+)
+from encode_pool import cpu_count
+from probe_cache import cache_dir
+from process_usage import wait_with_rusage
+
+# Windows下隐藏子进程的控制台窗口
+CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+# 测试片段的分辨率
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+# 测试片段的帧率和默认时长（秒）
+CLIP_FPS = 30
+DEFAULT_DURATION = 5
+
+# 超分测试使用的源分辨率，避免在4K上放大到无意义的尺寸
+SR_SOURCE = "720p"
+
+# 比较时默认允许的性能下降比例
+DEFAULT_THRESHOLD = 0.10
+
+
+def clip_path(clip_dir, resolution, duration):
+    return os.path.join(clip_dir, f"bench_{resolution}_{duration}s.mp4")
+
+
+def generate_clip(ffmpeg_path, path, resolution, duration):
+    """生成确定性的测试片段（已存在时直接复用）"""
+    if os.path.exists(path):
+        return True
+    width, height = RESOLUTIONS[resolution]
+    cmd = [
+        ffmpeg_path, "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={CLIP_FPS}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        # 单线程和bitexact保证每台机器生成的片段完全相同
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p", "-threads", "1",
+        "-c:a", "aac", "-b:a", "128k",
+        "-fflags", "+bitexact", "-flags", "+bitexact",
+        "-y", path + ".tmp.mp4"
+    ]
+    result = subprocess.run(cmd, stdin=subprocess.DEVNULL, creationflags=CREATE_NO_WINDOW)
+    if result.returncode != 0:
+        return False
+    os.replace(path + ".tmp.mp4", path)
+    return True
+
+
+def ffmpeg_version(ffmpeg_path):
+    try:
+        result = subprocess.run([ffmpeg_path, "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True, creationflags=CREATE_NO_WINDOW)
+        return result.stdout.splitlines()[0] if result.stdout else None
+    except OSError:
+        return None
+
+
+def build_cases(resolutions, include_sr=True):
+    """生成测试用例：各分辨率下的三个质量等级，以及超分算法和倍率的组合"""
+    cases = []
+    for resolution in resolutions:
+        for quality in QUALITY_LEVELS:
+            cases.append({"name": f"{resolution}/{quality}", "resolution": resolution,
+                          "quality": quality, "sr_scale": None, "sr_algorithm": None})
+    if include_sr:
+        for algorithm in SR_ALGORITHMS:
+            for scale in SR_SCALES:
+                cases.append({"name": f"{SR_SOURCE}/低/SR{scale}/{algorithm}", "resolution": SR_SOURCE,
+                              "quality": "低", "sr_scale": scale, "sr_algorithm": algorithm})
+    return cases
+
+
+def run_case(ffmpeg_path, case, input_file, duration, work_dir, threads):
+    """使用正式的命令构建逻辑运行一个用例，返回测量结果"""
+    settings = ConversionSettings(
+        output_dir=work_dir,
+        quality=case["quality"],
+        sr_enabled=bool(case["sr_scale"]),
+        sr_scale=case["sr_scale"] or "2x",
+        sr_algorithm=case["sr_algorithm"] or "lanczos",
+        skip_up_to_date=False,
+        allow_stream_copy=False,  # 测量编码速度，不允许直接复制
+    )
+    engine = ConverterEngine(ffmpeg_path, settings, log=lambda message: None)
+    output_file = os.path.join(work_dir, "bench_output.mp4")
+    cmd = engine.build_command(input_file, output_file, threads)
+
+    started = time.perf_counter()
+    process = subprocess.Popen(cmd[:1] + ["-v", "error"] + cmd[1:], stdin=subprocess.DEVNULL,
+                               creationflags=CREATE_NO_WINDOW)
+    return_code, usage = wait_with_rusage(process)
+    elapsed = time.perf_counter() - started
+
+    output_bytes = os.path.getsize(output_file) if os.path.exists(output_file) else None
+    if os.path.exists(output_file):
+        os.remove(output_file)
+
+    frames = duration * CLIP_FPS
+    return dict(case, **{
+        "return_code": return_code,
+        "elapsed": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2) if elapsed else None,
+        "speed": round(duration / elapsed, 3) if elapsed else None,
+        "cpu_user": round(usage["cpu_user"], 3) if usage else None,
+        "cpu_sys": round(usage["cpu_sys"], 3) if usage else None,
+        "peak_rss_mb": round(usage["peak_rss"] / 1024 / 1024, 1) if usage else None,
+        "output_bytes": output_bytes,
+    })
+
+
+def run_benchmark(args):
+    ffmpeg_path = args.ffmpeg or find_ffmpeg(log=lambda message: None)
+    if not ffmpeg_path:
+        print("错误: 未找到FFmpeg，无法运行基准测试", file=sys.stderr)
+        return 2
+
+    clip_dir = args.clip_dir or os.path.join(cache_dir(), "bench_clips")
+    os.makedirs(clip_dir, exist_ok=True)
+    threads = args.threads or cpu_count()
+    cases = build_cases(args.resolutions, include_sr=not args.no_sr)
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="video_converter_bench_")
+    try:
+        for resolution in sorted({c["resolution"] for c in cases}):
+            path = clip_path(clip_dir, resolution, args.duration)
+            print(f"准备测试片段: {resolution}", file=sys.stderr)
+            if not generate_clip(ffmpeg_path, path, resolution, args.duration):
+                print(f"错误: 无法生成测试片段 {resolution}", file=sys.stderr)
+                return 2
+
+        for case in cases:
+            path = clip_path(clip_dir, case["resolution"], args.duration)
+            result = run_case(ffmpeg_path, case, path, args.duration, work_dir, threads)
+            results.append(result)
+            print(f"{case['name']}: {result['fps']} fps, {result['speed']}x, "
+                  f"峰值内存 {result['peak_rss_mb']} MB", file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": cpu_count(),
+            "ffmpeg": ffmpeg_version(ffmpeg_path),
+        },
+        "duration": args.duration,
+        "threads": threads,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if all(r["return_code"] == 0 for r in results) else 1
+
+
+def compare_reports(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    比较两份基准测试结果
+
+    返回:
+        退化项列表，每项包含用例名、指标、基线值和当前值
+    """
+    baseline_results = {r["name"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in current.get("results", []):
+        base = baseline_results.get(result["name"])
+        if not base:
+            continue
+        if base["return_code"] == 0 and result["return_code"] != 0:
+            regressions.append({"name": result["name"], "metric": "return_code",
+                                "baseline": base["return_code"], "current": result["return_code"]})
+            continue
+        # 越高越好的指标下降超过阈值，或越低越好的指标上升超过阈值，视为退化
+        for metric, higher_is_better in (("fps", True), ("peak_rss_mb", False), ("output_bytes", False)):
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append({"name": result["name"], "metric": metric, "baseline": old,
+                                    "current": new, "change": round(change, 3)})
+    return regressions
+
+
+def compare_benchmark(args):
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    regressions = compare_reports(baseline, current, args.threshold)
+    for item in regressions:
+        change = f"{item['change'] * 100:+.1f}%" if "change" in item else ""
+        print(f"退化: {item['name']} {item['metric']} {item['baseline']} -> {item['current']} {change}")
+    if not regressions:
+        print(f"未发现超过 {args.threshold * 100:.0f}% 的性能退化")
+    return 1 if regressions else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="视频转码性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="运行基准测试")
+    run.add_argument("--output", help="结果JSON文件（默认输出到标准输出）")
+    run.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS),
+                     help="测试的分辨率")
+    run.add_argument("--duration", type=int, default=DEFAULT_DURATION, help="测试片段时长（秒）")
+    run.add_argument("--threads", type=int, help="编码线程数（默认使用全部核心）")
+    run.add_argument("--no-sr", action="store_true", help="不测试超分辨率")
+    run.add_argument("--clip-dir", help="测试片段的保存目录")
+    run.add_argument("--ffmpeg", help="ffmpeg可执行文件路径（默认自动查找）")
+    run.set_defaults(func=run_benchmark)
+
+    compare = subparsers.add_parser("compare", help="与基线比较")
+    compare.add_argument("baseline", help="基线结果JSON文件")
+    compare.add_argument("current", help="当前结果JSON文件")
+    compare.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="允许的性能变化比例")
+    compare.set_defaults(func=compare_benchmark)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+"""
+视频批量转码命令行入口
+用于无显示器的渲染服务器和定时任务，不导入tkinter及tkinterdnd2。
+
+示例:
+    python converter_cli.py --input-dir /data/in --output-dir /data/out --quality 中 --sr 2x --jobs 8 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from converter_engine import (
+    ConversionSettings, ConverterEngine, find_ffmpeg, is_video_file,
+    OUTPUT_FORMATS, SR_ALGORITHMS,
+)
+from autotune import parse_deadline
+from distributed import (
+    DEFAULT_HOST, DEFAULT_PORT, Coordinator, DistributedWorker, is_loopback, parse_listen, parse_path_map,
+)
+from ffmpeg_caps import ENCODER_CHOICES, SCALER_CHOICES
+from file_scanner import FileSet, iter_directory, scan_paths
+from job_journal import JobJournal
+from job_planner import DEFAULT_JOB_ORDER, JOB_ORDERS
+from pipe_sr import DEFAULT_UPSCALER, SR_ENGINES, UPSCALERS
+from probe_cache import ProbeCache
+from renditions import check_duplicates, parse_rendition
+from sample_preview import describe_preview, run_sample_preview
+from telemetry import TelemetrySink
+from watch_folder import POLL_INTERVAL, STABLE_SECONDS, WatchService
+from progress import format_eta
+from staging import DEFAULT_PREFETCH
+
+# 命令行模式下输出总进度的最小间隔（秒）
+PROGRESS_INTERVAL = 5.0
+
+# 命令行中可以用英文别名指定质量
+QUALITY_ALIASES = {
+    "低": "低", "low": "低",
+    "中": "中", "medium": "中",
+    "高": "高", "high": "高",
+}
+
+
+def log_stderr(message):
+    """日志写入标准错误，保证标准输出只包含结果"""
+    print(message, file=sys.stderr, flush=True)
+
+
+def collect_input_files(input_dirs, files, recursive=False):
+    """
+    收集输入目录中的视频文件和直接指定的文件，去除重复项并保持顺序
+
+    直接指定的目录总是递归扫描，文件清单（.txt/.lst/.json）中的路径被导入；
+    --input-dir 只在 recursive 为True时递归
+    """
+    collected = FileSet()
+    for input_dir in input_dirs:
+        if recursive:
+            paths = iter_directory(input_dir)
+        else:
+            paths = (os.path.join(input_dir, entry) for entry in sorted(os.listdir(input_dir)))
+        collected.add_many(p for p in paths if os.path.isfile(p) and is_video_file(p))
+    on_error = lambda path, e: log_stderr(f"无法读取文件清单 {path}: {str(e)}")
+    for chunk in scan_paths(files, is_video_file, on_error=on_error):
+        collected.add_many(chunk)
+    return list(collected)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="视频批量转码工具（命令行模式）")
+    parser.add_argument("files", nargs="*", help="要转码的视频文件、目录（递归扫描）或文件清单（.txt/.lst/.json）")
+    parser.add_argument("--input-dir", action="append", default=[], help="输入目录，可多次指定")
+    parser.add_argument("--recursive", action="store_true", help="递归扫描 --input-dir 的子目录")
+    parser.add_argument("--output-dir", default="converted_videos", help="输出目录（默认: converted_videos）")
+    parser.add_argument("--format", default="mp4", choices=OUTPUT_FORMATS, help="输出格式")
+    parser.add_argument("--quality", default="高", choices=sorted(QUALITY_ALIASES), help="输出质量")
+    parser.add_argument("--sr", metavar="SCALE", help="启用超分辨率并指定倍率，例如 2x")
+    parser.add_argument("--sr-algorithm", default="lanczos", choices=SR_ALGORITHMS, help="超分算法")
+    parser.add_argument("--sr-engine", default="ffmpeg", choices=SR_ENGINES,
+                        help="超分引擎：ffmpeg 使用缩放滤镜，pipe 把原始帧交给Python放大器多进程处理（需要NumPy）")
+    parser.add_argument("--sr-upscaler", default=DEFAULT_UPSCALER, metavar="NAME",
+                        help=f"pipe 引擎的放大器：{'、'.join(UPSCALERS)}，或 模块:函数 形式的自定义放大器（默认: {DEFAULT_UPSCALER}）")
+    parser.add_argument("--jobs", type=int, help="并发任务数（默认根据CPU核心数决定）")
+    parser.add_argument("--encoder", default="auto", choices=ENCODER_CHOICES,
+                        help="H.264编码器（默认auto: 使用本机最快的可用编码器）")
+    parser.add_argument("--scaler", default="auto", choices=SCALER_CHOICES,
+                        help="超分缩放滤镜（默认auto: 可用时使用zscale）")
+    parser.add_argument("--rendition", action="append", default=[], metavar="SPEC",
+                        help="多路输出：每个文件只解码一次，同时输出多个版本，可多次指定；"
+                             "SPEC 为冒号分隔的倍率、质量和格式，例如 1x:高:mp4 或 2x:中:mkv，省略的部分沿用上面的设置")
+    parser.add_argument("--ffmpeg", help="ffmpeg可执行文件路径（默认自动查找）")
+    parser.add_argument("--segment-min-duration", type=float, metavar="SECONDS",
+                        help="时长达到该值（秒）的文件在关键帧处分段并行编码")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="超分任务的内存预算（MB，默认为可用内存的80%%）")
+    parser.add_argument("--order", default=DEFAULT_JOB_ORDER, choices=JOB_ORDERS,
+                        help="调度顺序：longest 估算成本高的先处理，shortest 成本低的先处理，input 按输入顺序")
+    parser.add_argument("--finish-by", metavar="TIME",
+                        help="完成时间（HH:MM 或 YYYY-MM-DD HH:MM），按截止时间为每个文件自动选择编码预设")
+    parser.add_argument("--force", action="store_true", help="重新转码所有文件，不跳过已是最新的输出")
+    parser.add_argument("--no-copy", action="store_true", help="始终重新编码，不直接复制已符合要求的流")
+    parser.add_argument("--no-probe-cache", action="store_true", help="不使用持久化的元数据缓存")
+    parser.add_argument("--watch", action="store_true",
+                        help="持续监视输入目录，文件写入完成后自动转码，按 Ctrl+C 停止")
+    parser.add_argument("--stable-seconds", type=float, default=STABLE_SECONDS, metavar="SECONDS",
+                        help=f"监视模式下文件大小和修改时间保持不变多久后视为写入完成（默认 {STABLE_SECONDS:g}）")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL, metavar="SECONDS",
+                        help=f"监视模式下扫描输入目录的间隔（默认 {POLL_INTERVAL:g}）")
+    parser.add_argument("--resume", action="store_true",
+                        help="恢复最近一个被中断的批次，只转码未完成的文件（使用该批次保存的设置）")
+    parser.add_argument("--no-journal", action="store_true", help="不记录任务日志（无法在中断后恢复）")
+    parser.add_argument("--telemetry-dir", metavar="DIR",
+                        help="任务性能记录（jobs.jsonl）和Prometheus指标文件（video_converter.prom）的目录，"
+                             "默认为缓存目录下的 telemetry")
+    parser.add_argument("--no-telemetry", action="store_true", help="不记录任务性能数据")
+    parser.add_argument("--preview", action="store_true",
+                        help="只编码几段短样本，报告编码速度并推算整个文件的耗时和大小，不进行转码")
+    parser.add_argument("--scratch-dir", metavar="DIR",
+                        help="本地暂存目录：输入或输出在网络共享上时，预取接下来的输入到本地磁盘编码，"
+                             "输出在后台复制到输出目录")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH, metavar="N",
+                        help=f"使用 --scratch-dir 时提前复制到本地的输入文件数（默认 {DEFAULT_PREFETCH}）")
+    parser.add_argument("--coordinator", action="store_true",
+                        help="分布式模式：作为协调器把文件分配给工作节点转码，本机不转码")
+    parser.add_argument("--listen", default=f"{DEFAULT_HOST}:{DEFAULT_PORT}", metavar="HOST:PORT",
+                        help=f"协调器的监听地址（默认: {DEFAULT_HOST}:{DEFAULT_PORT}，只接受本机的工作节点；"
+                             "其他机器的节点需要 --listen 0.0.0.0:端口，此时必须设置 --token）")
+    parser.add_argument("--worker", metavar="URL",
+                        help="分布式模式：作为工作节点从协调器领取任务，例如 http://render01:8765；"
+                             "转码设置由协调器提供，--jobs 和 --memory-budget 按本机设置")
+    parser.add_argument("--worker-name", help="工作节点的名称（默认: 主机名:进程号）")
+    parser.add_argument("--path-map", action="append", default=[], metavar="SRC=DST",
+                        help="工作节点的路径映射：协调器上以 SRC 开头的路径在本机换算为 DST 开头，可多次指定")
+    parser.add_argument("--token", default=os.environ.get("VIDEO_CONVERTER_TOKEN"),
+                        help="协调器和工作节点之间的共享令牌（默认读取环境变量 VIDEO_CONVERTER_TOKEN）")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    return parser
+
+
+def run_worker(args):
+    """工作节点模式：转码设置由协调器提供，直到批次结束"""
+    try:
+        path_map = parse_path_map(args.path_map)
+    except ValueError as e:
+        log_stderr(f"错误: {str(e)}")
+        return 2
+    ffmpeg_path = args.ffmpeg or find_ffmpeg(log=log_stderr)
+    if not ffmpeg_path:
+        log_stderr("错误: 未找到FFmpeg，无法进行转码")
+        return 2
+
+    worker = DistributedWorker(args.worker, name=args.worker_name, token=args.token, path_map=path_map,
+                               log=log_stderr)
+    try:
+        settings = worker.register()
+    except ConnectionError as e:
+        log_stderr(f"错误: {str(e)}")
+        return 2
+    # 并发任务数和内存预算取决于本机
+    settings.jobs = args.jobs
+    settings.memory_budget_mb = args.memory_budget
+    os.makedirs(settings.output_dir, exist_ok=True)
+
+    probe_cache = None if args.no_probe_cache else ProbeCache()
+    telemetry = None if args.no_telemetry else TelemetrySink(args.telemetry_dir)
+    engine = ConverterEngine(ffmpeg_path, settings, log=log_stderr, on_progress=worker.on_progress,
+                             probe_cache=probe_cache, telemetry=telemetry)
+    try:
+        succeeded, failed = worker.run(engine)
+    except KeyboardInterrupt:
+        log_stderr("已中断，未完成的任务由协调器交给其他节点")
+        return 130
+    print(f"工作节点结束: {succeeded} 个任务成功，{failed} 个失败")
+    return 0 if failed == 0 else 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.worker:
+        return run_worker(args)
+    if args.coordinator and (args.watch or args.preview):
+        log_stderr("错误: 协调器模式不能与 --watch 或 --preview 同时使用")
+        return 2
+    if args.scratch_dir and (args.watch or args.preview or args.coordinator):
+        log_stderr("错误: --scratch-dir 只用于本机的批量转码，不能与 --watch、--preview 或 --coordinator 同时使用")
+        return 2
+    if args.scratch_dir:
+        try:
+            os.makedirs(args.scratch_dir, exist_ok=True)
+        except OSError as e:
+            log_stderr(f"错误: 无法创建暂存目录 {args.scratch_dir}: {str(e)}")
+            return 2
+
+    journal = None if args.no_journal or args.watch or args.preview else JobJournal()
+    resume = None
+    if args.resume:
+        resume = journal.unfinished_batch() if journal else None
+        if not resume:
+            log_stderr("错误: 没有可恢复的批次")
+            return 2
+        video_files = resume[2]
+    elif args.watch:
+        if not args.input_dir:
+            log_stderr("错误: 监视模式需要用 --input-dir 指定输入目录")
+            return 2
+        video_files = []
+    else:
+        video_files = collect_input_files(args.input_dir, args.files, args.recursive)
+        if not video_files:
+            log_stderr("错误: 没有找到要转码的视频文件")
+            return 2
+
+    ffmpeg_path = args.ffmpeg or find_ffmpeg(log=log_stderr)
+    if not ffmpeg_path:
+        log_stderr("错误: 未找到FFmpeg，无法进行转码")
+        return 2
+
+    deadline = None
+    if args.finish_by:
+        try:
+            deadline = parse_deadline(args.finish_by)
+        except ValueError:
+            log_stderr(f"错误: 无法解析完成时间: {args.finish_by}")
+            return 2
+
+    try:
+        parsed = check_duplicates([parse_rendition(spec, OUTPUT_FORMATS, QUALITY_ALIASES) for spec in args.rendition])
+        renditions = [rendition.to_dict() for rendition in parsed]
+    except ValueError as e:
+        log_stderr(f"错误: {str(e)}")
+        return 2
+
+    listen = None
+    if args.coordinator:
+        try:
+            listen = parse_listen(args.listen)
+        except ValueError:
+            log_stderr(f"错误: 无法解析监听地址: {args.listen}")
+            return 2
+        if not args.token and not is_loopback(listen[0]):
+            log_stderr(f"错误: 监听 {listen[0]} 时必须设置共享令牌（--token 或环境变量 VIDEO_CONVERTER_TOKEN）")
+            return 2
+
+    if resume:
+        settings = ConversionSettings.from_dict(resume[1])
+        if args.scratch_dir:
+            # 暂存目录是本机的设置，恢复批次时可以更换
+            settings.scratch_dir = os.path.abspath(args.scratch_dir)
+            settings.prefetch_count = args.prefetch
+    else:
+        settings = ConversionSettings(
+            output_dir=os.path.abspath(args.output_dir),
+            output_format=args.format,
+            quality=QUALITY_ALIASES[args.quality],
+            sr_enabled=bool(args.sr),
+            sr_scale=args.sr or "2x",
+            sr_algorithm=args.sr_algorithm,
+            jobs=args.jobs,
+            skip_up_to_date=not args.force,
+            allow_stream_copy=not args.no_copy,
+            segment_min_duration=args.segment_min_duration,
+            memory_budget_mb=args.memory_budget,
+            job_order=args.order,
+            deadline=deadline,
+            encoder=args.encoder,
+            scaler=args.scaler,
+            renditions=renditions or None,
+            sr_engine=args.sr_engine,
+            sr_upscaler=args.sr_upscaler,
+            scratch_dir=os.path.abspath(args.scratch_dir) if args.scratch_dir else None,
+            prefetch_count=args.prefetch,
+        )
+    os.makedirs(settings.output_dir, exist_ok=True)
+    probe_cache = None if args.no_probe_cache else ProbeCache()
+    last_report = [0.0]
+
+    def on_progress(input_file, file_progress, batch_progress):
+        now = time.time()
+        if batch_progress and now - last_report[0] >= PROGRESS_INTERVAL:
+            last_report[0] = now
+            log_stderr(f"[总进度 {batch_progress['percent']:.1f}%] 剩余约 {format_eta(batch_progress['eta'])}")
+
+    telemetry = None if args.no_telemetry or args.preview else TelemetrySink(args.telemetry_dir)
+    engine = ConverterEngine(ffmpeg_path, settings, log=log_stderr, on_progress=on_progress, probe_cache=probe_cache,
+                             telemetry=telemetry)
+
+    if args.watch:
+        def on_watch_finish(input_file, success, latency):
+            log_stderr(f"{'成功' if success else '失败'}: {input_file}（发现后 {latency:.1f} 秒完成）")
+
+        WatchService(engine, args.input_dir, is_video_file, stable_seconds=args.stable_seconds,
+                     poll_interval=args.poll_interval, on_finish=on_watch_finish).run()
+        return 0
+
+    if args.preview:
+        engine.prepare_metadata(video_files)
+        previews = []
+        for input_file in video_files:
+            result = run_sample_preview(engine, input_file)
+            previews.append(result)
+            log_stderr(describe_preview(result))
+        if args.json:
+            json.dump({"settings": settings.to_dict(), "previews": previews}, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write("\n")
+        return 0 if all(r["success"] for r in previews) else 1
+
+    def on_finish(input_file, success, progress):
+        state = progress.snapshot()
+        status = "成功" if success else ("取消" if input_file in engine.cancelled_files else "失败")
+        log_stderr(f"[{state['completed']}/{state['total']}] {status}: {input_file}")
+
+    coordinator = None
+    if args.coordinator:
+        try:
+            coordinator = Coordinator(engine, *listen, token=args.token)
+        except (OSError, ValueError) as e:
+            log_stderr(f"错误: 无法监听 {args.listen}: {str(e)}")
+            return 2
+
+    try:
+        if coordinator:
+            progress, results = coordinator.run(video_files, on_finish=on_finish, journal=journal,
+                                                batch_id=resume[0] if resume else None)
+        else:
+            progress, results = engine.run_batch(video_files, on_finish=on_finish, journal=journal,
+                                                 batch_id=resume[0] if resume else None)
+    except KeyboardInterrupt:
+        # 正在运行的ffmpeg已被终止，不完整的输出已删除
+        log_stderr("已中断" + ("，可使用 --resume 继续未完成的文件" if journal else ""))
+        return 130
+
+    if args.json:
+        json.dump({
+            "settings": settings.to_dict(),
+            "total": progress.total,
+            "succeeded": progress.succeeded,
+            "failed": progress.failed,
+            "skipped": sum(1 for r in results if r["skipped"]),
+            "results": results,
+        }, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print(f"转码完成: {progress.succeeded}/{progress.total} 个文件成功转码")
+
+    return 0 if progress.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1287 @@
+"""
+转码引擎
+包含与界面无关的全部转码逻辑：查找ffmpeg、构建ffmpeg参数、执行转码和批量调度。
+此模块不依赖tkinter，图形界面和命令行入口都基于它实现。
+"""
+
+import contextlib
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from autotune import DeadlineTuner, with_preset
+from encode_pool import BatchProgress, EncodePool, cpu_count, default_job_count
+from ffmpeg_caps import (
+    ENCODER_MAX_JOBS, ENCODER_PIX_FMTS, choose_encoder, choose_scaler, encoder_params, find_ffprobe,
+    load_capabilities, scale_filter,
+)
+from job_planner import DEFAULT_JOB_ORDER, order_jobs, plan_job, plan_jobs, preset_of
+from job_scheduler import NORMAL_PRIORITY, JobScheduler, resume_process, suspend_process
+from memory_governor import MemoryGovernor, estimate_encode_memory, is_oom_exit
+from output_manifest import OutputManifest, command_hash, partial_path
+from pipe_sr import DEFAULT_UPSCALER, PipeSuperResolution, target_size
+from probe_cache import display_size, probe_files
+from process_usage import wait_with_rusage
+from progress import PROGRESS_ARGS, BatchEta, ProgressParser, frame_snapshot
+from renditions import Rendition, expand_renditions
+from segment_encode import SegmentEncoder
+from staging import DEFAULT_PREFETCH, StagingArea, estimate_output_size, file_size
+from stream_planner import plan_streams
+from telemetry import add_process_usage, describe_record, job_record, new_job_stats
+
+# 支持的输入视频扩展名
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv', '.m4v', '.wmv', '.flv', '.webm']
+
+# 可选的输出格式、质量、超分倍率和超分算法
+OUTPUT_FORMATS = ["mp4", "mov", "avi", "mkv"]
+QUALITY_LEVELS = ["低", "中", "高"]
+SR_SCALES = ["1.5x", "2x", "3x", "4x"]
+SR_ALGORITHMS = ["lanczos", "bicubic", "bilinear", "neighbor"]
+
+# 各质量等级对应的视频和音频编码参数
+VIDEO_QUALITY_PARAMS = {
+    "高": ["-c:v", "libx264", "-preset", "slow", "-crf", "18"],
+    "中": ["-c:v", "libx264", "-preset", "medium", "-crf", "23"],
+    "低": ["-c:v", "libx264", "-preset", "fast", "-crf", "28"],
+}
+AUDIO_QUALITY_PARAMS = {
+    "高": ["-c:a", "aac", "-b:a", "192k"],
+    "中": ["-c:a", "aac", "-b:a", "128k"],
+    "低": ["-c:a", "aac", "-b:a", "96k"],
+}
+
+# Windows下隐藏子进程的控制台窗口
+CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+# 日志中逐个列出任务计划的最大文件数
+PLAN_LOG_LIMIT = 20
+
+
+def is_video_file(file_path):
+    """检查文件是否为视频文件"""
+    _, ext = os.path.splitext(file_path.lower())
+    return ext in VIDEO_EXTENSIONS
+
+
+def find_ffmpeg(log=print):
+    """
+    在程序目录和PATH中查找ffmpeg
+
+    返回:
+        ffmpeg可执行文件路径，未找到时返回None
+    """
+    try:
+        if os.name == 'nt':  # Windows
+            # 优先使用程序目录下的ffmpeg
+            local_ffmpeg = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ffmpeg.exe')
+            if os.path.exists(local_ffmpeg):
+                log(f"找到本地ffmpeg: {local_ffmpeg}")
+                return local_ffmpeg
+
+        # 直接在PATH中查找，不启动 which/where 子进程
+        ffmpeg_path = shutil.which('ffmpeg')
+        if ffmpeg_path:
+            log(f"找到系统ffmpeg: {ffmpeg_path}")
+        return ffmpeg_path
+    except Exception as e:
+        log(f"检查ffmpeg出错: {str(e)}")
+        return None
+
+
+def ffprobe_path_for(ffmpeg_path):
+    """根据ffmpeg路径推断配套的ffprobe路径"""
+    return find_ffprobe(ffmpeg_path)
+
+
+def parse_scale(scale_str, default=2.0):
+    """将 "2x" 形式的倍率字符串解析为浮点数"""
+    try:
+        return float(str(scale_str).lower().replace('x', ''))
+    except ValueError:
+        return default
+
+
+class ConversionSettings:
+    """一次批量转码的全部设置，在开始转码时从界面或命令行参数生成"""
+
+    def __init__(self, output_dir, output_format="mp4", quality="高",
+                 sr_enabled=False, sr_scale="2x", sr_algorithm="lanczos", jobs=None,
+                 skip_up_to_date=True, allow_stream_copy=True, segment_min_duration=None,
+                 memory_budget_mb=None, job_order=DEFAULT_JOB_ORDER, deadline=None,
+                 encoder="auto", scaler="auto", renditions=None, sr_engine="ffmpeg",
+                 sr_upscaler=DEFAULT_UPSCALER, scratch_dir=None, prefetch_count=DEFAULT_PREFETCH):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.quality = quality
+        self.sr_enabled = sr_enabled
+        self.sr_scale = sr_scale
+        self.sr_algorithm = sr_algorithm
+        self.jobs = jobs
+        self.skip_up_to_date = skip_up_to_date  # 跳过输入和参数都未变化的输出
+        self.allow_stream_copy = allow_stream_copy  # 已符合要求的流直接复制
+        self.segment_min_duration = segment_min_duration  # 时长达到该值（秒）的文件分段并行编码，None表示关闭
+        self.memory_budget_mb = memory_budget_mb  # 超分任务的内存预算，None表示使用可用内存的80%
+        self.job_order = job_order  # 调度顺序：longest 最长优先，shortest 最短优先，input 添加顺序
+        self.deadline = deadline  # 完成时间戳，设置后按截止时间为每个文件自动选择编码预设
+        self.encoder = encoder  # H.264编码器，auto 表示使用本机最快的可用编码器
+        self.scaler = scaler  # 超分缩放滤镜，auto 表示优先使用zscale
+        self.renditions = renditions  # 多路输出的版本列表（Rendition.to_dict()），None表示只输出一个版本
+        self.output_tag = ""  # 同一倍率和格式的多个版本在文件名中附加的质量标记
+        self.sr_engine = sr_engine  # 超分引擎：ffmpeg 使用缩放滤镜，pipe 使用Python放大器处理原始帧
+        self.sr_upscaler = sr_upscaler  # pipe 引擎的放大器名称
+        self.scratch_dir = scratch_dir  # 本地暂存目录，设置后预取输入并在本地编码，None表示直接读写
+        self.prefetch_count = prefetch_count  # 暂存模式下提前复制到本地的输入文件数
+
+    def output_file(self, input_file):
+        """根据设置确定输出文件路径"""
+        name, _ = os.path.splitext(os.path.basename(input_file))
+
+        # 如果启用了超分，在文件名中添加标记
+        if self.sr_enabled:
+            name = f"{name}_SR{self.sr_scale}"
+
+        return os.path.join(self.output_dir, f"{name}{self.output_tag}_fixed.{self.output_format}")
+
+    def output_files(self, input_file):
+        """返回全部版本的输出文件路径"""
+        return [variant.output_file(input_file) for variant in expand_renditions(self)]
+
+    def sr_scale_value(self):
+        """返回超分倍率的数值"""
+        return parse_scale(self.sr_scale)
+
+    def resolved_jobs(self):
+        """返回实际的并发任务数，未指定时根据核心数决定"""
+        return self.jobs or default_job_count(cpu_count())
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 to_dict() 的结果恢复设置，忽略不认识的字段"""
+        settings = cls(data["output_dir"])
+        for key, value in data.items():
+            if hasattr(settings, key):
+                setattr(settings, key, value)
+        return settings
+
+
+class ConverterEngine:
+    """执行转码的无界面引擎"""
+
+    def __init__(self, ffmpeg_path, settings, log=print, on_progress=None, metadata=None, probe_cache=None,
+                 capabilities=None, telemetry=None):
+        """
+        初始化转码引擎
+
+        参数:
+            ffmpeg_path: ffmpeg可执行文件路径
+            settings: ConversionSettings实例
+            log: 日志回调函数，接收一行文本
+            on_progress: 进度回调 on_progress(input_file, file_progress, batch_progress)（可选）
+            metadata: 已探测的元数据字典 {路径: 元数据}（可选）
+            probe_cache: ProbeCache实例，用于补充缺失的元数据（可选）
+            capabilities: 已探测的ffmpeg能力字典（可选），默认读取磁盘缓存或重新探测
+            telemetry: TelemetrySink实例，记录每个任务的性能数据（可选）
+        """
+        self.ffmpeg_path = ffmpeg_path
+        self.settings = settings
+        self.log = log
+        self.on_progress = on_progress
+        self.batch_eta = None
+        self.metadata = metadata if metadata is not None else {}
+        self.probe_cache = probe_cache
+        self.manifest = None
+        self.skipped_files = set()
+        self.staging = None  # 批次运行期间的StagingArea（启用本地暂存时）
+        self.pending_copies = {}  # 输入 -> 等待复制到输出目录的输出数等状态
+        self.copy_lock = threading.Lock()
+
+        # 每个任务的阶段耗时和资源统计
+        self.telemetry = telemetry
+        self.job_stats = {}
+        self.probe_times = {}
+        self.queued_at = {}
+        self.segment_encoder = SegmentEncoder(self, ffprobe_path_for(ffmpeg_path)) if ffmpeg_path else None
+
+        # 按本机ffmpeg的能力选择编码器和缩放滤镜
+        if capabilities is None and ffmpeg_path:
+            capabilities = load_capabilities(ffmpeg_path, log=log)
+        self.capabilities = capabilities
+        self.encoder = choose_encoder(capabilities, settings.encoder)
+        self.scaler = choose_scaler(capabilities, settings.scaler)
+        if settings.deadline and settings.encoder == "auto" and self.encoder != "libx264":
+            # 截止时间模式按libx264的预设调整速度，自动选择时不使用硬件编码器
+            log(f"截止时间模式需要libx264的编码预设，不使用自动选择的 {self.encoder}")
+            self.encoder = "libx264"
+
+        # 硬件编码器同时运行的会话数有上限，只限制重新编码视频的ffmpeg进程，直接复制流的任务不受影响
+        self.session_limit = ENCODER_MAX_JOBS.get(self.encoder)
+        self.sessions_in_use = 0
+        self.session_cond = threading.Condition()
+
+        # 超分任务按估算内存准入，并实时监控实际内存
+        self.memory_governor = None
+        self.downgraded_files = {}
+        self.job_plans = {}
+        self.preset_overrides = {}  # 输入文件 -> 截止时间模式下选择的编码预设
+        self.autotuner = None
+
+        # 批次控制：每个输入文件正在运行的ffmpeg进程，以及被取消或挂起的文件
+        self.schedulers = []
+        self.active_processes = {}
+        self.cancelled_files = set()
+        self.suspended_files = set()
+        self.preempted_files = set()  # 为高优先级任务让位而被挂起的文件
+        self.resource_holders = {}  # 输入文件 -> 正在占用的编码会话和内存预留数
+        self.process_lock = threading.Lock()
+        self.resume_cond = threading.Condition(self.process_lock)
+        self.batch_context = None
+        if any(variant.sr_enabled for variant in expand_renditions(settings)):
+            budget = settings.memory_budget_mb * 1024 * 1024 if settings.memory_budget_mb else None
+            self.memory_governor = MemoryGovernor(budget, log=log)
+
+        # Python超分管道，NumPy不可用或放大器无效时回退到ffmpeg的缩放滤镜
+        self.pipe_sr = None
+        if settings.sr_enabled and settings.sr_engine == "pipe":
+            try:
+                self.pipe_sr = PipeSuperResolution(settings.sr_upscaler, log=log)
+            except ValueError as e:
+                log(f"{str(e)}，使用ffmpeg的缩放滤镜")
+
+    def resolved_jobs(self):
+        """返回并发任务数（硬件编码器的会话数上限由 encoder_session 单独限制）"""
+        return self.settings.resolved_jobs()
+
+    def encoding_jobs(self):
+        """同时重新编码的进程数上限：并发任务数，硬件编码器不超过其会话数上限"""
+        return min(self.resolved_jobs(), self.session_limit or self.resolved_jobs())
+
+    @contextlib.contextmanager
+    def holding_resources(self, input_file):
+        """
+        登记文件正在占用其他任务可能等待的资源（编码会话或内存预留）
+
+        占用资源的任务不会被挂起给高优先级任务让位，否则高优先级任务会一直等待被挂起的任务释放资源；
+        已经让位的任务等到恢复后才占用资源
+        """
+        with self.resume_cond:
+            while input_file in self.preempted_files and input_file not in self.cancelled_files:
+                self.resume_cond.wait()
+            self.resource_holders[input_file] = self.resource_holders.get(input_file, 0) + 1
+        try:
+            yield
+        finally:
+            with self.resume_cond:
+                self.resource_holders[input_file] -= 1
+                if not self.resource_holders[input_file]:
+                    del self.resource_holders[input_file]
+
+    @contextlib.contextmanager
+    def encoder_session(self, input_file, sessions=1):
+        """
+        重新编码视频期间占用硬件编码器的会话，会话数达到上限时等待
+
+        参数:
+            input_file: 占用会话的输入文件
+            sessions: 本进程打开的编码器数（多路输出中每个重新编码的版本、分段编码中每个并行的分段一个），
+                0表示不编码
+        """
+        if not self.session_limit or sessions <= 0:
+            yield
+            return
+        sessions = min(sessions, self.session_limit)
+        with self.holding_resources(input_file):
+            with self.session_cond:
+                while self.sessions_in_use + sessions > self.session_limit:
+                    self.session_cond.wait()
+                self.sessions_in_use += sessions
+            try:
+                yield
+            finally:
+                with self.session_cond:
+                    self.sessions_in_use -= sessions
+                    self.session_cond.notify_all()
+
+    @contextlib.contextmanager
+    def reserve_memory(self, input_file, amount):
+        """在内存预算内为文件预留内存，预算不足时等待；没有预算时不会等待，也不登记占用"""
+        if not self.memory_governor.budget:
+            with self.memory_governor.reserve(amount):
+                yield
+            return
+        with self.holding_resources(input_file), self.memory_governor.reserve(amount):
+            yield
+
+    def source_path(self, input_file):
+        """ffmpeg读取的输入路径：启用本地暂存且已复制到本地时为本地副本"""
+        if self.staging:
+            return self.staging.local_input(input_file) or input_file
+        return input_file
+
+    def output_temp_path(self, output_file):
+        """ffmpeg写入的临时输出路径：启用本地暂存时位于暂存目录，否则为输出目录中的隐藏文件"""
+        if self.staging:
+            return self.staging.local_output(output_file)
+        return partial_path(output_file)
+
+    def publish_output(self, input_file, temp_output, output_file, params_hash=None):
+        """
+        把成功的临时输出移动到最终位置，并在输出清单中记录参数哈希（为None时删除记录）
+
+        启用本地暂存时输出在后台复制到输出目录，复制完成后才记录
+        """
+        def record(success):
+            if not self.manifest:
+                return
+            if success and params_hash:
+                self.manifest.record(input_file, output_file, params_hash)
+            else:
+                self.manifest.discard(output_file)
+
+        if not self.staging:
+            os.replace(temp_output, output_file)
+            record(True)
+            return
+
+        def on_done(success):
+            record(success)
+            self.copy_finished(input_file, success)
+
+        with self.copy_lock:
+            entry = self.pending_copies.setdefault(input_file, {"count": 0, "failed": False, "settled": False})
+            entry["count"] += 1
+        try:
+            self.staging.copy_out(input_file, temp_output, output_file, on_done=on_done)
+        except Exception:
+            self.copy_finished(input_file, False)
+            raise
+
+    def copy_finished(self, input_file, success):
+        """暂存模式下一个输出复制结束；文件已处理完且全部输出都复制结束时调用 settle_copy_out 登记的回调"""
+        with self.copy_lock:
+            entry = self.pending_copies.get(input_file)
+            if not entry:
+                return
+            entry["count"] -= 1
+            entry["failed"] = entry["failed"] or not success
+            if entry["count"] > 0 or not entry["settled"]:
+                return
+            del self.pending_copies[input_file]
+        if entry.get("on_settled"):
+            entry["on_settled"](not entry["failed"])
+
+    def settle_copy_out(self, input_file, success, on_settled=None):
+        """
+        文件处理结束时调用
+
+        参数:
+            on_settled: 输出仍在复制时，全部复制结束后调用 on_settled(全部输出是否都已复制)
+
+        返回:
+            输出仍在复制时返回None，否则返回全部输出是否都已复制
+        """
+        with self.copy_lock:
+            entry = self.pending_copies.get(input_file)
+            if not entry:
+                return True
+            entry["failed"] = entry["failed"] or not success
+            if entry["count"] > 0:
+                entry["settled"] = True
+                entry["on_settled"] = on_settled
+                return None
+            del self.pending_copies[input_file]
+            return not entry["failed"]
+
+    def get_ffmpeg_params(self, settings=None):
+        """根据质量设置返回视频和音频编码参数，settings 为多路输出中某个版本的设置"""
+        settings = settings or self.settings
+        quality = settings.quality if settings.quality in VIDEO_QUALITY_PARAMS else "低"
+        return list(VIDEO_QUALITY_PARAMS[quality]) + list(AUDIO_QUALITY_PARAMS[quality])
+
+    def get_stream_plan(self, input_file):
+        """根据元数据决定哪些流可以直接复制"""
+        return plan_streams(self.get_metadata(input_file), self.settings)
+
+    def prepare_metadata(self, video_files):
+        """探测阶段：并行读取尚无元数据的文件，后续各阶段统一使用探测结果"""
+        missing = [f for f in video_files if self.metadata.get(f) is None]
+        if missing:
+            self.log(f"正在读取 {len(missing)} 个文件的元数据...")
+            self.metadata.update(probe_files(missing, ffprobe_path_for(self.ffmpeg_path), self.probe_cache,
+                                             timings=self.probe_times))
+
+    def get_metadata(self, input_file):
+        """返回文件的元数据，必要时单独探测"""
+        if self.metadata.get(input_file) is None:
+            self.prepare_metadata([input_file])
+        return self.metadata.get(input_file) or {}
+
+    def get_sr_scale(self, input_file, scale=None, quiet=False):
+        """返回文件实际使用的超分倍率，目标分辨率超过4K时自动降低"""
+        scale = scale or self.settings.sr_scale_value()
+
+        # 检查当前文件的原始分辨率
+        try:
+            resolution = display_size(self.get_metadata(input_file))
+            if resolution:
+                width, height = resolution
+
+                # 如果超分后的分辨率超过4K，发出警告并降低超分倍率
+                if width * scale > 3840 or height * scale > 2160:
+                    original_scale = scale
+                    # 降低超分倍率至安全值
+                    max_scale = min(3840 / width, 2160 / height, 2.0)
+                    scale = min(scale, max_scale)
+
+                    if not quiet:
+                        self.log(f"警告: 源视频分辨率{width}x{height}，应用{original_scale}x超分后分辨率过大")
+                        self.log(f"自动调整超分倍率为{scale:.1f}x以确保稳定性")
+        except Exception as e:
+            self.log(f"分辨率检查错误: {str(e)}")
+        return scale
+
+    def get_sr_params(self, input_file, scale=None):
+        """获取超分辨率参数，scale 用于在内存不足重试时指定更低的倍率"""
+        if not self.settings.sr_enabled:
+            return []
+
+        scale = self.get_sr_scale(input_file, scale)
+
+        # 计算新的宽度和高度 (在ffmpeg中使用过滤器进行计算)
+        # 线程数由任务池按核心预算统一分配，见 get_video_params
+        filter_complex = scale_filter(self.scaler, scale, self.settings.sr_algorithm)
+
+        return ["-filter_complex", filter_complex]
+
+    def estimate_sr_memory(self, input_file, scale, threads):
+        """估算超分任务的峰值内存（字节），分辨率未知时按1080p估算"""
+        width, height = display_size(self.get_metadata(input_file)) or (1920, 1080)
+        return estimate_encode_memory(width, height, int(width * scale), int(height * scale), threads)
+
+    def get_video_params(self, input_file, plan, threads=4, sr_scale=None):
+        """返回视频流的处理参数：直接复制，或修复像素格式、超分并重新编码"""
+        # 视频流已是H.264 yuv420p时直接复制，不需要滤镜和编码线程
+        if plan.video_copy:
+            return ["-c:v", "copy"]
+
+        params = ["-pix_fmt", ENCODER_PIX_FMTS.get(self.encoder, "yuv420p")]  # 修复绿屏问题
+
+        if self.settings.sr_enabled:
+            # 当使用超分辨率时，设置较低的缓冲大小，避免内存溢出
+            params.extend(["-max_muxing_queue_size", "1024"])
+
+        # 限制编码线程数，使并发任务共享核心预算
+        params.extend(["-threads", str(threads)])
+
+        # 添加超分辨率参数(如果有)
+        params.extend(self.get_sr_params(input_file, sr_scale))
+
+        params.extend(self.get_encoder_params(input_file))
+        return params
+
+    def get_encoder_params(self, input_file):
+        """返回视频编码器参数，截止时间模式下使用为该文件选择的预设"""
+        quality = self.settings.quality if self.settings.quality in VIDEO_QUALITY_PARAMS else "低"
+        quality_params = VIDEO_QUALITY_PARAMS[quality]
+        if input_file in self.preset_overrides:
+            quality_params = with_preset(quality_params, self.preset_overrides[input_file])
+        return encoder_params(self.encoder, quality_params)
+
+    def get_audio_params(self, plan, settings=None):
+        """返回音频流的处理参数，settings 为多路输出中某个版本的设置"""
+        if plan.audio_copy:
+            return ["-c:a", "copy"]
+        settings = settings or self.settings
+        quality = settings.quality if settings.quality in AUDIO_QUALITY_PARAMS else "低"
+        return list(AUDIO_QUALITY_PARAMS[quality])
+
+    def build_command(self, input_file, output_file, threads=4, sr_scale=None):
+        """构建完整的ffmpeg命令"""
+        plan = self.get_stream_plan(input_file)
+        cmd = [self.ffmpeg_path, "-i", self.source_path(input_file)]
+        cmd.extend(self.get_video_params(input_file, plan, threads, sr_scale))
+        cmd.extend(self.get_audio_params(plan))
+        cmd.extend([
+            "-y",  # 自动覆盖输出文件
+            output_file
+        ])
+        return cmd
+
+    def rendition_args(self, input_file, variant, output_file, threads):
+        """
+        返回多路输出中一个版本的滤镜和输出参数
+
+        返回:
+            (滤镜链或None, 不含 -map 的输出参数, 参数哈希)；直接复制视频流时滤镜链为None
+        """
+        plan = plan_streams(self.get_metadata(input_file), variant)
+        if plan.video_copy:
+            chain = None
+            video = ["-c:v", "copy"]
+            requested_preset = None
+        else:
+            chain = "null"
+            if variant.sr_enabled:
+                scale = self.get_sr_scale(input_file, variant.sr_scale_value(), quiet=True)
+                chain = scale_filter(self.scaler, scale, variant.sr_algorithm)
+            video = ["-pix_fmt", ENCODER_PIX_FMTS.get(self.encoder, "yuv420p")]
+            if variant.sr_enabled:
+                video.extend(["-max_muxing_queue_size", "1024"])
+            video.extend(["-threads", str(threads)])
+            quality = variant.quality if variant.quality in VIDEO_QUALITY_PARAMS else "低"
+            quality_params = VIDEO_QUALITY_PARAMS[quality]
+            requested_preset = preset_of(quality_params)
+            if input_file in self.preset_overrides:
+                quality_params = with_preset(quality_params, self.preset_overrides[input_file])
+            video.extend(encoder_params(self.encoder, quality_params))
+        args = video + self.get_audio_params(plan, variant) + ["-y", output_file]
+        # 与单个输出相同，截止时间模式选择的预设不计入哈希；滤镜标签随版本组合变化，也不计入
+        hashed = [self.ffmpeg_path, "-i", input_file, chain or "copy"] + args
+        if requested_preset:
+            hashed = with_preset(hashed, requested_preset)
+        return chain, args, command_hash(hashed, input_file, output_file)
+
+    def build_rendition_command(self, input_file, targets, threads=4):
+        """
+        构建只解码一次、同时输出多个版本的ffmpeg命令
+
+        画面经 split 滤镜分给各个版本各自的缩放和编码器，编码线程在需要重新编码的版本间平分
+
+        参数:
+            targets: [(版本设置, 输出文件)] 列表
+
+        返回:
+            (命令, 每个版本的参数哈希列表)
+        """
+        metadata = self.get_metadata(input_file)
+        encoded = [v for v, _ in targets if not plan_streams(metadata, v).video_copy]
+        threads_each = max(1, threads // max(1, len(encoded)))
+
+        chains = []
+        outputs = []
+        hashes = []
+        for variant, output_file in targets:
+            chain, args, params_hash = self.rendition_args(input_file, variant, output_file, threads_each)
+            if chain is None:
+                video_map = "0:v:0"
+            else:
+                video_map = f"[v{len(chains)}]"
+                chains.append(chain)
+            outputs.extend(["-map", video_map, "-map", "0:a:0?"] + args)
+            hashes.append(params_hash)
+
+        cmd = [self.ffmpeg_path, "-i", self.source_path(input_file)]
+        if len(chains) == 1:
+            cmd.extend(["-filter_complex", f"[0:v:0]{chains[0]}[v0]"])
+        elif chains:
+            split = "".join(f"[s{i}]" for i in range(len(chains)))
+            graph = [f"[0:v:0]split={len(chains)}{split}"]
+            graph.extend(f"[s{i}]{chain}[v{i}]" for i, chain in enumerate(chains))
+            cmd.extend(["-filter_complex", ";".join(graph)])
+        return cmd + outputs, hashes
+
+    def estimate_rendition_memory(self, input_file, targets, threads):
+        """估算多路输出任务的峰值内存：各个重新编码的版本之和"""
+        metadata = self.get_metadata(input_file)
+        width, height = display_size(metadata) or (1920, 1080)
+        total = 0
+        for variant, _ in targets:
+            if plan_streams(metadata, variant).video_copy:
+                continue
+            scale = self.get_sr_scale(input_file, variant.sr_scale_value(), quiet=True) if variant.sr_enabled else 1
+            total += estimate_encode_memory(width, height, int(width * scale), int(height * scale), threads)
+        return total
+
+    def run_ffmpeg(self, cmd, input_file=None, duration=None, on_snapshot=None):
+        """
+        运行ffmpeg命令，解析进度输出并转发日志，返回进程退出码
+
+        参数:
+            cmd: ffmpeg命令（不含进度参数）
+            input_file: 对应的输入文件，用于查找时长和汇报进度
+            duration: 本次处理的媒体时长，默认使用输入文件的时长
+            on_snapshot: 自定义进度处理函数，默认直接汇报为输入文件的进度
+        """
+        if duration is None and input_file:
+            duration = self.get_metadata(input_file).get("duration")
+        parser = ProgressParser(duration)
+        started = time.perf_counter()
+        frames = 0
+
+        # 进度块写入stdout，日志写入stderr
+        process = subprocess.Popen(
+            cmd[:1] + PROGRESS_ARGS + cmd[1:],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            creationflags=CREATE_NO_WINDOW
+        )
+        if self.memory_governor:
+            self.memory_governor.watch(process)
+        self.track_process(input_file, process)
+
+        def read_log():
+            for raw in iter(process.stderr.readline, b''):
+                line = raw.decode('utf-8', 'replace').strip()
+                if line:
+                    self.log(line)
+
+        log_thread = threading.Thread(target=read_log, daemon=True)
+        log_thread.start()
+
+        # 按块读取进度输出，不依赖行缓冲
+        while True:
+            data = os.read(process.stdout.fileno(), 4096)
+            if not data:
+                break
+            for snapshot in parser.feed(data):
+                frames = snapshot.get("frame") or frames
+                if on_snapshot:
+                    on_snapshot(snapshot)
+                else:
+                    self.report_progress(input_file, snapshot)
+
+        process.stdout.close()
+        # 使用 wait4 回收进程，同时取得CPU时间和峰值内存
+        return_code, usage = wait_with_rusage(process)
+        log_thread.join()
+        process.stderr.close()
+        if self.memory_governor:
+            self.memory_governor.unwatch(process)
+        self.untrack_process(input_file, process)
+        with self.process_lock:
+            stats = self.job_stats.get(input_file)
+            if stats is not None:
+                add_process_usage(stats, time.perf_counter() - started, frames, usage)
+        return return_code
+
+    def track_process(self, input_file, process):
+        """登记文件的ffmpeg进程；文件已被取消或挂起时立即终止或挂起新进程"""
+        with self.process_lock:
+            self.active_processes.setdefault(input_file, set()).add(process)
+            if input_file in self.cancelled_files:
+                process.kill()
+            elif input_file in self.suspended_files:
+                suspend_process(process)
+
+    def untrack_process(self, input_file, process):
+        with self.process_lock:
+            processes = self.active_processes.get(input_file)
+            if processes is not None:
+                processes.discard(process)
+                if not processes:
+                    del self.active_processes[input_file]
+
+    def suspend_job(self, input_file, preempt=False):
+        """
+        挂起文件的全部ffmpeg进程，当前平台不支持时返回False
+
+        preempt 为True表示为高优先级任务让位：文件正在占用编码会话或内存预留时不挂起并返回False
+        """
+        with self.process_lock:
+            if preempt and self.resource_holders.get(input_file):
+                return False
+            processes = list(self.active_processes.get(input_file, ()))
+            if any(not suspend_process(p) for p in processes if p.poll() is None):
+                for process in processes:
+                    resume_process(process)
+                return False
+            self.suspended_files.add(input_file)
+            if preempt:
+                self.preempted_files.add(input_file)
+            return True
+
+    def resume_job(self, input_file):
+        with self.resume_cond:
+            self.suspended_files.discard(input_file)
+            self.preempted_files.discard(input_file)
+            for process in self.active_processes.get(input_file, ()):
+                resume_process(process)
+            self.resume_cond.notify_all()
+
+    def cancel_job(self, input_file):
+        """终止文件的全部ffmpeg进程，之后启动的进程（分段、重试）也会被立即终止"""
+        with self.process_lock:
+            self.cancelled_files.add(input_file)
+            self.suspended_files.discard(input_file)
+            self.preempted_files.discard(input_file)
+            for process in self.active_processes.get(input_file, ()):
+                if process.poll() is None:
+                    process.kill()
+            self.resume_cond.notify_all()
+
+    def cancel(self, input_file):
+        """取消批次中的一个文件（未开始的直接移除，正在转码的终止并删除不完整的输出）"""
+        self.cancelled_files.add(input_file)
+        if not any([scheduler.cancel(input_file) for scheduler in self.schedulers]):
+            self.cancelled_files.discard(input_file)
+            return False
+        self.log(f"已取消: {os.path.basename(input_file)}")
+        if self.staging:
+            self.staging.discard(input_file)
+        if self.batch_context:
+            journal, batch_id = self.batch_context
+            journal.mark(batch_id, input_file, "cancelled")
+        return True
+
+    def cancel_all(self):
+        """取消批次中全部未完成的文件"""
+        for scheduler in self.schedulers:
+            for item in scheduler.unfinished():
+                self.cancel(item)
+
+    def pause(self):
+        """暂停批次：挂起正在运行的任务，不再启动新任务"""
+        if any([scheduler.pause() for scheduler in self.schedulers]):
+            self.log("批次已暂停")
+            return True
+        return False
+
+    def resume(self):
+        if any([scheduler.resume() for scheduler in self.schedulers]):
+            self.log("批次已继续")
+            return True
+        return False
+
+    def set_priority(self, input_file, priority):
+        return any([scheduler.set_priority(input_file, priority) for scheduler in self.schedulers])
+
+    def add_job(self, input_file, priority=NORMAL_PRIORITY):
+        """
+        在批次运行中加入新文件
+
+        返回:
+            是否加入成功（没有正在运行的批次或文件已在批次中时返回False）
+        """
+        if not self.schedulers:
+            return False
+        scheduler = self.schedulers[-1]
+        if input_file in scheduler.priorities:
+            return False
+        self.cancelled_files.discard(input_file)
+        self.prepare_metadata([input_file])
+        plan = plan_job(self, input_file, scheduler.threads)
+        self.job_plans[input_file] = plan
+        if self.batch_eta:
+            self.batch_eta.add(input_file, plan.duration)
+        if self.batch_context:
+            journal, batch_id = self.batch_context
+            journal.add_job(batch_id, input_file)
+        scheduler.progress.add()
+        if self.staging:
+            self.staging.schedule([(input_file, self.estimate_output_size(plan))])
+        self.queued_at[input_file] = time.monotonic()
+        scheduler.submit(input_file, priority)
+        self.log(f"加入批次: {plan.describe()}")
+        return True
+
+    def report_progress(self, input_file, snapshot):
+        """更新批次进度并通知回调"""
+        if self.batch_eta:
+            self.batch_eta.update(input_file, snapshot["out_time"])
+        if self.on_progress:
+            batch = self.batch_eta.snapshot() if self.batch_eta else None
+            self.on_progress(input_file, snapshot, batch)
+
+    def run_sr_with_retry(self, input_file, output_file, threads, cmd):
+        """在内存预算内运行超分任务，内存不足被终止时以更低的倍率重试"""
+        scale = self.get_sr_scale(input_file, quiet=True)
+        while True:
+            estimate = self.estimate_sr_memory(input_file, scale, threads)
+            with self.reserve_memory(input_file, estimate):
+                self.log(f"执行命令: {' '.join(cmd)}")
+                return_code = self.run_ffmpeg(cmd, input_file)
+
+            lower = [s for s in map(parse_scale, SR_SCALES) if s < scale]
+            if (return_code == 0 or not is_oom_exit(return_code) or not lower
+                    or input_file in self.cancelled_files):
+                return return_code
+
+            scale = max(lower)
+            self.downgraded_files[input_file] = scale
+            self.log(f"内存不足，以 {scale:g}x 超分倍率重试: {os.path.basename(input_file)}")
+            cmd = self.build_command(input_file, output_file, threads, sr_scale=scale)
+
+    def run_pipe_sr(self, input_file, output_file, threads, input_options=()):
+        """
+        用Python超分管道处理一个文件：解码为原始帧，由放大器并行处理后编码
+
+        参数:
+            input_options: 原文件的输入参数，样本预览用 -ss/-t 截取片段，此时不汇报进度
+
+        返回:
+            退出码；无法确定视频尺寸时返回None，由调用方改用ffmpeg的缩放滤镜
+        """
+        metadata = self.get_metadata(input_file)
+        size = display_size(metadata)
+        if not size:
+            self.log("无法确定视频尺寸，使用ffmpeg的缩放滤镜")
+            return None
+        scale = self.get_sr_scale(input_file)
+        target = target_size(size[0], size[1], scale)
+        fps = metadata.get("fps") or 30.0
+        rate = f"{fps:.6f}".rstrip("0").rstrip(".")
+
+        plan = self.get_stream_plan(input_file)
+        params = ["-pix_fmt", ENCODER_PIX_FMTS.get(self.encoder, "yuv420p"), "-threads", str(threads)]
+        params.extend(self.get_encoder_params(input_file))
+        params.extend(self.get_audio_params(plan))
+        source = self.source_path(input_file)
+        decode_cmd = self.pipe_sr.decode_command(self.ffmpeg_path, source, rate, input_options=input_options)
+        encode_cmd = self.pipe_sr.encode_command(self.ffmpeg_path, source, target, rate, params, output_file,
+                                                 input_options=input_options)
+        self.log(f"执行命令: {' '.join(decode_cmd)} | {self.settings.sr_upscaler} | {' '.join(encode_cmd)}")
+
+        duration = metadata.get("duration")
+        started = time.perf_counter()
+
+        def on_frames(frames):
+            if not input_options:
+                self.report_progress(input_file, frame_snapshot(frames, fps, time.perf_counter() - started, duration))
+
+        def on_spawn(process):
+            if self.memory_governor:
+                self.memory_governor.watch(process)
+            self.track_process(input_file, process)
+
+        def on_exit(process, elapsed, frames, usage):
+            if self.memory_governor:
+                self.memory_governor.unwatch(process)
+            self.untrack_process(input_file, process)
+            with self.process_lock:
+                stats = self.job_stats.get(input_file)
+                if stats is not None:
+                    add_process_usage(stats, elapsed, frames, usage)
+
+        def run():
+            return self.pipe_sr.run(decode_cmd, encode_cmd, size, target, on_frames=on_frames,
+                                    on_spawn=on_spawn, on_exit=on_exit, workers=threads)
+
+        if not self.memory_governor:
+            return run()
+        # 放大进程的共享内存槽和临时数组也计入预算
+        estimate = self.estimate_sr_memory(input_file, scale, threads) + self.pipe_sr.memory_bytes(size, target, threads)
+        with self.reserve_memory(input_file, estimate):
+            return run()
+
+    def fix_iphone_video(self, input_file, output_file, threads=4, renditions=None):
+        """修复iPhone绿屏视频并转码到指定格式，可选超分辨率处理
+
+        threads 为本任务分到的编码线程数，并发转码时由任务池按核心预算分配；
+        renditions 为Rendition列表时（默认取设置中的多路输出）由一个ffmpeg进程同时输出全部版本，
+        此时忽略 output_file
+        """
+        if not self.ffmpeg_path:
+            self.log("错误: 未找到FFmpeg，无法进行转码")
+            return False
+
+        if renditions is None and self.settings.renditions:
+            renditions = [Rendition.from_dict(data) for data in self.settings.renditions]
+        if renditions:
+            return self.encode_renditions(input_file, expand_renditions(self.settings, renditions), threads)
+
+        # 先写入临时文件，成功后再重命名（或从暂存目录复制）为最终输出
+        temp_output = self.output_temp_path(output_file)
+        stats = new_job_stats()
+        with self.process_lock:
+            self.job_stats[input_file] = stats
+        try:
+            cmd = self.build_command(input_file, temp_output, threads)
+            # 截止时间模式自动选择的预设不计入参数哈希，按质量等级判断输出是否最新
+            requested_preset = preset_of(self.get_ffmpeg_params())
+            hashed = with_preset(cmd, requested_preset)
+            if self.pipe_sr:
+                # Python放大器的输出与ffmpeg缩放滤镜不同，更换放大器后需要重新转码
+                hashed.append(f"pipe_sr={self.pipe_sr.upscaler}")
+            params_hash = command_hash(hashed, input_file, temp_output)
+
+            # 输入文件和参数都未变化时跳过
+            if self.manifest and self.manifest.is_up_to_date(input_file, output_file, params_hash):
+                self.log(f"跳过: {os.path.basename(output_file)} 已是最新")
+                self.skipped_files.add(input_file)
+                if self.batch_eta:
+                    self.batch_eta.skip(input_file)
+                return True
+
+            if self.staging:
+                # 输出已是最新的文件不需要复制输入；之后构建的命令读取本地副本
+                self.staging.acquire(input_file)
+                cmd = self.build_command(input_file, temp_output, threads)
+
+            return_code = None
+            piped = False
+            encode_started = time.perf_counter()
+            plan = self.get_stream_plan(input_file)
+            if self.pipe_sr and not plan.video_copy:
+                with self.encoder_session(input_file):
+                    return_code = self.run_pipe_sr(input_file, temp_output, threads)
+                piped = return_code is not None
+            elif self.segment_encoder and self.segment_encoder.should_segment(input_file, plan):
+                return_code = self.segment_encoder.encode(input_file, temp_output, plan)
+
+            # 不需要分段或无法分段时整文件编码
+            if return_code is None:
+                if self.memory_governor and not plan.video_copy:
+                    with self.encoder_session(input_file):
+                        return_code = self.run_sr_with_retry(input_file, temp_output, threads, cmd)
+                else:
+                    self.log(f"执行命令: {' '.join(cmd)}")
+                    with self.encoder_session(input_file, 0 if plan.video_copy else 1):
+                        return_code = self.run_ffmpeg(cmd, input_file)
+            stats["encode_wall"] = time.perf_counter() - encode_started
+            if self.batch_eta:
+                self.batch_eta.finish(input_file)
+
+            finalize_started = time.perf_counter()
+            if return_code == 0:
+                # 降低倍率的输出不记录，下次运行时仍按请求的倍率重新转码
+                self.publish_output(input_file, temp_output, output_file,
+                                    params_hash if input_file not in self.downgraded_files else None)
+            elif self.manifest:
+                self.manifest.discard(output_file)
+            stats["finalize_seconds"] = time.perf_counter() - finalize_started
+
+            if return_code == 0:
+                self.log(f"成功转码: {os.path.basename(input_file)}")
+                if input_file in self.downgraded_files:
+                    self.log(f"应用了{self.downgraded_files[input_file]:g}x超分辨率（因内存不足低于设置的"
+                             f"{self.settings.sr_scale}），算法: {self.settings.sr_algorithm}")
+                elif piped:
+                    self.log(f"应用了{self.settings.sr_scale}超分辨率，放大器: {self.pipe_sr.upscaler}")
+                elif self.settings.sr_enabled:
+                    self.log(f"应用了{self.settings.sr_scale}超分辨率，算法: {self.settings.sr_algorithm}")
+                return True
+            elif input_file in self.cancelled_files:
+                self.log(f"已终止转码并删除不完整的输出: {os.path.basename(input_file)}")
+                return False
+            elif is_oom_exit(return_code) and self.settings.sr_enabled:
+                # 被内存监控或系统终止，或Windows中的内存访问错误（0xC0000005）
+                self.log(f"转码失败: 可能是因为内存不足导致FFmpeg崩溃")
+                self.log(f"建议: 请尝试减少并发任务数，或使用较低的超分辨率倍率")
+                return False
+            else:
+                self.log(f"转码失败: {os.path.basename(input_file)}, 返回代码: {return_code}")
+                return False
+
+        except Exception as e:
+            self.log(f"转码错误: {str(e)}")
+            if self.batch_eta:
+                self.batch_eta.finish(input_file)
+            return False
+
+        finally:
+            if self.staging:
+                self.staging.release(input_file)
+            # 失败或中断时删除不完整的临时文件
+            if os.path.exists(temp_output):
+                try:
+                    os.remove(temp_output)
+                except OSError:
+                    pass
+
+    def encode_renditions(self, input_file, variants, threads=4):
+        """一次解码输出多个版本；已是最新的版本不再重新编码，其余版本共用一个ffmpeg进程"""
+        outputs = [variant.output_file(input_file) for variant in variants]
+        temp_outputs = [self.output_temp_path(output_file) for output_file in outputs]
+        stats = new_job_stats()
+        with self.process_lock:
+            self.job_stats[input_file] = stats
+        try:
+            _, hashes = self.build_rendition_command(input_file, list(zip(variants, temp_outputs)), threads)
+            pending = []
+            for index, output_file in enumerate(outputs):
+                if self.manifest and self.manifest.is_up_to_date(input_file, output_file, hashes[index]):
+                    self.log(f"跳过: {os.path.basename(output_file)} 已是最新")
+                else:
+                    pending.append(index)
+            if not pending:
+                self.skipped_files.add(input_file)
+                if self.batch_eta:
+                    self.batch_eta.skip(input_file)
+                return True
+
+            if self.staging:
+                self.staging.acquire(input_file)
+            targets = [(variants[i], temp_outputs[i]) for i in pending]
+            cmd, _ = self.build_rendition_command(input_file, targets, threads)
+            encode_started = time.perf_counter()
+            self.log(f"执行命令: {' '.join(cmd)}")
+            metadata = self.get_metadata(input_file)
+            sessions = sum(1 for variant, _ in targets if not plan_streams(metadata, variant).video_copy)
+            # 与单个输出相同，先占用编码会话再预留内存，避免两种等待互相阻塞
+            with self.encoder_session(input_file, sessions):
+                if self.memory_governor:
+                    # 多个版本共用一个进程，内存不足时不按单个版本降低倍率重试
+                    with self.reserve_memory(input_file, self.estimate_rendition_memory(input_file, targets, threads)):
+                        return_code = self.run_ffmpeg(cmd, input_file)
+                else:
+                    return_code = self.run_ffmpeg(cmd, input_file)
+            stats["encode_wall"] = time.perf_counter() - encode_started
+            if self.batch_eta:
+                self.batch_eta.finish(input_file)
+
+            finalize_started = time.perf_counter()
+            for index in pending:
+                if return_code == 0:
+                    self.publish_output(input_file, temp_outputs[index], outputs[index], hashes[index])
+                elif self.manifest:
+                    self.manifest.discard(outputs[index])
+            stats["finalize_seconds"] = time.perf_counter() - finalize_started
+
+            if return_code == 0:
+                names = ", ".join(os.path.basename(outputs[i]) for i in pending)
+                self.log(f"成功转码: {os.path.basename(input_file)}（{len(pending)} 个版本: {names}）")
+                return True
+            elif input_file in self.cancelled_files:
+                self.log(f"已终止转码并删除不完整的输出: {os.path.basename(input_file)}")
+                return False
+            elif is_oom_exit(return_code) and self.memory_governor:
+                self.log(f"转码失败: 可能是因为内存不足导致FFmpeg崩溃")
+                self.log(f"建议: 请尝试减少并发任务数或输出版本数，或使用较低的超分辨率倍率")
+                return False
+            else:
+                self.log(f"转码失败: {os.path.basename(input_file)}, 返回代码: {return_code}")
+                return False
+
+        except Exception as e:
+            self.log(f"转码错误: {str(e)}")
+            if self.batch_eta:
+                self.batch_eta.finish(input_file)
+            return False
+
+        finally:
+            if self.staging:
+                self.staging.release(input_file)
+            for temp_output in temp_outputs:
+                if os.path.exists(temp_output):
+                    try:
+                        os.remove(temp_output)
+                    except OSError:
+                        pass
+
+    def record_job(self, input_file, output_file, state, started=None, **extra):
+        """
+        记录一个任务的遥测数据，并在日志中输出成功任务的统计
+
+        参数:
+            state: done/skipped/failed/cancelled
+            started: 任务开始处理的 time.monotonic() 时间，用于计算排队时间
+            extra: 写入记录的其他字段
+        """
+        with self.process_lock:
+            stats = self.job_stats.pop(input_file, None) or new_job_stats()
+        queued_at = self.queued_at.pop(input_file, None)
+        queue_wait = started - queued_at if started is not None and queued_at is not None else None
+        record = job_record(
+            input_file, output_file, state, stats,
+            duration=(self.metadata.get(input_file) or {}).get("duration"),
+            probe_seconds=self.probe_times.get(input_file),
+            queue_wait=queue_wait,
+            encoder=self.encoder,
+            **extra
+        )
+        if state == "done":
+            self.log(f"统计: {os.path.basename(input_file)} {describe_record(record)}")
+        if self.telemetry:
+            self.telemetry.write(record)
+        return record
+
+    def estimate_output_size(self, plan):
+        """按转码计划和输出版本数估算文件的输出大小，用于检查暂存目录和输出目录的剩余空间"""
+        return estimate_output_size(plan, file_size(plan.input_file), len(expand_renditions(self.settings)))
+
+    def run_batch(self, video_files, on_start=None, on_finish=None, journal=None, batch_id=None):
+        """
+        并发转码一批文件
+
+        参数:
+            video_files: 输入文件列表
+            on_start: 任务开始时的回调 on_start(input_file, progress)
+            on_finish: 任务结束时的回调 on_finish(input_file, success, progress)
+            journal: JobJournal，记录每个文件的状态以便中断后恢复（可选）
+            batch_id: 恢复被中断的批次时传入其批次ID，video_files 为其中未完成的文件
+
+        返回:
+            (BatchProgress, 每个文件的结果字典列表)
+        """
+        if journal:
+            if batch_id is None:
+                batch_id = journal.start_batch(self.settings.to_dict(), video_files)
+            else:
+                journal.claim_batch(batch_id)
+                self.log(f"恢复被中断的批次 {batch_id}: 剩余 {len(video_files)} 个文件")
+
+        self.prepare_metadata(video_files)
+        self.manifest = OutputManifest(self.settings.output_dir) if self.settings.skip_up_to_date else None
+        self.batch_eta = BatchEta({f: (self.metadata.get(f) or {}).get("duration") for f in video_files})
+
+        pool = EncodePool(jobs=self.resolved_jobs(), total_cores=cpu_count())
+        self.log(f"并行任务数: {pool.jobs}，每个任务 {pool.threads_per_job} 个编码线程，编码器: {self.encoder}")
+        if self.session_limit and pool.jobs > self.session_limit:
+            self.log(f"{self.encoder} 最多同时运行 {self.session_limit} 个编码会话，超出的重新编码任务排队等待，"
+                     f"直接复制流的任务不受限制")
+        results = []
+
+        # 开始编码前为每个文件计算目标分辨率、成本和内存，并按成本安排顺序
+        plans = order_jobs(plan_jobs(self, video_files, pool.threads_per_job), self.settings.job_order)
+        self.job_plans = {plan.input_file: plan for plan in plans}
+        total_cost = sum(plan.cost for plan in plans if plan.cost is not None)
+        self.log(f"任务计划: {len(plans)} 个文件，估算总成本 {total_cost:.0f}，顺序: {self.settings.job_order}")
+        for plan in plans[:PLAN_LOG_LIMIT]:
+            self.log(f"  {plan.describe()}")
+        if len(plans) > PLAN_LOG_LIMIT:
+            self.log(f"  ...(还有 {len(plans) - PLAN_LOG_LIMIT} 个文件)")
+
+        # 截止时间模式：校准各预设的编码速度，开始每个文件前按剩余时间选择预设
+        self.autotuner = None
+        if self.settings.deadline and self.encoder != "libx264":
+            self.log(f"截止时间模式只支持libx264的编码预设，{self.encoder} 按质量等级编码")
+        elif self.settings.deadline:
+            self.autotuner = DeadlineTuner(self.settings.deadline, preset_of(self.get_ffmpeg_params()),
+                                           pool.jobs, log=self.log)
+            self.log(f"截止时间模式: 需在 {time.strftime('%Y-%m-%d %H:%M', time.localtime(self.settings.deadline))} 前完成，正在校准编码速度...")
+            self.autotuner.calibrate(self, plans, pool.threads_per_job)
+
+        started_files = set()
+
+        def convert(input_file, threads):
+            started_files.add(input_file)
+            job_started = time.monotonic()
+            outputs = self.settings.output_files(input_file)
+            output_file = outputs[0]
+            self.log(f"开始处理: {os.path.basename(input_file)} -> {', '.join(os.path.basename(o) for o in outputs)}")
+            if self.autotuner:
+                preset = self.autotuner.choose(input_file)
+                if preset:
+                    self.preset_overrides[input_file] = preset
+                    self.log(f"选择编码预设: {preset}")
+            if journal:
+                journal.mark(batch_id, input_file, "running")
+            started = time.time()
+            success = self.fix_iphone_video(input_file, output_file, threads)
+            cancelled = input_file in self.cancelled_files and not success
+
+            def settled(copied):
+                """
+                记录任务日志和遥测；输出仍在从暂存目录复制时由复制结束的回调调用，
+                任务日志在此之前保持 running（崩溃后可以恢复），遥测记录复制到输出目录后的输出大小
+
+                copied 为None表示中断时放弃了复制，任务日志保持未完成
+                """
+                if copied is None or cancelled:
+                    state = "cancelled"
+                elif input_file in self.skipped_files:
+                    state = "skipped"
+                else:
+                    state = "done" if success and copied else "failed"
+                if journal and copied is not None:
+                    journal.mark(batch_id, input_file, state)
+                self.record_job(input_file, outputs if len(outputs) > 1 else output_file, state, job_started,
+                                batch_id=batch_id, preset=self.preset_overrides.get(input_file))
+
+            copied = self.settle_copy_out(input_file, success, on_settled=settled)
+            if copied is not None:
+                settled(copied)
+            if copied is False:
+                success = False
+            if self.autotuner:
+                self.autotuner.finish(input_file, success and input_file not in self.skipped_files)
+            results.append({
+                "input": input_file,
+                "output": output_file,
+                "outputs": outputs,
+                "success": success,
+                "skipped": input_file in self.skipped_files,
+                "cancelled": cancelled,
+                "elapsed": round(time.time() - started, 3),
+                "plan": self.job_plans[input_file].to_dict(),
+                "preset": self.preset_overrides.get(input_file),
+            })
+            return success
+
+        def finished(input_file, success, progress):
+            # 开始前被取消的文件没有经过 convert，在这里补充结果
+            if input_file not in started_files:
+                self.record_job(input_file, self.settings.output_file(input_file), "cancelled", batch_id=batch_id)
+                if self.batch_eta:
+                    self.batch_eta.skip(input_file)
+                if self.autotuner:
+                    self.autotuner.discard(input_file)
+                results.append({
+                    "input": input_file,
+                    "output": self.settings.output_file(input_file),
+                    "outputs": self.settings.output_files(input_file),
+                    "success": False,
+                    "skipped": False,
+                    "cancelled": True,
+                    "elapsed": 0.0,
+                    "plan": self.job_plans[input_file].to_dict(),
+                    "preset": None,
+                })
+            if on_finish:
+                on_finish(input_file, success, progress)
+
+        progress = BatchProgress(len(video_files))
+        self.cancelled_files = set()
+        self.suspended_files = set()
+        self.batch_context = (journal, batch_id) if journal else None
+        queued_at = time.monotonic()
+        for input_file in video_files:
+            self.queued_at[input_file] = queued_at
+
+        # 需要分段的大文件逐个处理，每个文件的分段占满全部并发任务；
+        # 运行中加入的文件进入第二阶段
+        segmented = [plan.input_file for plan in plans if plan.segmented]
+        remaining = [plan.input_file for plan in plans if not plan.segmented]
+        phases = [
+            JobScheduler(1, pool.threads_per_job, convert, self, on_start, finished, progress),
+            JobScheduler(pool.jobs, pool.threads_per_job, convert, self, on_start, finished, progress),
+        ]
+        for item in remaining:
+            phases[1].submit(item)
+        self.schedulers = phases
+        if self.settings.scratch_dir:
+            # 本地暂存：按处理顺序预取输入，输出在后台复制到输出目录
+            self.staging = StagingArea(self.settings.scratch_dir, self.settings.output_dir,
+                                       self.settings.prefetch_count, log=self.log)
+            self.staging.schedule([(f, self.estimate_output_size(self.job_plans[f])) for f in segmented + remaining])
+            self.log(f"本地暂存目录: {self.staging.root}，预取 {self.staging.prefetch} 个文件")
+        try:
+            phases[0].run(segmented)
+            phases[1].run()
+            if self.staging:
+                self.log("等待输出复制到输出目录...")
+                for input_file in self.staging.drain():
+                    # 编码成功但输出未能复制的文件按失败处理（任务日志已由复制结束时的回调更新）
+                    for result in results:
+                        if result["input"] == input_file and result["success"]:
+                            result["success"] = False
+                            progress.revoke(input_file)
+        except KeyboardInterrupt:
+            # 被中断的文件保持未完成状态，下次可以用 --resume 继续
+            # 尚未复制的输出不再复制，这些文件也保持未完成状态
+            abandoned = self.staging.abandon() if self.staging else []
+            if journal:
+                for input_file in self.cancelled_files | set(abandoned):
+                    journal.mark(batch_id, input_file, "pending")
+            raise
+        finally:
+            self.schedulers = []
+            self.batch_context = None
+            if self.staging:
+                self.staging.close()
+                self.staging = None
+                # 中断时放弃复制的文件也记录遥测
+                abandoned = [entry["on_settled"] for entry in self.pending_copies.values() if entry.get("on_settled")]
+                self.pending_copies = {}
+                for settled in abandoned:
+                    settled(None)
+
+        # 全部文件都已有结果，批次不再需要恢复
+        if journal:
+            journal.finish_batch(batch_id)
+        return progress, results
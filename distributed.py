@@ -0,0 +1,712 @@
+"""
+分布式转码
+一台机器作为协调器，持有批次的任务队列和转码设置；其他机器上的工作节点通过HTTP领取任务，
+用与单机相同的转码引擎处理，并回报进度和结果。各机器需要通过共享目录访问输入和输出文件，
+路径不同时由工作节点按路径映射换算。
+
+协调器按各节点实测的处理速度分配任务：较快的节点领取队列前面成本高的文件，
+较慢的节点在剩余工作量不足以让它按时完成大文件时领取成本低的文件，避免整批最后等待慢节点。
+节点在租约超时内没有任何请求时视为失联，其任务重新排队。
+协调器默认只监听本机地址；监听其他地址时必须设置共享令牌，因为领取任务的节点会得到完整的转码设置，
+包括要导入并运行的放大器模块。
+此模块不依赖tkinter。
+"""
+
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from converter_engine import ConversionSettings
+from encode_pool import BatchProgress, cpu_count, split_thread_budget
+from job_planner import order_jobs, plan_jobs
+from output_manifest import OutputManifest
+from progress import BatchEta
+
+DEFAULT_PORT = 8765
+
+# 协调器默认的监听地址（只接受本机的工作节点）
+DEFAULT_HOST = "127.0.0.1"
+
+# 工作节点发送心跳的间隔（秒）
+HEARTBEAT_INTERVAL = 5.0
+
+# 节点超过该时间（秒）没有任何请求时视为失联，其任务重新排队
+LEASE_TIMEOUT = 60.0
+
+# 同一任务因节点失联最多分配的次数，超过后记为失败（节点主动交还的任务不计入）
+MAX_ATTEMPTS = 3
+
+# 队列暂时为空（其余任务正在其他节点上处理）时再次领取的间隔（秒）
+POLL_INTERVAL = 2.0
+
+# 协调器暂时不可达时重试请求的间隔（秒）
+RETRY_INTERVAL = 2.0
+
+# 单个HTTP请求的超时（秒）
+REQUEST_TIMEOUT = 30.0
+
+# 批次结束后等待在线节点得知结束的最长时间（秒）
+FINISH_GRACE = 10.0
+
+# 节点速度的平滑系数，越大越偏向最近一个任务的速度
+SPEED_SMOOTHING = 0.5
+
+# 请求头中的共享令牌
+TOKEN_HEADER = "X-Token"
+
+
+def parse_listen(text):
+    """解析 "主机:端口" 或 "端口" 形式的监听地址，格式错误时抛出ValueError"""
+    host, _, port = text.rpartition(":")
+    port = int(port)
+    if not 0 <= port <= 65535:
+        raise ValueError(f"端口超出范围: {port}")
+    return host.strip("[]") or "0.0.0.0", port
+
+
+def is_loopback(host):
+    """判断监听地址是否只能从本机访问"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def parse_path_map(specs):
+    """
+    解析 "协调器路径=本机路径" 形式的路径映射
+
+    返回:
+        [(协调器路径前缀, 本机路径前缀)]，较长的前缀优先匹配；格式错误时抛出ValueError
+    """
+    mapping = []
+    for spec in specs:
+        source, sep, target = spec.partition("=")
+        if not sep or not source or not target:
+            raise ValueError(f"无法识别的路径映射: {spec}（示例: /mnt/share=Z:\\share）")
+        mapping.append((source, target))
+    return sorted(mapping, key=lambda item: len(item[0]), reverse=True)
+
+
+class RemoteWorker:
+    """协调器记录的一个工作节点"""
+
+    def __init__(self, worker_id, name):
+        self.worker_id = worker_id
+        self.name = name
+        self.slots = 1
+        self.speed = None  # 每个任务槽每秒完成的成本，完成第一个任务后才有值
+        self.jobs = set()  # 已领取、尚未回报结果的任务ID
+        self.completed = 0
+        self.online = True
+        self.released = False  # 已得知批次结束
+        self.last_seen = time.monotonic()
+
+    def to_dict(self):
+        return {
+            "worker": self.worker_id,
+            "name": self.name,
+            "slots": self.slots,
+            "speed": round(self.speed, 3) if self.speed else None,
+            "jobs": sorted(self.jobs),
+            "completed": self.completed,
+            "online": self.online,
+        }
+
+
+class Coordinator:
+    """持有批次的任务队列，通过HTTP把任务分配给工作节点"""
+
+    def __init__(self, engine, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, lease_timeout=LEASE_TIMEOUT):
+        """
+        参数:
+            engine: ConverterEngine实例，用于读取元数据和估算任务成本，本身不转码
+            host/port: HTTP服务监听的地址和端口，端口为0时自动选择
+            token: 共享令牌，设置后工作节点的请求必须携带相同的令牌；监听非本机地址时必须设置
+            lease_timeout: 节点失联的判定时间（秒）
+
+        异常:
+            ValueError: 监听非本机地址但没有设置共享令牌
+        """
+        if not token and not is_loopback(host):
+            raise ValueError(f"监听 {host} 时必须设置共享令牌（--token 或环境变量 VIDEO_CONVERTER_TOKEN）")
+        self.engine = engine
+        self.settings = engine.settings
+        self.log = engine.log
+        self.token = token
+        self.lease_timeout = lease_timeout
+        self.jobs = {}  # 任务ID -> 任务字典
+        self.pending = []  # 等待分配的任务ID，按计划顺序排列
+        self.workers = {}
+        self.results = []
+        self.progress = BatchProgress(0)
+        self.on_finish = None
+        self.journal = None
+        self.batch_id = None
+        self.changed = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+        self.server.daemon_threads = True
+        self.server.coordinator = self
+        self.server_thread = None
+
+    def url(self):
+        host, port = self.server.server_address[:2]
+        if host in ("0.0.0.0", "::"):
+            host = socket.gethostname()
+        return f"http://{host}:{port}"
+
+    def authorized(self, token):
+        return not self.token or hmac.compare_digest(token or "", self.token)
+
+    def run(self, video_files, on_finish=None, journal=None, batch_id=None):
+        """
+        分配一批文件直到全部结束
+
+        参数与 ConverterEngine.run_batch 相同，返回值也相同：(BatchProgress, 每个文件的结果字典列表)
+        """
+        if journal:
+            if batch_id is None:
+                batch_id = journal.start_batch(self.settings.to_dict(), video_files)
+            else:
+                journal.claim_batch(batch_id)
+                self.log(f"恢复被中断的批次 {batch_id}: 剩余 {len(video_files)} 个文件")
+        self.journal = journal
+        self.batch_id = batch_id
+        self.on_finish = on_finish
+
+        engine = self.engine
+        engine.prepare_metadata(video_files)
+        engine.batch_eta = BatchEta({f: (engine.metadata.get(f) or {}).get("duration") for f in video_files})
+        plans = order_jobs(plan_jobs(engine, video_files, 1), self.settings.job_order)
+        # 成本未知的任务按已知任务的平均成本参与分配
+        known = [plan.cost for plan in plans if plan.cost]
+        fallback = sum(known) / len(known) if known else 1.0
+        with self.changed:
+            for position, plan in enumerate(plans):
+                job_id = str(position + 1)
+                self.jobs[job_id] = {
+                    "id": job_id,
+                    "input": plan.input_file,
+                    "plan": plan,
+                    "position": position,
+                    "cost": plan.cost or fallback,
+                    "measured": bool(plan.cost),
+                    "state": "pending",
+                    "worker": None,
+                    "lease": None,
+                    "attempts": 0,
+                    "lost": 0,  # 因节点失联而未完成的次数
+                }
+                self.pending.append(job_id)
+            self.progress = BatchProgress(len(plans))
+
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+        self.log(f"协调器已启动: {self.url()}，等待工作节点领取 {len(plans)} 个任务")
+        try:
+            with self.changed:
+                while not self.all_finished():
+                    self.expire_leases()
+                    self.changed.wait(1.0)
+                # 给在线的节点一点时间得知批次已结束，它们随后自行退出
+                deadline = time.monotonic() + FINISH_GRACE
+                while (any(w.online and not w.released for w in self.workers.values())
+                       and time.monotonic() < deadline):
+                    self.changed.wait(0.5)
+        except KeyboardInterrupt:
+            # 已分配的任务保持未完成状态，下次可以用 --resume 继续
+            if journal:
+                for job in self.jobs.values():
+                    if job["state"] == "leased":
+                        journal.mark(batch_id, job["input"], "pending")
+            raise
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+
+        if journal:
+            journal.finish_batch(batch_id)
+        return self.progress, self.results
+
+    def all_finished(self):
+        return all(job["state"] not in ("pending", "leased") for job in self.jobs.values())
+
+    def touch(self, payload):
+        """按请求中的节点ID找到节点并更新其最后活动时间，未登记的节点自动登记（调用方需持有锁）"""
+        worker_id = payload.get("worker") or f"{payload.get('name') or 'worker'}-{len(self.workers) + 1}"
+        worker = self.workers.get(worker_id)
+        if worker is None:
+            worker = self.workers[worker_id] = RemoteWorker(worker_id, payload.get("name") or worker_id)
+            self.log(f"工作节点已连接: {worker.name}")
+        elif not worker.online:
+            worker.online = True
+            self.log(f"工作节点重新连接: {worker.name}")
+        worker.last_seen = time.monotonic()
+        if payload.get("slots"):
+            worker.slots = max(1, int(payload["slots"]))
+        return worker
+
+    def register(self, payload):
+        with self.changed:
+            worker = self.touch(dict(payload, worker=None))
+        return {
+            "worker": worker.worker_id,
+            "settings": self.settings.to_dict(),
+            # 租约超时较短时缩短心跳间隔，保证在线的节点不会被误判为失联
+            "heartbeat_interval": min(HEARTBEAT_INTERVAL, self.lease_timeout / 3),
+            "lease_timeout": self.lease_timeout,
+        }
+
+    def choose_job(self, worker):
+        """
+        为节点选择下一个任务（调用方需持有锁）
+
+        速度未知的节点和最快的节点按队列顺序领取；较慢的节点只领取按其速度能在
+        全部在线节点处理完剩余工作量之前完成的任务，都不满足时领取成本最低的任务
+        """
+        pending = [self.jobs[job_id] for job_id in self.pending]
+        rates = [(w.speed, w.slots) for w in self.workers.values() if w.online and w.speed]
+        if not worker.speed or not rates or worker.speed >= max(speed for speed, _ in rates):
+            return pending[0]
+        horizon = sum(job["cost"] for job in pending) / sum(speed * slots for speed, slots in rates)
+        for job in pending:
+            if job["cost"] / worker.speed <= horizon:
+                return job
+        return min(pending, key=lambda job: job["cost"])
+
+    def lease(self, payload):
+        with self.changed:
+            worker = self.touch(payload)
+            if not self.pending:
+                finished = self.all_finished()
+                if finished:
+                    worker.released = True
+                    self.changed.notify_all()
+                return {"job": None, "finished": finished}
+            job = self.choose_job(worker)
+            self.pending.remove(job["id"])
+            job["state"] = "leased"
+            job["worker"] = worker.worker_id
+            job["attempts"] += 1
+            job["lease"] = f"{job['id']}.{job['attempts']}"
+            worker.jobs.add(job["id"])
+            self.progress.start(job["input"])
+            if self.journal:
+                self.journal.mark(self.batch_id, job["input"], "running")
+            self.log(f"分配: {os.path.basename(job['input'])} -> {worker.name}")
+            return {"job": {"lease": job["lease"], "input": job["input"], "attempt": job["attempts"]}}
+
+    def leased_job(self, lease, worker):
+        """返回租约对应的任务；任务已重新分配或不属于该节点时返回None（调用方需持有锁）"""
+        job = self.jobs.get(str(lease).partition(".")[0])
+        if job and job["state"] == "leased" and job["worker"] == worker.worker_id and job["lease"] == lease:
+            return job
+        return None
+
+    def heartbeat(self, payload):
+        """
+        记录节点的心跳和各任务的进度
+
+        返回:
+            cancel 为已失效的租约（节点曾被判定失联，任务已重新排队），节点应终止这些任务
+        """
+        with self.changed:
+            worker = self.touch(payload)
+            cancel = []
+            for lease, out_time in (payload.get("progress") or {}).items():
+                job = self.leased_job(lease, worker)
+                if not job:
+                    cancel.append(lease)
+                elif out_time is not None:
+                    self.engine.report_progress(job["input"], {"out_time": out_time})
+            return {"cancel": cancel, "finished": self.all_finished()}
+
+    def result(self, payload):
+        with self.changed:
+            worker = self.touch(payload)
+            job = self.leased_job(payload.get("lease"), worker)
+            if not job:
+                return {"accepted": False}
+            worker.jobs.discard(job["id"])
+            state = payload.get("state")
+            elapsed = payload.get("elapsed")
+            if state == "done" and job["measured"] and elapsed:
+                rate = job["cost"] / elapsed
+                worker.speed = rate if worker.speed is None else (
+                    SPEED_SMOOTHING * rate + (1 - SPEED_SMOOTHING) * worker.speed)
+            if state == "cancelled":
+                # 节点正在退出，任务交给其他节点；主动交还不算失败的分配
+                self.requeue(job, f"{worker.name} 已停止", lost=False)
+            else:
+                worker.completed += 1
+                self.finish_job(job, state, payload)
+            self.changed.notify_all()
+            return {"accepted": True}
+
+    def leave(self, payload):
+        """节点退出：尚未回报结果的任务重新排队"""
+        with self.changed:
+            worker = self.touch(payload)
+            worker.online = False
+            worker.released = True
+            for job_id in sorted(worker.jobs, key=lambda job_id: self.jobs[job_id]["position"]):
+                self.requeue(self.jobs[job_id], f"{worker.name} 已退出", lost=False)
+            worker.jobs.clear()
+            self.log(f"工作节点已退出: {worker.name}")
+            self.changed.notify_all()
+            return {"accepted": True}
+
+    def status(self):
+        with self.changed:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["state"]] = counts.get(job["state"], 0) + 1
+            return {
+                "jobs": counts,
+                "workers": [worker.to_dict() for worker in self.workers.values()],
+                "batch": self.engine.batch_eta.snapshot() if self.engine.batch_eta else None,
+            }
+
+    def requeue(self, job, reason, lost=True):
+        """
+        把任务放回队列，按原计划顺序排列（调用方需持有锁）
+
+        参数:
+            lost: 是否因节点失联而未完成；只有失联的次数达到 MAX_ATTEMPTS 时才记为失败
+        """
+        self.progress.release(job["input"])
+        if lost:
+            job["lost"] += 1
+        if job["lost"] >= MAX_ATTEMPTS:
+            self.log(f"{os.path.basename(job['input'])} 的节点失联 {job['lost']} 次仍未完成，记为失败")
+            self.finish_job(job, "failed", {})
+            return
+        self.log(f"重新排队: {os.path.basename(job['input'])}（{reason}）")
+        job["state"] = "pending"
+        job["worker"] = None
+        self.pending.append(job["id"])
+        self.pending.sort(key=lambda job_id: self.jobs[job_id]["position"])
+        if self.journal:
+            self.journal.mark(self.batch_id, job["input"], "pending")
+
+    def expire_leases(self):
+        """超过租约超时没有请求的节点视为失联，其任务重新排队（调用方需持有锁）"""
+        now = time.monotonic()
+        for worker in self.workers.values():
+            if worker.online and now - worker.last_seen > self.lease_timeout:
+                worker.online = False
+                self.log(f"工作节点失联: {worker.name}（{now - worker.last_seen:.0f} 秒无响应）")
+                for job_id in sorted(worker.jobs, key=lambda job_id: self.jobs[job_id]["position"]):
+                    self.requeue(self.jobs[job_id], f"{worker.name} 失联")
+                worker.jobs.clear()
+
+    def finish_job(self, job, state, payload):
+        """记录任务的最终结果（调用方需持有锁）"""
+        input_file = job["input"]
+        success = state in ("done", "skipped")
+        job["state"] = state if state in ("done", "skipped", "failed") else "failed"
+        self.progress.finish(input_file, success)
+        if self.engine.batch_eta:
+            if state == "skipped":
+                self.engine.batch_eta.skip(input_file)
+            else:
+                self.engine.batch_eta.finish(input_file)
+        if self.journal:
+            self.journal.mark(self.batch_id, input_file, job["state"])
+        worker = self.workers.get(job["worker"])
+        outputs = self.settings.output_files(input_file)
+        self.results.append({
+            "input": input_file,
+            "output": outputs[0],
+            "outputs": outputs,
+            "success": success,
+            "skipped": state == "skipped",
+            "cancelled": False,
+            "elapsed": payload.get("elapsed") or 0.0,
+            "plan": job["plan"].to_dict(),
+            "preset": None,
+            "worker": worker.name if worker else None,
+            "attempts": job["attempts"],
+        })
+        if self.on_finish:
+            self.on_finish(input_file, success, self.progress)
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """协调器的HTTP接口：POST请求和响应的正文均为JSON"""
+
+    ROUTES = {
+        "/register": "register",
+        "/lease": "lease",
+        "/heartbeat": "heartbeat",
+        "/result": "result",
+        "/leave": "leave",
+    }
+
+    def do_GET(self):
+        if not self.server.coordinator.authorized(self.headers.get(TOKEN_HEADER)):
+            self.respond(403, {"error": "令牌无效"})
+            return
+        if self.path != "/status":
+            self.respond(404, {"error": "未知的请求"})
+            return
+        self.respond(200, self.server.coordinator.status())
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        if not coordinator.authorized(self.headers.get(TOKEN_HEADER)):
+            self.respond(403, {"error": "令牌无效"})
+            return
+        method = self.ROUTES.get(self.path)
+        if not method:
+            self.respond(404, {"error": "未知的请求"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+        except ValueError:
+            self.respond(400, {"error": "请求不是有效的JSON"})
+            return
+        try:
+            response = getattr(coordinator, method)(payload)
+        except Exception as e:
+            coordinator.log(f"处理 {self.path} 请求时出错: {str(e)}")
+            self.respond(500, {"error": str(e)})
+            return
+        self.respond(200, response)
+
+    def respond(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 心跳请求很频繁，不输出访问日志
+        pass
+
+
+class DistributedWorker:
+    """从协调器领取任务并用本机的转码引擎处理"""
+
+    def __init__(self, url, name=None, token=None, path_map=None, log=print):
+        """
+        参数:
+            url: 协调器地址，例如 http://render01:8765
+            name: 节点名称，默认为 主机名:进程号
+            token: 共享令牌（可选）
+            path_map: parse_path_map() 的结果，把协调器上的路径换算为本机路径
+        """
+        self.url = url.rstrip("/")
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.token = token
+        self.path_map = path_map or []
+        self.log = log
+        self.worker_id = None
+        self.heartbeat_interval = HEARTBEAT_INTERVAL
+        self.lease_timeout = LEASE_TIMEOUT
+        self.engine = None
+        self.slots = 1
+        self.active = {}  # 租约 -> 本机输入路径
+        self.out_times = {}  # 租约 -> 已处理到的时间点
+        self.succeeded = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def map_path(self, path):
+        for source, target in self.path_map:
+            if path == source or path.startswith(source.rstrip("/\\") + "/") or path.startswith(source.rstrip("/\\") + "\\"):
+                return os.path.normpath(target + path[len(source):])
+        return path
+
+    def request(self, path, payload):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        data = json.dumps(dict(payload, worker=self.worker_id, name=self.name), ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url + path, data=data, headers=headers)
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def call(self, path, payload):
+        """发送请求，协调器暂时不可达时重试；超过租约超时仍不可达或请求被拒绝时抛出ConnectionError"""
+        started = time.monotonic()
+        while True:
+            try:
+                return self.request(path, payload)
+            except urllib.error.HTTPError as e:
+                raise ConnectionError(f"协调器拒绝了请求 {path}: HTTP {e.code}")
+            except (OSError, ValueError) as e:
+                if self.stop_event.is_set() or time.monotonic() - started > self.lease_timeout:
+                    raise ConnectionError(f"无法连接协调器 {self.url}: {str(e)}")
+                time.sleep(RETRY_INTERVAL)
+
+    def register(self):
+        """
+        向协调器登记
+
+        返回:
+            批次的ConversionSettings，输出目录已换算为本机路径；截止时间按单机校准，分布式模式下不使用
+        """
+        response = self.call("/register", {"host": socket.gethostname()})
+        self.worker_id = response["worker"]
+        self.heartbeat_interval = response.get("heartbeat_interval", HEARTBEAT_INTERVAL)
+        self.lease_timeout = response.get("lease_timeout", LEASE_TIMEOUT)
+        settings = ConversionSettings.from_dict(response["settings"])
+        settings.output_dir = self.map_path(settings.output_dir)
+        settings.deadline = None
+        self.log(f"已登记到协调器 {self.url}，节点ID: {self.worker_id}")
+        return settings
+
+    def on_progress(self, input_file, file_progress, batch_progress):
+        """作为转码引擎的进度回调，记录各任务的进度，随心跳发送给协调器"""
+        with self._lock:
+            for lease, path in self.active.items():
+                if path == input_file:
+                    self.out_times[lease] = file_progress.get("out_time")
+
+    def run(self, engine):
+        """
+        领取并处理任务，直到批次结束、协调器不可达或收到 KeyboardInterrupt
+
+        参数:
+            engine: 用 register() 返回的设置创建的ConverterEngine，on_progress 应为本对象的 on_progress
+
+        返回:
+            (成功数, 失败数)
+        """
+        self.engine = engine
+        if engine.settings.skip_up_to_date:
+            engine.manifest = OutputManifest(engine.settings.output_dir)
+        self.slots = engine.resolved_jobs()
+        threads = split_thread_budget(cpu_count(), self.slots)
+        self.log(f"并行任务数: {self.slots}，每个任务 {threads} 个编码线程，编码器: {engine.encoder}")
+
+        heartbeat = threading.Thread(target=self.heartbeat_loop, daemon=True)
+        heartbeat.start()
+        slots = [threading.Thread(target=self.slot_loop, args=(threads,), daemon=True) for _ in range(self.slots)]
+        for slot in slots:
+            slot.start()
+        try:
+            for slot in slots:
+                while slot.is_alive():
+                    slot.join(0.5)
+        except KeyboardInterrupt:
+            # 正在处理的任务回报为已取消，由协调器交给其他节点
+            self.log("正在停止，终止正在处理的任务...")
+            self.stop()
+            for slot in slots:
+                slot.join()
+            raise
+        finally:
+            self.stop_event.set()
+            try:
+                self.request("/leave", {})
+            except (OSError, ValueError):
+                pass
+        return self.succeeded, self.failed
+
+    def stop(self):
+        self.stop_event.set()
+        with self._lock:
+            inputs = list(self.active.values())
+        for input_file in inputs:
+            self.engine.cancel_job(input_file)
+
+    def slot_loop(self, threads):
+        while not self.stop_event.is_set():
+            try:
+                response = self.call("/lease", {"slots": self.slots})
+            except ConnectionError as e:
+                if not self.stop_event.is_set():
+                    self.log(str(e))
+                    self.stop()
+                return
+            job = response.get("job")
+            if job is None:
+                if response.get("finished"):
+                    # 批次的全部任务都已结束，其他任务槽也不再领取（协调器随后关闭）
+                    self.stop_event.set()
+                    return
+                self.stop_event.wait(POLL_INTERVAL)
+                continue
+            self.process(job, threads)
+
+    def process(self, job, threads):
+        engine = self.engine
+        input_file = self.map_path(job["input"])
+        outputs = engine.settings.output_files(input_file)
+        # 节点曾被判定失联时，同一文件可能再次分配给本节点，先等上一次分配的任务终止
+        while True:
+            with self._lock:
+                if input_file not in self.active.values():
+                    self.active[job["lease"]] = input_file
+                    self.out_times[job["lease"]] = None
+                    break
+            time.sleep(0.5)
+        engine.cancelled_files.discard(input_file)
+        attempt = f"（第 {job['attempt']} 次分配）" if job.get("attempt", 1) > 1 else ""
+        self.log(f"开始处理: {os.path.basename(input_file)} -> "
+                 f"{', '.join(os.path.basename(o) for o in outputs)}{attempt}")
+        started = time.monotonic()
+        success = False
+        state = "failed"
+        try:
+            # 文件可能在两次分配之间被修改，重新读取元数据
+            engine.metadata.pop(input_file, None)
+            success = engine.fix_iphone_video(input_file, outputs[0], threads)
+            if input_file in engine.cancelled_files and not success:
+                state = "cancelled"
+            elif input_file in engine.skipped_files:
+                engine.skipped_files.discard(input_file)
+                state = "skipped"
+            else:
+                state = "done" if success else "failed"
+            engine.record_job(input_file, outputs if len(outputs) > 1 else outputs[0], state, started,
+                              worker=self.worker_id)
+        except Exception as e:
+            self.log(f"转码错误: {str(e)}")
+        finally:
+            with self._lock:
+                self.active.pop(job["lease"], None)
+                self.out_times.pop(job["lease"], None)
+        if state != "cancelled":
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+        try:
+            self.call("/result", {"lease": job["lease"], "state": state, "success": success,
+                                  "elapsed": round(time.monotonic() - started, 3)})
+        except ConnectionError as e:
+            self.log(f"无法回报 {os.path.basename(input_file)} 的结果: {str(e)}")
+
+    def heartbeat_loop(self):
+        while not self.stop_event.wait(self.heartbeat_interval):
+            with self._lock:
+                out_times = dict(self.out_times)
+            try:
+                response = self.call("/heartbeat", {"progress": out_times})
+            except ConnectionError as e:
+                if not self.stop_event.is_set():
+                    self.log(f"{str(e)}，终止正在处理的任务")
+                    self.stop()
+                return
+            for lease in response.get("cancel", []):
+                with self._lock:
+                    input_file = self.active.get(lease)
+                if input_file:
+                    self.log(f"任务已被重新分配给其他节点，终止: {os.path.basename(input_file)}")
+                    self.engine.cancel_job(input_file)
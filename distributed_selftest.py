@@ -0,0 +1,152 @@
+"""
+分布式模式自测
+在本机 127.0.0.1 上启动一个协调器和两个工作节点，用不调用ffmpeg的桩转码引擎处理一批临时文件，
+检查任务被两个节点分担、全部输出都已生成，并且节点按 Ctrl+C 方式停止时主动交还的任务
+由另一个节点完成，不计入失败的分配次数。
+不需要ffmpeg，也不访问网络。此模块不依赖tkinter。
+
+示例:
+    python distributed_selftest.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import distributed
+from converter_engine import ConversionSettings, ConverterEngine
+from distributed import Coordinator, DistributedWorker
+
+# 桩引擎处理一个文件的耗时（秒）
+STUB_SECONDS = 0.3
+
+# 测试的文件数
+FILE_COUNT = 8
+
+# 整个自测的超时（秒）
+TIMEOUT = 60
+
+# 每个文件的桩元数据
+STUB_METADATA = {
+    "duration": 10.0, "width": 1280, "height": 720, "video_codec": "hevc", "pix_fmt": "yuv420p10le",
+    "fps": 30.0, "rotation": 0, "audio_codec": "aac", "audio_channels": 2,
+}
+
+
+class StubEngine(ConverterEngine):
+    """不调用ffmpeg的转码引擎：等待一段时间后写入输出文件，可以被 cancel_job 终止"""
+
+    def __init__(self, settings, video_files, log):
+        super().__init__(None, settings, log=log, metadata={f: dict(STUB_METADATA) for f in video_files})
+        self.ffmpeg_path = "ffmpeg"  # fix_iphone_video 之外不会执行
+        self.started = 0
+        self.second_started = threading.Event()
+        self.processed = []
+
+    def fix_iphone_video(self, input_file, output_file, threads=4, renditions=None):
+        self.started += 1
+        if self.started == 2:
+            self.second_started.set()
+        deadline = time.monotonic() + STUB_SECONDS
+        while time.monotonic() < deadline:
+            if input_file in self.cancelled_files:
+                return False
+            time.sleep(0.02)
+        with open(output_file, "wb") as f:
+            f.write(b"stub")
+        self.processed.append(input_file)
+        return True
+
+
+def run_selftest(log=print):
+    """运行自测，返回发现的问题列表（为空表示通过）"""
+    work_dir = tempfile.mkdtemp(prefix="distributed_selftest_")
+    problems = []
+    try:
+        input_dir = os.path.join(work_dir, "in")
+        output_dir = os.path.join(work_dir, "out")
+        os.makedirs(input_dir)
+        os.makedirs(output_dir)
+        video_files = []
+        for i in range(FILE_COUNT):
+            path = os.path.join(input_dir, f"clip{i}.mov")
+            with open(path, "wb") as f:
+                f.write(b"\0" * 1024)
+            video_files.append(path)
+
+        settings = ConversionSettings(output_dir, skip_up_to_date=False)
+        coordinator_engine = StubEngine(settings, video_files, lambda message: log(f"[协调器] {message}"))
+        coordinator = Coordinator(coordinator_engine, "127.0.0.1", 0, token="selftest", lease_timeout=5)
+        url = f"http://127.0.0.1:{coordinator.server.server_address[1]}"
+        outcome = {}
+
+        def run_coordinator():
+            outcome["progress"], outcome["results"] = coordinator.run(video_files)
+
+        coordinator_thread = threading.Thread(target=run_coordinator, daemon=True)
+        coordinator_thread.start()
+
+        workers = []
+        engines = []
+        for name in ("worker-a", "worker-b"):
+            worker = DistributedWorker(url, name=name, token="selftest",
+                                       log=lambda message, name=name: log(f"[{name}] {message}"))
+            worker_settings = worker.register()
+            worker_settings.jobs = 1
+            engine = StubEngine(worker_settings, video_files, worker.log)
+            engine.on_progress = worker.on_progress
+            workers.append(worker)
+            engines.append(engine)
+        threads = [threading.Thread(target=worker.run, args=(engine,), daemon=True)
+                   for worker, engine in zip(workers, engines)]
+        for thread in threads:
+            thread.start()
+
+        # worker-b 完成一个任务、开始第二个任务后停止，模拟按 Ctrl+C 交还任务
+        if not engines[1].second_started.wait(TIMEOUT):
+            problems.append("worker-b 没有领取到第二个任务")
+        workers[1].stop()
+
+        coordinator_thread.join(TIMEOUT)
+        for thread in threads:
+            thread.join(TIMEOUT)
+        if coordinator_thread.is_alive():
+            problems.append(f"协调器在 {TIMEOUT} 秒内没有结束")
+            return problems
+
+        progress = outcome["progress"]
+        if progress.succeeded != FILE_COUNT:
+            problems.append(f"成功 {progress.succeeded}/{FILE_COUNT} 个文件")
+        missing = [f for f in video_files if not os.path.exists(settings.output_file(f))]
+        if missing:
+            problems.append(f"缺少输出: {', '.join(os.path.basename(f) for f in missing)}")
+        handed_back = [job for job in coordinator.jobs.values() if job["attempts"] > 1]
+        if not handed_back:
+            problems.append("worker-b 停止时没有交还任务")
+        if any(job["lost"] for job in coordinator.jobs.values()):
+            problems.append("主动交还的任务被计为失联")
+        for name, engine in zip(("worker-a", "worker-b"), engines):
+            if not engine.processed:
+                problems.append(f"{name} 没有完成任何任务")
+        return problems
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    # 只分配一次：主动交还的任务若计入分配次数会被直接记为失败
+    distributed.MAX_ATTEMPTS = 1
+    problems = run_selftest()
+    if problems:
+        for problem in problems:
+            print(f"失败: {problem}")
+        return 1
+    print("分布式自测通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
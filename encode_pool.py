@@ -0,0 +1,151 @@
+"""
+并发转码任务池
+将一批转码任务分发给多个工作线程，每个线程驱动一个独立的ffmpeg进程，
+并按核心预算在各任务之间分配编码线程数。
+此模块不依赖tkinter，可以在无界面环境中使用。
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 单个libx264进程使用的默认线程数，超过此值后单进程的加速比明显下降
+THREADS_PER_JOB = 4
+
+
+def cpu_count():
+    """返回当前进程可用的CPU核心数"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def default_job_count(total_cores=None):
+    """根据核心数估算合适的并发任务数"""
+    total_cores = total_cores or cpu_count()
+    return max(1, total_cores // THREADS_PER_JOB)
+
+
+def split_thread_budget(total_cores, jobs):
+    """
+    将核心预算平均分配给并发任务
+
+    参数:
+        total_cores: 可用的核心总数
+        jobs: 并发任务数
+
+    返回:
+        每个任务的编码线程数（至少为1）
+    """
+    jobs = max(1, int(jobs))
+    return max(1, int(total_cores) // jobs)
+
+
+class BatchProgress:
+    """跨工作线程汇总批次进度和成功计数"""
+
+    def __init__(self, total):
+        self.total = total
+        self.completed = 0
+        self.succeeded = 0
+        self.running = []
+        self._lock = threading.Lock()
+
+    def add(self, count=1):
+        """批次运行中加入新任务"""
+        with self._lock:
+            self.total += count
+
+    def start(self, item):
+        with self._lock:
+            self.running.append(item)
+
+    def finish(self, item, success):
+        with self._lock:
+            if item in self.running:
+                self.running.remove(item)
+            self.completed += 1
+            if success:
+                self.succeeded += 1
+
+    def release(self, item):
+        """任务未结束就被放回队列（如分布式转码中节点失联）"""
+        with self._lock:
+            if item in self.running:
+                self.running.remove(item)
+
+    def revoke(self, item):
+        """已计为成功的任务事后失败（如输出未能从本地暂存目录复制到输出目录）"""
+        with self._lock:
+            self.succeeded = max(0, self.succeeded - 1)
+
+    @property
+    def failed(self):
+        return self.completed - self.succeeded
+
+    def snapshot(self):
+        """返回当前进度的一致快照"""
+        with self._lock:
+            percent = (self.completed / self.total * 100) if self.total else 100.0
+            return {
+                "total": self.total,
+                "completed": self.completed,
+                "succeeded": self.succeeded,
+                "failed": self.completed - self.succeeded,
+                "running": list(self.running),
+                "percent": percent,
+            }
+
+
+class EncodePool:
+    """并发运行多个转码任务的工作池"""
+
+    def __init__(self, jobs=None, total_cores=None):
+        """
+        初始化任务池
+
+        参数:
+            jobs: 并发任务数，None表示根据核心数自动选择
+            total_cores: 核心预算，None表示使用全部可用核心
+        """
+        self.total_cores = total_cores or cpu_count()
+        self.jobs = max(1, int(jobs)) if jobs else default_job_count(self.total_cores)
+        self.threads_per_job = split_thread_budget(self.total_cores, self.jobs)
+
+    def run(self, items, worker, on_start=None, on_finish=None, progress=None):
+        """
+        并发处理所有任务，阻塞直到全部完成
+
+        参数:
+            items: 待处理的任务列表
+            worker: 任务函数 worker(item, threads)，返回是否成功
+            on_start: 任务开始时的回调 on_start(item, progress)
+            on_finish: 任务结束时的回调 on_finish(item, success, progress)
+            progress: 共享的BatchProgress，用于多次run汇总到同一批次（可选）
+
+        返回:
+            汇总后的BatchProgress
+        """
+        items = list(items)
+        if progress is None:
+            progress = BatchProgress(len(items))
+
+        def run_one(item):
+            progress.start(item)
+            if on_start:
+                on_start(item, progress)
+            success = False
+            try:
+                success = bool(worker(item, self.threads_per_job))
+            finally:
+                progress.finish(item, success)
+                if on_finish:
+                    on_finish(item, success, progress)
+            return success
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            # list() 确保工作线程中的异常在此处抛出
+            list(executor.map(run_one, items))
+
+        return progress
@@ -0,0 +1,229 @@
+"""
+ffmpeg工具链能力探测
+记录ffmpeg的版本和可用的编码器、滤镜，并用一段短的测试编码确认硬件编码器和zscale
+在本机确实可用，同时测量各自的耗时。结果按 (路径, 大小, 修改时间) 缓存到磁盘，同一个ffmpeg只探测一次。
+转码引擎据此选择本机实测最快的H.264编码器和缩放滤镜，而不是固定使用libx264和scale。
+此模块不依赖tkinter。
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import time
+
+from probe_cache import ProbeCache, cache_dir
+
+# Windows下隐藏子进程的控制台窗口
+CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+CACHE_NAME = "ffmpeg_caps.json"
+
+# 缓存格式或探测内容变化时递增，使旧的缓存失效
+CAPS_VERSION = 2
+
+# 单次探测命令的超时（秒），硬件编码器初始化失败时可能较慢
+PROBE_TIMEOUT = 20
+
+# 候选的H.264编码器和缩放滤镜，需要测试编码成功才会被选用；按实测耗时排序，耗时相同时按此顺序
+ENCODER_PREFERENCE = ["h264_nvenc", "h264_qsv", "libx264"]
+SCALER_PREFERENCE = ["zscale", "scale"]
+
+# 测量速度的测试源：720p、2秒，足以摊薄硬件编码器的初始化时间
+BENCHMARK_SOURCE = "testsrc2=s=1280x720:r=30:d=2"
+
+# 超分算法名称在zscale中的对应名称
+ZSCALE_FILTERS = {"lanczos": "lanczos", "bicubic": "bicubic", "bilinear": "bilinear", "neighbor": "point"}
+
+# libx264预设在NVENC中的对应预设（p1最快，p7最慢）
+NVENC_PRESETS = {
+    "ultrafast": "p1", "superfast": "p1", "veryfast": "p2", "faster": "p3", "fast": "p4",
+    "medium": "p5", "slow": "p6", "slower": "p7", "veryslow": "p7",
+}
+
+# QSV支持的预设，更快的libx264预设按 veryfast 处理
+QSV_PRESETS = ["veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
+
+# 各编码器的像素格式和同时运行的会话数上限（消费级显卡限制NVENC并发会话数）
+ENCODER_PIX_FMTS = {"h264_qsv": "nv12"}
+ENCODER_MAX_JOBS = {"h264_nvenc": 3, "h264_qsv": 2}
+
+# 可选的编码器和缩放滤镜设置
+ENCODER_CHOICES = ["auto"] + ENCODER_PREFERENCE
+SCALER_CHOICES = ["auto"] + SCALER_PREFERENCE
+
+
+def find_ffprobe(ffmpeg_path):
+    """
+    返回与ffmpeg配套的ffprobe路径
+
+    只替换文件名中的 "ffmpeg"，目录名中含有 ffmpeg（如 /opt/ffmpeg-6/bin/ffmpeg）时也能正确推断；
+    同目录下没有ffprobe时在PATH中查找
+    """
+    directory, name = os.path.split(ffmpeg_path)
+    if "ffmpeg" in name:
+        candidate = os.path.join(directory, name.replace("ffmpeg", "ffprobe"))
+        if os.path.exists(candidate):
+            return candidate
+    return shutil.which("ffprobe") or os.path.join(directory, name.replace("ffmpeg", "ffprobe"))
+
+
+def run_probe(cmd):
+    """运行探测命令，返回 (退出码, 标准输出)"""
+    try:
+        result = subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+            text=True, errors='replace', timeout=PROBE_TIMEOUT, creationflags=CREATE_NO_WINDOW
+        )
+        return result.returncode, result.stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return None, ""
+
+
+def parse_version(text):
+    match = re.search(r"ffmpeg version (\S+)", text)
+    return match.group(1) if match else None
+
+
+def parse_components(text):
+    """
+    解析 -encoders/-filters 的输出，返回名称列表
+
+    两者的列表行都以标志列开头，后面是名称；表头在 "------" 分隔行之前
+    """
+    names = []
+    started = False
+    for line in text.splitlines():
+        parts = line.split()
+        if not started:
+            started = bool(parts) and set(parts[0]) == {"-"}
+            continue
+        if len(parts) >= 2:
+            names.append(parts[1])
+    return names
+
+
+def test_command(ffmpeg_path, args):
+    """用内置测试源编码一段短视频，确认编码器或滤镜可用并测量耗时"""
+    return [ffmpeg_path, "-hide_banner", "-nostdin", "-f", "lavfi", "-i", BENCHMARK_SOURCE] + args + [
+        "-f", "null", "-"
+    ]
+
+
+def benchmark(ffmpeg_path, candidates, available, args_for):
+    """
+    逐个运行测试编码
+
+    返回:
+        按耗时从短到长排列的可用候选，以及 {候选: 耗时（秒）}
+    """
+    seconds = {}
+    for candidate in candidates:
+        if candidate not in available:
+            continue
+        started = time.perf_counter()
+        code, _ = run_probe(test_command(ffmpeg_path, args_for(candidate)))
+        if code == 0:
+            seconds[candidate] = round(time.perf_counter() - started, 3)
+    # sorted 是稳定排序，耗时相同时保持候选顺序
+    return sorted(seconds, key=seconds.get), seconds
+
+
+def probe_capabilities(ffmpeg_path, log=print):
+    """
+    探测ffmpeg的版本、编码器和滤镜，并测试硬件编码器和zscale
+
+    返回:
+        能力字典 {"version", "encoders", "filters", "usable_encoders", "usable_scalers"}；
+        ffmpeg无法运行时返回None
+    """
+    code, output = run_probe([ffmpeg_path, "-hide_banner", "-version"])
+    version = parse_version(output) if code == 0 else None
+    if version is None:
+        return None
+
+    _, output = run_probe([ffmpeg_path, "-hide_banner", "-encoders"])
+    encoders = parse_components(output)
+    _, output = run_probe([ffmpeg_path, "-hide_banner", "-filters"])
+    filters = parse_components(output)
+
+    # 编译进ffmpeg的硬件编码器不一定有对应的硬件和驱动，逐个测试编码
+    usable_encoders, encoder_seconds = benchmark(
+        ffmpeg_path, ENCODER_PREFERENCE, encoders,
+        lambda encoder: ["-pix_fmt", ENCODER_PIX_FMTS.get(encoder, "yuv420p"), "-c:v", encoder]
+    )
+    usable_scalers, scaler_seconds = benchmark(
+        ffmpeg_path, SCALER_PREFERENCE, filters,
+        lambda scaler: ["-vf", scale_filter(scaler, 2.0, "lanczos")]
+    )
+
+    def describe(names, seconds):
+        return ", ".join(f"{name} {seconds[name]:.2f}s" for name in names) or "无"
+
+    log(f"FFmpeg {version}: 可用编码器 {describe(usable_encoders, encoder_seconds)}，"
+        f"缩放滤镜 {describe(usable_scalers, scaler_seconds)}")
+    return {
+        "version": version,
+        "encoders": encoders,
+        "filters": filters,
+        "usable_encoders": usable_encoders,
+        "usable_scalers": usable_scalers,
+        "encoder_seconds": encoder_seconds,
+        "scaler_seconds": scaler_seconds,
+    }
+
+
+def load_capabilities(ffmpeg_path, log=print, cache_path=None):
+    """读取缓存的能力信息，ffmpeg文件变化或没有缓存时重新探测"""
+    cache = ProbeCache(cache_path or os.path.join(cache_dir(), CACHE_NAME), max_entries=20)
+    path = os.path.realpath(ffmpeg_path)
+    caps = cache.get(path, field="capabilities")
+    if caps and caps.get("caps_version") == CAPS_VERSION:
+        return caps
+    caps = probe_capabilities(ffmpeg_path, log=log)
+    if caps is not None:
+        caps["caps_version"] = CAPS_VERSION
+        cache.put(path, caps, field="capabilities")
+        cache.save()
+    return caps
+
+
+def choose_encoder(caps, requested="auto"):
+    """选择H.264编码器：指定的编码器，或实测最快的可用编码器；未能探测时使用libx264"""
+    if requested and requested != "auto":
+        return requested
+    if caps and caps["usable_encoders"]:
+        return caps["usable_encoders"][0]
+    return "libx264"
+
+
+def choose_scaler(caps, requested="auto"):
+    if requested and requested != "auto":
+        return requested
+    if caps and caps["usable_scalers"]:
+        return caps["usable_scalers"][0]
+    return "scale"
+
+
+def scale_filter(scaler, scale, algorithm):
+    """返回按倍率放大的缩放滤镜"""
+    if scaler == "zscale":
+        return f"zscale=w=iw*{scale}:h=ih*{scale}:filter={ZSCALE_FILTERS.get(algorithm, 'lanczos')}"
+    return f"scale=iw*{scale}:ih*{scale}:flags={algorithm}"
+
+
+def encoder_params(encoder, x264_params):
+    """
+    将libx264的 -c:v/-preset/-crf 参数换算为指定编码器的参数
+
+    质量等级以libx264的CRF和预设定义，硬件编码器使用对应的恒定质量模式
+    """
+    if encoder == "libx264":
+        return list(x264_params)
+    preset = x264_params[x264_params.index("-preset") + 1] if "-preset" in x264_params else "medium"
+    crf = x264_params[x264_params.index("-crf") + 1] if "-crf" in x264_params else "23"
+    if encoder == "h264_nvenc":
+        return ["-c:v", encoder, "-preset", NVENC_PRESETS.get(preset, "p5"), "-rc", "vbr", "-cq", crf, "-b:v", "0"]
+    if encoder == "h264_qsv":
+        return ["-c:v", encoder, "-preset", preset if preset in QSV_PRESETS else "veryfast", "-global_quality", crf]
+    return ["-c:v", encoder]
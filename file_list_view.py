@@ -0,0 +1,106 @@
+"""
+虚拟化文件列表控件
+只绘制当前可见的行，列表中有十万个文件时滚动和刷新的开销也与窗口高度成正比。
+可见范围变化时通知调用方，用于只为滚动到视野中的文件生成缩略图。
+"""
+
+import os
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualFileList(ttk.Frame):
+    """按需绘制可见行的文件列表"""
+
+    def __init__(self, parent, row_height=18, font=('Consolas', 10), background='#f9f9f9',
+                 select_background='#cce0f5', on_visible=None, on_select=None):
+        """
+        参数:
+            on_visible: 可见行变化时的回调 on_visible(可见文件列表)
+            on_select: 选中行变化时的回调 on_select(文件路径或None)
+        """
+        super().__init__(parent)
+        self.row_height = row_height
+        self.font = font
+        self.select_background = select_background
+        self.on_visible = on_visible
+        self.on_select = on_select
+        self.items = []
+        self.selected = None  # 选中行的下标
+        self.visible_range = (0, 0)
+
+        self.canvas = tk.Canvas(self, background=background, highlightthickness=0, yscrollincrement=row_height)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scroll)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self.render())
+        # Windows和macOS使用 <MouseWheel>，X11使用 <Button-4>/<Button-5>
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll_units(-1 if e.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll_units(-1))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll_units(1))
+        self.canvas.bind("<Button-1>", self.on_click)
+
+    def set_items(self, items):
+        """设置列表内容（支持 len() 和下标访问的序列），只重绘可见行"""
+        self.items = items
+        if self.selected is not None and self.selected >= len(items):
+            self.selected = None
+        height = max(1, len(items)) * self.row_height
+        self.canvas.configure(scrollregion=(0, 0, 1, height))
+        self.visible_range = None  # 内容已变化，重绘后通知可见行
+        self.render()
+
+    def on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self.render()
+
+    def on_click(self, event):
+        index = int(self.canvas.canvasy(event.y) // self.row_height)
+        self.selected = index if 0 <= index < len(self.items) else None
+        self.render()
+        if self.on_select:
+            self.on_select(self.selected_item())
+
+    def selected_item(self):
+        """返回选中的文件路径，没有选中时返回None"""
+        if self.selected is None:
+            return None
+        return self.items[self.selected]
+
+    def visible_items(self):
+        """返回当前可见的文件路径"""
+        first, last = self.visible_range
+        return [self.items[i] for i in range(first, min(last, len(self.items)))]
+
+    def scroll_units(self, units):
+        self.canvas.yview_scroll(units * 3, "units")
+        self.render()
+        return "break"
+
+    def render(self):
+        """删除旧的行并绘制当前可见范围内的行"""
+        self.canvas.delete("row")
+        count = len(self.items)
+        if not count:
+            self.visible_range = (0, 0)
+            return
+        top = self.canvas.canvasy(0)
+        first = max(0, int(top // self.row_height))
+        visible = self.canvas.winfo_height() // self.row_height + 2
+        last = min(count, first + visible)
+        for index in range(first, last):
+            if index == self.selected:
+                self.canvas.create_rectangle(
+                    0, index * self.row_height, self.canvas.winfo_width(), (index + 1) * self.row_height,
+                    fill=self.select_background, outline='', tags="row"
+                )
+            self.canvas.create_text(
+                4, index * self.row_height + 2, anchor=tk.NW, font=self.font, tags="row",
+                text=f"{index + 1}. {os.path.basename(self.items[index])}"
+            )
+        if (first, last) != self.visible_range:
+            self.visible_range = (first, last)
+            if self.on_visible:
+                self.on_visible(self.visible_items())
@@ -0,0 +1,149 @@
+"""
+输入文件扫描
+递归扫描拖入的目录（基于 os.scandir，不跟随目录符号链接），
+导入文件清单（每行一个路径的文本文件，或路径列表的JSON文件），
+并分块返回结果，便于界面在扫描大型目录树时保持响应。
+此模块不依赖tkinter。
+"""
+
+import json
+import os
+
+# 每块返回的文件数
+CHUNK_SIZE = 2000
+
+# 视为文件清单的扩展名
+LIST_EXTENSIONS = {".txt", ".lst", ".json"}
+
+
+def normalize_path(path):
+    """统一路径格式，用于去重"""
+    return os.path.normpath(os.path.abspath(path))
+
+
+def is_file_list(path):
+    return os.path.splitext(path)[1].lower() in LIST_EXTENSIONS
+
+
+def read_file_list(path):
+    """
+    读取文件清单，相对路径按清单所在目录解析
+
+    支持每行一个路径的文本文件（忽略空行和 # 开头的行），
+    以及路径字符串列表或包含 "path"/"input" 字段的对象列表的JSON文件
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            if isinstance(data, dict):
+                data = data.get("files", [])
+            entries = []
+            for item in data:
+                if isinstance(item, dict):
+                    item = item.get("path") or item.get("input")
+                if isinstance(item, str):
+                    entries.append(item)
+        else:
+            entries = [line.strip() for line in f]
+            entries = [line for line in entries if line and not line.startswith("#")]
+    return [os.path.join(base, entry) for entry in entries]
+
+
+def iter_directory(root):
+    """递归遍历目录，按名称顺序逐个返回文件路径（先文件后子目录）；隐藏项和无法读取的目录被跳过"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            files.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        yield from sorted(files)
+        # 倒序压栈，使子目录按名称顺序处理
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+def scan_paths(paths, is_candidate, chunk_size=CHUNK_SIZE, on_error=None):
+    """
+    展开拖入或选择的路径，分块返回视频文件路径
+
+    参数:
+        paths: 文件、目录或文件清单路径
+        is_candidate: 判断文件是否需要处理的函数（如 is_video_file）
+        chunk_size: 每块的文件数
+        on_error: 读取清单失败时的回调 on_error(path, exception)
+
+    返回:
+        生成器，每次返回一个路径列表（未去重）
+    """
+    chunk = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = iter_directory(path)
+        elif is_file_list(path) and not is_candidate(path):
+            try:
+                candidates = [p for p in read_file_list(path) if os.path.isfile(p)]
+            except (OSError, ValueError) as e:
+                if on_error:
+                    on_error(path, e)
+                continue
+        else:
+            candidates = [path]
+
+        for candidate in candidates:
+            if is_candidate(candidate):
+                chunk.append(candidate)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+class FileSet:
+    """保持添加顺序、按规范化路径去重的文件列表"""
+
+    def __init__(self, paths=()):
+        self.items = []
+        self.keys = set()
+        self.add_many(paths)
+
+    def add_many(self, paths):
+        """添加多个文件，返回实际新增的路径列表"""
+        added = []
+        for path in paths:
+            key = normalize_path(path)
+            if key not in self.keys:
+                self.keys.add(key)
+                self.items.append(path)
+                added.append(path)
+        return added
+
+    def clear(self):
+        self.items = []
+        self.keys = set()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __contains__(self, path):
+        return normalize_path(path) in self.keys
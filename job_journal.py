@@ -0,0 +1,147 @@
+"""
+持久化的任务日志
+使用SQLite记录每个批次的设置和每个文件的状态（pending/running/done/skipped/failed/cancelled），
+程序或机器意外退出后可以只恢复未完成的文件。
+此模块不依赖tkinter。
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from probe_cache import cache_dir
+
+JOURNAL_NAME = "jobs.sqlite3"
+
+# 视为已结束的任务状态
+FINAL_STATES = ("done", "skipped", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    finished REAL,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    batch_id INTEGER NOT NULL REFERENCES batches(id),
+    position INTEGER NOT NULL,
+    input TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL,
+    PRIMARY KEY (batch_id, input)
+);
+"""
+
+
+def default_journal_path():
+    return os.path.join(cache_dir(), JOURNAL_NAME)
+
+
+def process_alive(host, pid):
+    """判断记录批次的进程是否仍在运行（无法判断时视为已退出）"""
+    if host != socket.gethostname() or os.name == 'nt':
+        # Windows上 os.kill 会终止进程，不能用来探测
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class JobJournal:
+    """批次和任务状态的持久化记录"""
+
+    def __init__(self, path=None):
+        self.path = path or default_journal_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        # 转码工作线程共用一个连接，由锁串行化
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def start_batch(self, settings, video_files):
+        """记录新批次及其全部文件，返回批次ID"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO batches (created, host, pid, settings) VALUES (?, ?, ?, ?)",
+                (time.time(), socket.gethostname(), os.getpid(), json.dumps(settings, ensure_ascii=False))
+            )
+            batch_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (batch_id, position, input) VALUES (?, ?, ?)",
+                ((batch_id, position, path) for position, path in enumerate(video_files))
+            )
+        return batch_id
+
+    def add_job(self, batch_id, input_file):
+        """批次运行中加入新文件"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO jobs (batch_id, position, input) "
+                "SELECT ?, COALESCE(MAX(position), -1) + 1, ? FROM jobs WHERE batch_id = ?",
+                (batch_id, input_file, batch_id)
+            )
+
+    def claim_batch(self, batch_id):
+        """恢复批次时把批次归属到当前进程"""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE batches SET host = ?, pid = ? WHERE id = ?",
+                              (socket.gethostname(), os.getpid(), batch_id))
+
+    def mark(self, batch_id, input_file, state, error=None):
+        """更新单个任务的状态"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ?, "
+                "attempts = attempts + (CASE WHEN ? = 'running' THEN 1 ELSE 0 END) "
+                "WHERE batch_id = ? AND input = ?",
+                (state, error, time.time(), state, batch_id, input_file)
+            )
+
+    def finish_batch(self, batch_id):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE batches SET finished = ? WHERE id = ?", (time.time(), batch_id))
+
+    def unfinished_batch(self):
+        """
+        查找最近一个被中断的批次
+
+        返回:
+            (批次ID, 设置字典, 未完成的文件列表)，没有可恢复的批次时返回None
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, host, pid, settings FROM batches WHERE finished IS NULL ORDER BY id DESC"
+            ).fetchall()
+            for batch_id, host, pid, settings in rows:
+                if process_alive(host, pid):
+                    continue  # 另一个仍在运行的实例的批次
+                pending = [row[0] for row in self.conn.execute(
+                    "SELECT input FROM jobs WHERE batch_id = ? AND state NOT IN (?, ?, ?, ?) ORDER BY position",
+                    (batch_id,) + FINAL_STATES
+                )]
+                if pending:
+                    return batch_id, json.loads(settings), pending
+        return None
+
+    def discard_batch(self, batch_id):
+        """放弃恢复一个批次"""
+        self.finish_batch(batch_id)
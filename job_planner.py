@@ -0,0 +1,169 @@
+"""
+转码任务规划
+在开始编码前为每个文件计算目标分辨率、超分倍率、估算的编码成本
+（目标像素数 × 时长 × 预设系数）和内存占用，并按成本安排任务顺序：
+最长优先可以缩短整批的总耗时，最短优先可以尽快得到第一批结果。
+此模块不依赖tkinter。
+"""
+
+import os
+
+from memory_governor import BASE_OVERHEAD, estimate_encode_memory
+from probe_cache import display_size
+from renditions import expand_renditions
+from stream_planner import plan_streams
+
+# 各x264预设相对于medium的编码耗时
+PRESET_COST = {
+    "ultrafast": 0.25,
+    "veryfast": 0.45,
+    "faster": 0.6,
+    "fast": 0.75,
+    "medium": 1.0,
+    "slow": 1.8,
+    "slower": 3.0,
+    "veryslow": 6.0,
+}
+
+# 直接复制视频流时相对于medium编码的耗时（只受读写速度限制）
+COPY_COST = 0.02
+
+# 调度顺序
+JOB_ORDERS = ("longest", "shortest", "input")
+DEFAULT_JOB_ORDER = "longest"
+
+
+def preset_of(params):
+    """从编码参数中取出 -preset 的值"""
+    if "-preset" in params:
+        index = params.index("-preset")
+        if index + 1 < len(params):
+            return params[index + 1]
+    return "medium"
+
+
+class JobPlan:
+    """单个文件的转码计划"""
+
+    def __init__(self, input_file, output_file, stream_plan, width=None, height=None,
+                 target_width=None, target_height=None, sr_scale=None, duration=None,
+                 cost=None, memory=None, segmented=False):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.stream_plan = stream_plan
+        self.width = width
+        self.height = height
+        self.target_width = target_width
+        self.target_height = target_height
+        self.sr_scale = sr_scale
+        self.duration = duration
+        self.cost = cost  # 估算的编码成本（百万像素·秒，已乘预设系数），时长或分辨率未知时为None
+        self.memory = memory  # 估算的峰值内存（字节）
+        self.segmented = segmented
+
+    def describe(self):
+        """返回适合在日志中显示的中文说明"""
+        parts = [os.path.basename(self.input_file)]
+        if self.width and self.target_width:
+            parts.append(f"{self.width}x{self.height} -> {self.target_width}x{self.target_height}")
+        parts.append(f"成本 {self.cost:.0f}" if self.cost is not None else "成本未知")
+        if self.memory:
+            parts.append(f"内存约 {self.memory / 1024 ** 2:.0f} MB")
+        if self.segmented:
+            parts.append("分段编码")
+        return "，".join(parts)
+
+    def to_dict(self):
+        return {
+            "mode": self.stream_plan.mode,
+            "width": self.width,
+            "height": self.height,
+            "target_width": self.target_width,
+            "target_height": self.target_height,
+            "sr_scale": self.sr_scale,
+            "duration": self.duration,
+            "cost": round(self.cost, 3) if self.cost is not None else None,
+            "memory": self.memory,
+            "segmented": self.segmented,
+        }
+
+
+def plan_job(engine, input_file, threads):
+    """
+    为单个文件生成转码计划
+
+    参数:
+        engine: ConverterEngine实例（元数据需已读取）
+        input_file: 输入文件路径
+        threads: 该任务分到的编码线程数，用于估算内存
+    """
+    settings = engine.settings
+    metadata = engine.get_metadata(input_file)
+    stream_plan = engine.get_stream_plan(input_file)
+    duration = metadata.get("duration")
+    size = display_size(metadata)
+
+    # 多路输出时每个版本单独估算，成本和内存按全部版本累加，目标分辨率取最大的版本
+    variants = expand_renditions(settings)
+    targets = []
+    for variant in variants:
+        variant_plan = stream_plan if variant is settings else plan_streams(metadata, variant)
+        scale = None
+        if variant.sr_enabled and not variant_plan.video_copy:
+            scale = engine.get_sr_scale(input_file, variant.sr_scale_value(), quiet=True)
+        targets.append((variant, variant_plan, scale))
+    scale = max((s for _, _, s in targets if s), default=None)
+
+    plan = JobPlan(
+        input_file, settings.output_file(input_file), stream_plan,
+        duration=duration, sr_scale=scale,
+        segmented=bool(not settings.renditions and not engine.pipe_sr and engine.segment_encoder
+                       and engine.segment_encoder.should_segment(input_file, stream_plan)),
+    )
+
+    if size:
+        width, height = size
+        target_width, target_height = (int(width * scale), int(height * scale)) if scale else (width, height)
+        plan.width, plan.height = width, height
+        plan.target_width, plan.target_height = target_width, target_height
+
+        plan.memory = 0
+        cost = 0.0
+        for variant, variant_plan, variant_scale in targets:
+            out_width, out_height = (int(width * variant_scale), int(height * variant_scale)) if variant_scale else (width, height)
+            if variant_plan.video_copy:
+                plan.memory += BASE_OVERHEAD
+                factor = COPY_COST
+            else:
+                plan.memory += estimate_encode_memory(width, height, out_width, out_height, threads)
+                factor = PRESET_COST.get(preset_of(engine.get_ffmpeg_params(variant)), 1.0)
+            cost += out_width * out_height * (duration or 0) * factor / 1e6
+        if duration:
+            plan.cost = cost
+
+    return plan
+
+
+def plan_jobs(engine, video_files, threads):
+    """为一批文件生成转码计划，保持输入顺序"""
+    return [plan_job(engine, input_file, threads) for input_file in video_files]
+
+
+def order_jobs(plans, order=DEFAULT_JOB_ORDER):
+    """
+    按成本排列转码计划
+
+    参数:
+        plans: JobPlan列表
+        order: "longest" 最长优先，"shortest" 最短优先，"input" 保持添加顺序
+
+    成本未知的任务按已知任务的平均成本参与排序
+    """
+    if order not in ("longest", "shortest"):
+        return list(plans)
+
+    known = [p.cost for p in plans if p.cost is not None]
+    fallback = sum(known) / len(known) if known else 0.0
+    # sorted 是稳定排序，成本相同的任务保持添加顺序
+    return sorted(plans, key=lambda p: p.cost if p.cost is not None else fallback,
+                  reverse=(order == "longest"))
@@ -0,0 +1,230 @@
+"""
+带优先级的转码调度
+按优先级分发任务，支持批次运行中加入新任务、调整优先级、取消单个或全部任务、
+暂停和继续整个批次。高优先级任务到达而没有空闲槽位时，挂起优先级最低的
+正在运行的ffmpeg进程（POSIX上使用SIGSTOP/SIGCONT），待有空闲槽位时再恢复；
+占用编码会话或内存预留的任务不被挂起，避免高优先级任务等待被挂起的任务释放资源。
+此模块不依赖tkinter。
+"""
+
+import heapq
+import itertools
+import signal
+import threading
+
+from encode_pool import BatchProgress
+
+# 默认优先级和"优先处理"使用的优先级
+NORMAL_PRIORITY = 0
+URGENT_PRIORITY = 10
+
+# 当前平台是否支持挂起进程（Windows不支持）
+CAN_SUSPEND = hasattr(signal, "SIGSTOP")
+
+
+def suspend_process(process):
+    """挂起子进程，不支持时返回False"""
+    if not CAN_SUSPEND or process.poll() is not None:
+        return False
+    try:
+        process.send_signal(signal.SIGSTOP)
+        return True
+    except OSError:
+        return False
+
+
+def resume_process(process):
+    if not CAN_SUSPEND or process.poll() is not None:
+        return
+    try:
+        process.send_signal(signal.SIGCONT)
+    except OSError:
+        pass
+
+
+class JobScheduler:
+    """按优先级运行转码任务的调度器"""
+
+    def __init__(self, jobs, threads, worker, control, on_start=None, on_finish=None, progress=None):
+        """
+        参数:
+            jobs: 同时运行的任务数
+            threads: 每个任务的编码线程数
+            worker: 任务函数 worker(item, threads)，返回是否成功
+            control: 提供 suspend_job/resume_job/cancel_job 的对象（转码引擎），
+                suspend_job(item, preempt=True) 在任务不能让位时返回False
+            on_start: 任务开始时的回调 on_start(item, progress)
+            on_finish: 任务结束时的回调 on_finish(item, success, progress)，取消的任务也会调用
+            progress: 共享的BatchProgress（可选）
+        """
+        self.jobs = max(1, jobs)
+        self.threads = threads
+        self.worker = worker
+        self.control = control
+        self.on_start = on_start
+        self.on_finish = on_finish
+        self.progress = progress or BatchProgress(0)
+
+        self.heap = []
+        self.counter = itertools.count()
+        self.priorities = {}
+        self.pending = set()
+        self.active = set()  # 正在运行且占用槽位的任务
+        self.preempted = set()  # 为高优先级任务让出槽位而被挂起的任务
+        self.cancelled = set()
+        self.paused = False
+        self.cond = threading.Condition()
+
+    def submit(self, item, priority=NORMAL_PRIORITY):
+        """加入一个任务，批次运行中也可以调用"""
+        with self.cond:
+            if item in self.pending or item in self.active or item in self.preempted:
+                return False
+            self.cancelled.discard(item)
+            self.pending.add(item)
+            self.priorities[item] = priority
+            heapq.heappush(self.heap, (-priority, next(self.counter), item))
+            self.cond.notify_all()
+            return True
+
+    def set_priority(self, item, priority):
+        """调整任务优先级；正在运行的任务在下一次调度时按新优先级参与抢占"""
+        with self.cond:
+            if item not in self.priorities:
+                return False
+            self.priorities[item] = priority
+            if item in self.pending:
+                # 旧的堆条目在取出时按优先级不一致丢弃
+                heapq.heappush(self.heap, (-priority, next(self.counter), item))
+            self.cond.notify_all()
+            return True
+
+    def cancel(self, item):
+        """取消一个任务：未开始的直接移除，正在运行的终止其ffmpeg进程"""
+        with self.cond:
+            removed = item in self.pending
+            if removed:
+                self.pending.discard(item)
+                self.cancelled.add(item)
+                self.progress.finish(item, False)
+            elif item in self.active or item in self.preempted:
+                self.cancelled.add(item)
+                self.control.cancel_job(item)
+            else:
+                return False
+            self.cond.notify_all()
+        # 与 _run_one 相同，在锁外调用回调，记录遥测和日志时不阻塞调度线程和界面
+        if removed and self.on_finish:
+            self.on_finish(item, False, self.progress)
+        return True
+
+    def unfinished(self):
+        """返回尚未结束的任务（待处理、运行中和被挂起的）"""
+        with self.cond:
+            return list(self.pending) + list(self.active) + list(self.preempted)
+
+    def cancel_all(self):
+        for item in self.unfinished():
+            self.cancel(item)
+
+    def pause(self):
+        """暂停批次：不再启动新任务，并挂起正在运行的任务"""
+        with self.cond:
+            if self.paused:
+                return False
+            self.paused = True
+            for item in self.active:
+                self.control.suspend_job(item)
+            return True
+
+    def resume(self):
+        with self.cond:
+            if not self.paused:
+                return False
+            self.paused = False
+            for item in self.active:
+                self.control.resume_job(item)
+            self.cond.notify_all()
+            return True
+
+    def _peek(self):
+        """返回优先级最高的待处理任务，丢弃过期的堆条目"""
+        while self.heap:
+            negative, _, item = self.heap[0]
+            if item in self.pending and self.priorities[item] == -negative:
+                return item
+            heapq.heappop(self.heap)
+        return None
+
+    def _dispatch(self):
+        """在持有锁时调用：恢复被挂起的任务、启动新任务或抢占低优先级任务"""
+        if self.paused:
+            return
+        while True:
+            top = self._peek()
+            if len(self.active) < self.jobs:
+                # 有空闲槽位时，被挂起的任务优先于同级或更低优先级的新任务
+                if self.preempted:
+                    victim = max(self.preempted, key=lambda i: self.priorities[i])
+                    if top is None or self.priorities[victim] >= self.priorities[top]:
+                        self.preempted.discard(victim)
+                        self.active.add(victim)
+                        self.control.resume_job(victim)
+                        continue
+                if top is None:
+                    return
+                heapq.heappop(self.heap)
+                self.pending.discard(top)
+                self.active.add(top)
+                threading.Thread(target=self._run_one, args=(top,), daemon=True).start()
+                continue
+
+            # 没有空闲槽位：新任务优先级更高时，从优先级最低的开始挂起一个可以让位的正在运行的任务
+            if top is None or not CAN_SUSPEND:
+                return
+            lower = sorted((i for i in self.active if self.priorities[i] < self.priorities[top]),
+                           key=lambda i: self.priorities[i])
+            victim = next((i for i in lower if self.control.suspend_job(i, preempt=True)), None)
+            if victim is None:
+                return
+            self.active.discard(victim)
+            self.preempted.add(victim)
+
+    def _run_one(self, item):
+        self.progress.start(item)
+        if self.on_start:
+            self.on_start(item, self.progress)
+        success = False
+        try:
+            success = bool(self.worker(item, self.threads))
+        finally:
+            with self.cond:
+                self.active.discard(item)
+                self.preempted.discard(item)
+                self.cond.notify_all()
+            self.progress.finish(item, success)
+            if self.on_finish:
+                self.on_finish(item, success, self.progress)
+
+    def run(self, items=()):
+        """
+        运行直到所有任务（包括运行中加入的任务）完成或被取消
+
+        收到KeyboardInterrupt时取消全部任务，等待正在运行的任务退出后重新抛出
+        """
+        for item in items:
+            self.submit(item)
+        try:
+            with self.cond:
+                while True:
+                    self._dispatch()
+                    if self._peek() is None and not self.active and not self.preempted:
+                        return self.progress
+                    self.cond.wait(0.5)
+        except KeyboardInterrupt:
+            self.paused = False
+            self.cancel_all()
+            with self.cond:
+                while self.active or self.preempted:
+                    self.cond.wait(0.5)
+            raise
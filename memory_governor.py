@@ -0,0 +1,166 @@
+"""
+超分辨率任务的内存调度
+按估算的内存占用在全局预算内准入超分任务，并通过 /proc 实时监控每个ffmpeg子进程的实际内存（RSS）。
+所有受监控进程的内存总和接近预算时，终止占用最多的进程，由转码引擎以更低的超分倍率重试。
+没有 /proc 的系统上只进行准入控制，不做实时监控。
+此模块不依赖tkinter。
+"""
+
+import os
+import threading
+import time
+
+# 监控线程的采样间隔（秒）
+SAMPLE_INTERVAL = 0.5
+
+# 受监控进程的内存总和达到预算的该比例时终止最大的进程
+HIGH_WATERMARK = 0.95
+
+# 未指定预算时使用当前可用内存的比例
+DEFAULT_BUDGET_FRACTION = 0.8
+
+# 固定开销：ffmpeg进程本身、编解码器上下文和复用队列
+BASE_OVERHEAD = 64 * 1024 * 1024
+
+# x264在较慢预设下的默认前瞻帧数
+DEFAULT_LOOKAHEAD = 40
+
+# 表示内存不足的退出码：被SIGKILL终止（内核OOM killer或本模块），
+# 以及Windows的访问冲突（0xC0000005）和内存不足（0xC0000017）
+OOM_EXIT_CODES = {-9, 137, 3221225477, 3221225495}
+
+
+def read_rss(pid):
+    """从 /proc/<pid>/status 读取进程的常驻内存（字节），不可用时返回None"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def available_memory():
+    """从 /proc/meminfo 读取可用内存（字节），不可用时返回None"""
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def is_oom_exit(return_code):
+    """判断ffmpeg的退出码是否表示内存不足"""
+    return return_code in OOM_EXIT_CODES
+
+
+def estimate_encode_memory(src_width, src_height, dst_width, dst_height, threads, lookahead=DEFAULT_LOOKAHEAD):
+    """
+    估算一个超分转码进程的峰值内存（字节）
+
+    按YUV420每像素1.5字节计算：编码器持有前瞻帧和每个线程的参考帧（目标尺寸），
+    解码器和滤镜按线程数缓存若干源帧和目标帧。
+    """
+    src_frame = src_width * src_height * 1.5
+    dst_frame = dst_width * dst_height * 1.5
+    encoder_frames = lookahead + 2 * threads + 8
+    decoder_frames = threads + 8
+    return int(BASE_OVERHEAD + dst_frame * encoder_frames + (src_frame + dst_frame) * decoder_frames)
+
+
+class _Reservation:
+    def __init__(self, governor, amount):
+        self.governor = governor
+        self.amount = amount
+
+    def __enter__(self):
+        self.governor.acquire(self.amount)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.governor.release(self.amount)
+
+
+class MemoryGovernor:
+    """全局内存预算：准入控制加实时RSS监控"""
+
+    def __init__(self, budget=None, log=print):
+        """
+        参数:
+            budget: 内存预算（字节），None表示使用当前可用内存的80%，无法获取时不限制
+            log: 日志回调函数
+        """
+        if budget is None:
+            available = available_memory()
+            budget = int(available * DEFAULT_BUDGET_FRACTION) if available else None
+        self.budget = budget
+        self.log = log
+        self.reserved = 0
+        self.running = 0
+        self.watched = {}
+        self._cond = threading.Condition()
+        self._monitor = None
+
+    def acquire(self, amount):
+        """预留内存，预算不足时等待；没有其他任务运行时总是准入，避免单个大任务永远等待"""
+        with self._cond:
+            if self.budget:
+                while self.running and self.reserved + amount > self.budget:
+                    self._cond.wait()
+            self.reserved += amount
+            self.running += 1
+
+    def release(self, amount):
+        with self._cond:
+            self.reserved -= amount
+            self.running -= 1
+            self._cond.notify_all()
+
+    def reserve(self, amount):
+        """返回用于 with 语句的预留对象"""
+        return _Reservation(self, amount)
+
+    def watch(self, process):
+        """开始监控子进程的实际内存"""
+        if not self.budget or not os.path.exists("/proc/self/status"):
+            return
+        with self._cond:
+            self.watched[process.pid] = process
+            if self._monitor is None or not self._monitor.is_alive():
+                self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+                self._monitor.start()
+
+    def unwatch(self, process):
+        with self._cond:
+            self.watched.pop(process.pid, None)
+
+    def _monitor_loop(self):
+        while True:
+            with self._cond:
+                processes = list(self.watched.values())
+            if not processes:
+                return
+
+            usage = []
+            for process in processes:
+                rss = read_rss(process.pid)
+                if rss is not None and process.poll() is None:
+                    usage.append((rss, process))
+
+            total = sum(rss for rss, _ in usage)
+            if usage and total >= self.budget * HIGH_WATERMARK:
+                rss, largest = max(usage, key=lambda item: item[0])
+                self.log(f"内存接近上限（{total / 1024 ** 2:.0f} MB / {self.budget / 1024 ** 2:.0f} MB），"
+                         f"终止占用 {rss / 1024 ** 2:.0f} MB 的进程 {largest.pid}")
+                try:
+                    largest.kill()
+                except OSError:
+                    pass
+                self.unwatch(largest)
+
+            time.sleep(SAMPLE_INTERVAL)
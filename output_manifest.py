@@ -0,0 +1,134 @@
+"""
+输出目录清单
+记录每个输出文件对应的输入文件指纹和ffmpeg参数哈希，
+重新运行同一批次时可以跳过输入和参数都没有变化的文件。
+此模块不依赖tkinter。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from probe_cache import file_fingerprint
+
+# 清单文件名，保存在输出目录中
+MANIFEST_NAME = ".video_converter_manifest.json"
+
+# 不影响输出内容的参数，计算哈希时忽略其取值
+VOLATILE_OPTIONS = {"-threads"}
+
+
+def partial_path(output_file):
+    """
+    返回输出文件的临时路径
+
+    ffmpeg先写入同目录下的隐藏临时文件，成功后再原子地重命名为最终文件，
+    中途崩溃时不会留下看似完整的截断文件。保留原扩展名以便ffmpeg选择封装格式。
+    """
+    directory, name = os.path.split(output_file)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.partial{ext}")
+
+
+def command_hash(cmd, input_file, output_file):
+    """
+    计算ffmpeg参数列表的哈希
+
+    输入、输出路径和ffmpeg程序路径替换为占位符，线程数等不影响输出内容的参数被忽略，
+    因此只有质量、超分、格式等真正改变输出的设置会使哈希变化。
+    """
+    normalized = []
+    skip_value = False
+    for i, arg in enumerate(cmd):
+        if skip_value:
+            skip_value = False
+            continue
+        if i == 0:
+            arg = "<ffmpeg>"
+        elif arg == input_file:
+            arg = "<input>"
+        elif arg == output_file:
+            arg = "<output>"
+        elif arg in VOLATILE_OPTIONS:
+            skip_value = True
+            continue
+        normalized.append(arg)
+    return hashlib.sha256("\0".join(normalized).encode("utf-8")).hexdigest()
+
+
+class OutputManifest:
+    """输出目录中的转码记录"""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get("outputs", {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def reload(self):
+        """
+        修改前重新读取清单文件，调用方需持有锁
+
+        分布式转码时多台机器写入同一个输出目录，只在内存中修改会覆盖其他机器写入的记录
+        """
+        if os.path.exists(self.path):
+            self.load()
+
+    def save(self):
+        """原子写入清单文件，调用方需持有锁"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": 1, "outputs": self.entries}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存输出清单失败: {str(e)}")
+
+    def is_up_to_date(self, input_file, output_file, params_hash):
+        """输入文件、参数和输出文件都与记录一致时返回True"""
+        with self._lock:
+            entry = self.entries.get(os.path.basename(output_file))
+        if not entry:
+            return False
+        input_fp = file_fingerprint(input_file)
+        output_fp = file_fingerprint(output_file)
+        return (
+            input_fp is not None and output_fp is not None
+            and entry.get("input") == os.path.abspath(input_file)
+            and entry.get("params_hash") == params_hash
+            and tuple(entry.get("input_fingerprint", ())) == input_fp
+            and tuple(entry.get("output_fingerprint", ())) == output_fp
+        )
+
+    def record(self, input_file, output_file, params_hash):
+        """记录一次成功的转码"""
+        input_fp = file_fingerprint(input_file)
+        output_fp = file_fingerprint(output_file)
+        if input_fp is None or output_fp is None:
+            return
+        with self._lock:
+            self.reload()
+            self.entries[os.path.basename(output_file)] = {
+                "input": os.path.abspath(input_file),
+                "input_fingerprint": list(input_fp),
+                "output_fingerprint": list(output_fp),
+                "params_hash": params_hash,
+                "completed": time.time(),
+            }
+            self.save()
+
+    def discard(self, output_file):
+        """转码失败时删除记录，避免把残缺的输出当作有效结果"""
+        with self._lock:
+            self.reload()
+            if self.entries.pop(os.path.basename(output_file), None) is not None:
+                self.save()
@@ -0,0 +1,441 @@
+"""
+Python超分滤镜的原始帧管道
+第一个ffmpeg把视频解码为rgb24原始帧写入管道，Python放大器以NumPy数组批量处理，
+第二个ffmpeg从管道读取放大后的帧并编码，音频直接取自原文件。
+帧数据放在预先分配、循环使用的共享内存槽中（readinto 直接读入，不为每帧分配内存），
+空闲槽用完时读取暂停，形成背压；各批次由多个进程并行处理，按顺序写入编码器。
+NumPy为可选依赖，未安装（或Python低于3.8）时 PIPE_AVAILABLE 为False，转码引擎回退到ffmpeg的缩放滤镜；
+NumPy只在创建管道和放大进程中导入，不使用该引擎时不增加启动时间。
+此模块不依赖tkinter。
+"""
+
+import importlib
+import importlib.util
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from process_usage import wait_with_rusage
+
+# 首次使用时由 _import_numpy 导入
+np = None
+shared_memory = None
+
+# Windows下隐藏子进程的控制台窗口
+CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+# multiprocessing.shared_memory 需要Python 3.8+
+PIPE_AVAILABLE = sys.version_info >= (3, 8) and importlib.util.find_spec("numpy") is not None
+
+# 可选的超分引擎
+SR_ENGINES = ["ffmpeg", "pipe"]
+
+DEFAULT_UPSCALER = "edge"
+
+# 每批最多的帧数，以及单个输出槽的大小上限（放大到4K时每批只有几帧）
+BATCH_FRAMES = 8
+SLOT_BYTES = 64 * 1024 * 1024
+
+# 放大器处理一批帧时的临时数组：约相当于6个目标尺寸的float32批次（双线性插值的中间结果、
+# 亮度梯度和3×3模糊），另加每个放大进程的解释器和NumPy本身
+WORKER_TEMP_ARRAYS = 6
+WORKER_BASE_BYTES = 64 * 1024 * 1024
+
+# 等待放大结果时检查放大进程是否意外退出的间隔（秒）
+WORKER_POLL_INTERVAL = 1.0
+
+# 锐化强度
+SHARPEN_AMOUNT = 0.6
+EDGE_AMOUNT = 1.2
+
+
+def _import_numpy():
+    global np, shared_memory
+    if np is None:
+        import numpy
+        from multiprocessing import shared_memory as memory_module
+        np, shared_memory = numpy, memory_module
+
+
+def target_size(width, height, scale):
+    """放大后的尺寸，取偶数以满足yuv420p的要求"""
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def _bilinear(frames, out_height, out_width):
+    """双线性放大一批帧，返回float32数组 (N, H, W, 3)"""
+    _, height, width, _ = frames.shape
+    ys = np.clip((np.arange(out_height) + 0.5) * height / out_height - 0.5, 0, height - 1)
+    xs = np.clip((np.arange(out_width) + 0.5) * width / out_width - 0.5, 0, width - 1)
+    y0 = ys.astype(np.intp)
+    x0 = xs.astype(np.intp)
+    y1 = np.minimum(y0 + 1, height - 1)
+    x1 = np.minimum(x0 + 1, width - 1)
+    wy = (ys - y0).astype(np.float32)[None, :, None, None]
+    wx = (xs - x0).astype(np.float32)[None, None, :, None]
+
+    data = frames.astype(np.float32)
+    top = data[:, y0]
+    bottom = data[:, y1]
+    rows = top + (bottom - top) * wy
+    left = rows[:, :, x0]
+    return left + (rows[:, :, x1] - left) * wx
+
+
+def _box_blur(data):
+    """3×3均值模糊，边缘复制像素"""
+    padded = np.pad(data, ((0, 0), (1, 1), (1, 1), (0, 0)), mode="edge")
+    height, width = data.shape[1:3]
+    total = np.zeros_like(data)
+    for dy in range(3):
+        for dx in range(3):
+            total += padded[:, dy:dy + height, dx:dx + width]
+    return total / 9.0
+
+
+def upscale_nearest(frames, out):
+    """最近邻放大"""
+    _, height, width, _ = frames.shape
+    _, out_height, out_width, _ = out.shape
+    ys = np.arange(out_height) * height // out_height
+    xs = np.arange(out_width) * width // out_width
+    out[...] = frames[:, ys][:, :, xs]
+
+
+def upscale_sharpen(frames, out):
+    """双线性放大后做反锐化掩模"""
+    data = _bilinear(frames, out.shape[1], out.shape[2])
+    data += SHARPEN_AMOUNT * (data - _box_blur(data))
+    np.copyto(out, np.clip(data, 0, 255), casting="unsafe")
+
+
+def upscale_edge(frames, out):
+    """
+    边缘自适应放大：双线性放大后按亮度梯度决定锐化强度
+
+    平坦区域几乎不锐化，避免放大噪点；边缘处锐化更强，减少双线性插值造成的模糊
+    """
+    data = _bilinear(frames, out.shape[1], out.shape[2])
+    luma = data @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gy = np.abs(np.diff(luma, axis=1, append=luma[:, -1:]))
+    gx = np.abs(np.diff(luma, axis=2, append=luma[:, :, -1:]))
+    strength = gx + gy
+    amount = (EDGE_AMOUNT * strength / (strength + 16.0))[..., None]
+    data += amount * (data - _box_blur(data))
+    np.copyto(out, np.clip(data, 0, 255), casting="unsafe")
+
+
+# 内置放大器：函数 upscaler(frames, out)，frames 为 (N, h, w, 3) 的uint8数组，
+# 结果写入预先分配的 out (N, H, W, 3)
+UPSCALERS = {
+    "nearest": upscale_nearest,
+    "sharpen": upscale_sharpen,
+    "edge": upscale_edge,
+}
+
+
+def load_upscaler(name):
+    """
+    按名称返回放大器函数
+
+    参数:
+        name: 内置放大器名称，或 "模块:函数" 形式的自定义放大器（需可在子进程中导入）
+    """
+    if name in UPSCALERS:
+        return UPSCALERS[name]
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError(f"未知的放大器: {name}（可选: {', '.join(UPSCALERS)}，或 模块:函数）")
+    try:
+        return getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"无法加载放大器 {name}: {str(e)}")
+
+
+def _attach(name):
+    """
+    在子进程中打开共享内存，由父进程负责释放
+
+    spawn 启动的子进程与父进程共用同一个资源跟踪器，重复登记不会产生多余记录，
+    子进程不能自行注销，否则父进程释放时跟踪器会报错
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(tasks, done, in_names, out_names, in_shape, out_shape, upscaler_name):
+    """放大进程：从任务队列取 (序号, 槽, 帧数)，处理后把结果写入对应的输出槽"""
+    memories = []
+    try:
+        _import_numpy()
+        upscaler = load_upscaler(upscaler_name)
+        inputs = []
+        outputs = []
+        for in_name, out_name in zip(in_names, out_names):
+            in_memory, out_memory = _attach(in_name), _attach(out_name)
+            memories.extend([in_memory, out_memory])
+            inputs.append(np.ndarray(in_shape, dtype=np.uint8, buffer=in_memory.buf))
+            outputs.append(np.ndarray(out_shape, dtype=np.uint8, buffer=out_memory.buf))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, frames = task
+            upscaler(inputs[slot][:frames], outputs[slot][:frames])
+            done.put((seq, slot, frames))
+    except Exception as e:
+        done.put(("error", f"{type(e).__name__}: {str(e)}", 0))
+    finally:
+        inputs = outputs = None
+        for memory in memories:
+            memory.close()
+
+
+def _read_full(stream, view):
+    """把数据读满 view，返回读到的字节数（到达结尾时可能不足）"""
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+class PipeSuperResolution:
+    """解码 → Python放大 → 编码 的管道"""
+
+    def __init__(self, upscaler=DEFAULT_UPSCALER, workers=2, batch_frames=BATCH_FRAMES, log=print):
+        """
+        参数:
+            upscaler: 放大器名称，见 load_upscaler
+            workers: 并行处理的进程数
+            batch_frames: 每批最多的帧数
+        """
+        if not PIPE_AVAILABLE:
+            raise ValueError("Python超分需要安装NumPy")
+        _import_numpy()
+        load_upscaler(upscaler)  # 尽早发现无效的放大器名称
+        self.upscaler = upscaler
+        self.workers = max(1, workers)
+        self.batch_frames = max(1, batch_frames)
+        self.log = log
+
+    def layout(self, size, target, workers=None):
+        """返回 (每批帧数, 槽数)：每个处理进程一个槽，另加读取和写入各一个"""
+        out_frame_bytes = target[0] * target[1] * 3
+        batch = max(1, min(self.batch_frames, SLOT_BYTES // out_frame_bytes))
+        return batch, (workers or self.workers) + 2
+
+    def buffer_bytes(self, size, target, workers=None):
+        """共享内存槽的总大小（字节）"""
+        batch, slots = self.layout(size, target, workers)
+        return slots * batch * (size[0] * size[1] + target[0] * target[1]) * 3
+
+    def memory_bytes(self, size, target, workers=None):
+        """管道除ffmpeg进程外的内存（字节），用于内存预算：共享内存槽加每个放大进程的临时数组"""
+        batch, _ = self.layout(size, target, workers)
+        per_worker = WORKER_BASE_BYTES + WORKER_TEMP_ARRAYS * batch * target[0] * target[1] * 3 * 4
+        return self.buffer_bytes(size, target, workers) + (workers or self.workers) * per_worker
+
+    def decode_command(self, ffmpeg_path, input_file, fps, threads=1, input_options=()):
+        """
+        把第一路视频解码为恒定帧率的rgb24原始帧，写入标准输出
+
+        input_options 为原文件的输入参数，如样本预览截取片段的 -ss/-t
+        """
+        return [ffmpeg_path, "-v", "error", "-threads", str(threads)] + list(input_options) + [
+            "-i", input_file, "-map", "0:v:0", "-r", fps, "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+
+    def encode_command(self, ffmpeg_path, input_file, target, fps, output_params, output_file, input_options=()):
+        """从标准输入读取放大后的原始帧编码，音频取自原文件（input_options 与解码命令相同）"""
+        return [ffmpeg_path, "-v", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                "-s", f"{target[0]}x{target[1]}", "-r", fps, "-i", "pipe:0"] + list(input_options) + [
+                "-i", input_file, "-map", "0:v:0", "-map", "1:a:0?"] + list(output_params) + ["-y", output_file]
+
+    def run(self, decode_cmd, encode_cmd, size, target, on_frames=None, on_spawn=None, on_exit=None,
+            workers=None):
+        """
+        运行管道
+
+        参数:
+            size: 解码后的帧尺寸 (宽, 高)
+            target: 放大后的帧尺寸 (宽, 高)
+            on_frames: 每写入一批帧后的回调 on_frames(已写入的帧数)
+            on_spawn: ffmpeg进程启动后的回调 on_spawn(process)，用于登记取消、挂起和内存监控
+            on_exit: ffmpeg进程结束后的回调 on_exit(process, 耗时, 帧数, 资源使用)
+            workers: 本次使用的处理进程数，默认使用构造时的设置
+
+        返回:
+            退出码：解码器失败时为解码器的退出码；放大器出错时为1，放大进程被终止（如内存不足）时为其退出码；
+            否则为编码器的退出码
+        """
+        width, height = size
+        out_width, out_height = target
+        frame_bytes = width * height * 3
+        out_frame_bytes = out_width * out_height * 3
+        worker_count = max(1, workers or self.workers)
+        batch, slot_count = self.layout(size, target, worker_count)
+        started = time.perf_counter()
+
+        in_memories = []
+        out_memories = []
+        in_views = []
+        out_views = []
+        workers = []
+        processes = []
+        error = []
+        upscaler_failed = False
+        upscaler_code = 1
+        try:
+            for _ in range(slot_count):
+                in_memories.append(shared_memory.SharedMemory(create=True, size=batch * frame_bytes))
+                out_memories.append(shared_memory.SharedMemory(create=True, size=batch * out_frame_bytes))
+            in_views = [memory.buf[:batch * frame_bytes] for memory in in_memories]
+            out_views = [memory.buf[:batch * out_frame_bytes] for memory in out_memories]
+
+            # spawn 不会复制父进程中正在运行的线程持有的锁
+            context = multiprocessing.get_context("spawn")
+            tasks = context.Queue()
+            done = context.Queue()
+            for _ in range(worker_count):
+                worker = context.Process(
+                    target=_worker_main, daemon=True,
+                    args=(tasks, done, [m.name for m in in_memories], [m.name for m in out_memories],
+                          (batch, height, width, 3), (batch, out_height, out_width, 3), self.upscaler)
+                )
+                worker.start()
+                workers.append(worker)
+
+            decoder = subprocess.Popen(decode_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       stdin=subprocess.DEVNULL, creationflags=CREATE_NO_WINDOW)
+            processes.append(decoder)
+            encoder = subprocess.Popen(encode_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE, creationflags=CREATE_NO_WINDOW)
+            processes.append(encoder)
+            for process in processes:
+                threading.Thread(target=self._forward_log, args=(process,), daemon=True).start()
+                if on_spawn:
+                    on_spawn(process)
+
+            # 空闲槽队列：读取线程取不到空闲槽时阻塞，解码器随之因管道写满而暂停
+            free_slots = queue.Queue()
+            for slot in range(slot_count):
+                free_slots.put(slot)
+            state = {"batches": None, "aborted": False}
+
+            def read_frames():
+                seq = 0
+                try:
+                    while True:
+                        slot = free_slots.get()
+                        if state["aborted"]:
+                            break
+                        filled = _read_full(decoder.stdout, in_views[slot])
+                        frames = filled // frame_bytes
+                        if frames:
+                            tasks.put((seq, slot, frames))
+                            seq += 1
+                        if filled < len(in_views[slot]):
+                            break
+                except (OSError, ValueError) as e:
+                    error.append(f"读取解码输出失败: {str(e)}")
+                finally:
+                    state["batches"] = seq
+                    done.put(None)
+
+            reader = threading.Thread(target=read_frames, daemon=True)
+            reader.start()
+
+            # 按序号把处理完的批次写入编码器
+            ready = {}
+            next_seq = 0
+            written = 0
+            try:
+                while state["batches"] is None or next_seq < state["batches"]:
+                    try:
+                        item = done.get(timeout=WORKER_POLL_INTERVAL)
+                    except queue.Empty:
+                        # 放大进程被系统终止（如OOM killer）或崩溃时不会发送消息，不能一直等待
+                        dead = [worker for worker in workers if not worker.is_alive()]
+                        if not dead:
+                            continue
+                        error.append(f"放大进程意外退出，退出码: {dead[0].exitcode}")
+                        upscaler_failed = True
+                        upscaler_code = dead[0].exitcode if dead[0].exitcode else 1
+                        break
+                    if item is None:
+                        continue
+                    if item[0] == "error":
+                        error.append(f"放大器出错: {item[1]}")
+                        upscaler_failed = True
+                        break
+                    seq, slot, frames = item
+                    ready[seq] = (slot, frames)
+                    while next_seq in ready:
+                        slot, frames = ready.pop(next_seq)
+                        encoder.stdin.write(out_views[slot][:frames * out_frame_bytes])
+                        free_slots.put(slot)
+                        next_seq += 1
+                        written += frames
+                        if on_frames:
+                            on_frames(written)
+            except OSError as e:
+                # 编码器提前退出（出错或被取消）
+                error.append(f"写入编码器失败: {str(e)}")
+            finally:
+                try:
+                    encoder.stdin.close()
+                except OSError:
+                    pass
+                if error:
+                    state["aborted"] = True
+                    for slot in range(slot_count):
+                        free_slots.put(slot)
+                    if decoder.poll() is None:
+                        decoder.kill()
+                reader.join()
+                decoder.stdout.close()
+
+            return_codes = []
+            for process, frames in ((decoder, 0), (encoder, written)):
+                return_code, usage = wait_with_rusage(process)
+                return_codes.append(return_code)
+                if on_exit:
+                    on_exit(process, time.perf_counter() - started, frames, usage)
+            for message in error:
+                self.log(message)
+            # 放大器出错时两个ffmpeg进程都被终止，它们的退出码不能说明失败原因
+            if upscaler_failed:
+                return upscaler_code
+            if return_codes[0] != 0:
+                return return_codes[0]
+            if error and return_codes[1] == 0:
+                return 1
+            return return_codes[1]
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            for worker in workers:
+                tasks.put(None)
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+            for view in in_views + out_views:
+                view.release()
+            for memory in in_memories + out_memories:
+                memory.close()
+                memory.unlink()
+
+    def _forward_log(self, process):
+        for raw in iter(process.stderr.readline, b''):
+            line = raw.decode('utf-8', 'replace').strip()
+            if line:
+                self.log(line)
+        process.stderr.close()
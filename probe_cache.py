@@ -0,0 +1,275 @@
+"""
+视频元数据探测与持久化缓存
+添加文件时并行调用ffprobe读取时长、分辨率、编码、像素格式和旋转角度，
+结果按 (路径, 大小, 修改时间) 缓存到磁盘，重新打开同一批文件时无需再次调用ffprobe。
+此模块不依赖tkinter。
+"""
+
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Windows下隐藏子进程的控制台窗口
+CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+# 缓存条目数上限，超过后淘汰最久未使用的条目
+DEFAULT_MAX_ENTRIES = 50000
+
+# 只有最近使用时间变化（缓存命中）时，距上次写入超过该间隔（秒）才重写缓存文件
+TOUCH_FLUSH_INTERVAL = 600
+
+# 并行探测的默认线程数，ffprobe主要受I/O限制，可以多于核心数
+DEFAULT_PROBE_WORKERS = 8
+
+
+def cache_dir():
+    """返回本程序的用户缓存目录"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'video_converter')
+
+
+def file_fingerprint(path):
+    """返回文件的 (大小, 修改时间) 指纹，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_fps(rate):
+    """将 "30000/1001" 形式的帧率转换为浮点数"""
+    try:
+        num, den = str(rate).split('/')
+        return float(num) / float(den) if float(den) else None
+    except (ValueError, ZeroDivisionError):
+        return _to_float(rate)
+
+
+def parse_probe_output(data):
+    """将ffprobe的JSON输出整理为扁平的元数据字典"""
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+
+    # 旋转角度可能位于旧版的rotate标签或新版的显示矩阵中
+    rotation = _to_float(video.get("tags", {}).get("rotate"))
+    for side_data in video.get("side_data_list", []):
+        if "rotation" in side_data:
+            rotation = _to_float(side_data["rotation"])
+    rotation = int(rotation or 0) % 360
+
+    return {
+        "duration": _to_float(fmt.get("duration")) or _to_float(video.get("duration")),
+        "format_name": fmt.get("format_name"),
+        "bit_rate": _to_float(fmt.get("bit_rate")),
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "video_codec": video.get("codec_name"),
+        "pix_fmt": video.get("pix_fmt"),
+        "fps": _to_fps(video.get("avg_frame_rate") or video.get("r_frame_rate")),
+        "rotation": rotation,
+        "audio_codec": audio.get("codec_name"),
+        "audio_channels": audio.get("channels"),
+        "audio_bit_rate": _to_float(audio.get("bit_rate")),
+    }
+
+
+def display_size(metadata):
+    """返回考虑旋转角度后的显示尺寸 (宽, 高)，未知时返回None"""
+    width, height = metadata.get("width"), metadata.get("height")
+    if not width or not height:
+        return None
+    if metadata.get("rotation") in (90, 270):
+        return height, width
+    return width, height
+
+
+def probe_file(ffprobe_path, path):
+    """
+    使用ffprobe读取单个文件的元数据
+
+    返回:
+        元数据字典，探测失败时返回None
+    """
+    cmd = [
+        ffprobe_path,
+        "-v", "error",
+        "-show_entries",
+        "format=duration,format_name,bit_rate"
+        ":stream=codec_type,codec_name,width,height,pix_fmt,avg_frame_rate,r_frame_rate,"
+        "duration,channels,bit_rate:stream_tags=rotate:stream_side_data=rotation",
+        "-of", "json",
+        path
+    ]
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            creationflags=CREATE_NO_WINDOW
+        )
+    except OSError:
+        # ffprobe不存在或无法执行
+        return None
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    try:
+        return parse_probe_output(json.loads(result.stdout))
+    except ValueError:
+        return None
+
+
+class ProbeCache:
+    """以 (路径, 大小, 修改时间) 为键的持久化元数据缓存，按条目数上限淘汰最久未使用的条目"""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        初始化缓存
+
+        参数:
+            path: 缓存文件路径，None表示使用用户缓存目录下的 probe_cache.json
+            max_entries: 最多保留的条目数
+        """
+        self.path = path or os.path.join(cache_dir(), "probe_cache.json")
+        self.max_entries = max_entries
+        self.entries = {}
+        self.dirty = False
+        self.touched = False  # 命中时只更新最近使用时间，不立即重写整个文件
+        self.saved_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """
+        将缓存原子写入磁盘
+
+        只在有新数据时写入；只有命中更新的最近使用时间时，每 TOUCH_FLUSH_INTERVAL 秒最多写入一次
+        """
+        with self._lock:
+            stale = self.touched and time.monotonic() - self.saved_at >= TOUCH_FLUSH_INTERVAL
+            if not self.dirty and not stale:
+                return
+            self._evict()
+            data = {"version": 1, "entries": dict(self.entries)}
+            self.dirty = False
+            self.touched = False
+            self.saved_at = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # 多个转码线程可能同时保存，临时文件按线程区分
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存探测缓存失败: {str(e)}")
+
+    def _evict(self):
+        overflow = len(self.entries) - self.max_entries
+        if overflow > 0:
+            oldest = sorted(self.entries, key=lambda k: self.entries[k].get("used", 0))[:overflow]
+            for key in oldest:
+                del self.entries[key]
+
+    def get(self, path, field="metadata"):
+        """
+        读取缓存的数据，文件已变化或没有缓存时返回None
+
+        field 允许其他阶段在同一条目下存放与该文件版本绑定的数据
+        """
+        fingerprint = file_fingerprint(path)
+        with self._lock:
+            entry = self.entries.get(os.path.abspath(path))
+            if not entry or fingerprint is None or tuple(entry["fingerprint"]) != fingerprint:
+                return None
+            entry["used"] = time.time()
+            self.touched = True
+            return entry.get(field)
+
+    def put(self, path, value, field="metadata"):
+        """写入数据；文件指纹变化时丢弃该条目下的旧数据"""
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            return
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self.entries.get(key)
+            if not entry or tuple(entry["fingerprint"]) != fingerprint:
+                entry = {"fingerprint": list(fingerprint)}
+                self.entries[key] = entry
+            entry[field] = value
+            entry["used"] = time.time()
+            self.dirty = True
+
+
+def probe_files(paths, ffprobe_path, cache=None, workers=DEFAULT_PROBE_WORKERS, on_result=None, timings=None):
+    """
+    并行探测一批文件的元数据，缓存命中的文件不会调用ffprobe
+
+    参数:
+        paths: 文件路径列表
+        ffprobe_path: ffprobe可执行文件路径
+        cache: ProbeCache实例（可选）
+        workers: 并行探测的线程数
+        on_result: 每个文件完成时的回调 on_result(path, metadata)
+        timings: 可选字典，记录每个文件的探测耗时（秒，缓存命中为0）
+
+    返回:
+        路径到元数据的字典，探测失败的文件对应None
+    """
+    results = {}
+    pending = []
+    for path in paths:
+        metadata = cache.get(path) if cache else None
+        if metadata is not None:
+            results[path] = metadata
+            if timings is not None:
+                timings[path] = 0.0
+            if on_result:
+                on_result(path, metadata)
+        else:
+            pending.append(path)
+
+    def probe_one(path):
+        started = time.perf_counter()
+        metadata = probe_file(ffprobe_path, path)
+        if timings is not None:
+            timings[path] = time.perf_counter() - started
+        if metadata is not None and cache:
+            cache.put(path, metadata)
+        if on_result:
+            on_result(path, metadata)
+        return path, metadata
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for path, metadata in executor.map(probe_one, pending):
+                results[path] = metadata
+
+    if cache:
+        cache.save()
+    return results
@@ -0,0 +1,41 @@
+"""
+子进程资源统计
+在POSIX系统上使用 wait4 回收子进程，同时取得其CPU用户态/内核态时间和峰值内存。
+其他系统上退化为普通的 wait，不提供资源统计。
+此模块不依赖tkinter。
+"""
+
+import os
+import sys
+
+
+def _maxrss_bytes(ru_maxrss):
+    """ru_maxrss 在Linux上以KB为单位，在macOS上以字节为单位"""
+    return ru_maxrss if sys.platform == 'darwin' else ru_maxrss * 1024
+
+
+def wait_with_rusage(process):
+    """
+    等待 subprocess.Popen 子进程结束并取得资源使用情况
+
+    返回:
+        (退出码, 资源字典)；资源字典包含 cpu_user、cpu_sys（秒）和 peak_rss（字节），
+        不支持 wait4 的系统上为None
+    """
+    if not hasattr(os, 'wait4'):
+        return process.wait(), None
+
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # 进程已被其他地方回收
+        return process.wait(), None
+
+    return_code = os.waitstatus_to_exitcode(status)
+    # 告知Popen进程已回收，避免重复wait
+    process.returncode = return_code
+    return return_code, {
+        "cpu_user": usage.ru_utime,
+        "cpu_sys": usage.ru_stime,
+        "peak_rss": _maxrss_bytes(usage.ru_maxrss),
+    }
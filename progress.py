@@ -0,0 +1,172 @@
+"""
+转码进度解析与批次预计剩余时间
+ffmpeg 使用 -progress pipe:1 输出机器可读的 key=value 进度块，
+此模块增量解析这些数据，并结合探测到的时长计算单个文件和整个批次的进度。
+此模块不依赖tkinter。
+"""
+
+import threading
+import time
+
+# 未换行数据的缓冲上限，超过后丢弃，防止异常输出占用内存
+MAX_BUFFER = 64 * 1024
+
+# 放在ffmpeg程序路径之后的全局参数：关闭stderr统计行，改为在stdout输出进度块
+PROGRESS_ARGS = ["-nostats", "-progress", "pipe:1"]
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_eta(seconds):
+    """将秒数格式化为 HH:MM:SS，未知时返回 "--:--:--" """
+    if seconds is None:
+        return "--:--:--"
+    seconds = max(0, int(seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressParser:
+    """增量解析ffmpeg -progress 输出，每个完整的进度块产生一个快照"""
+
+    def __init__(self, duration=None):
+        """
+        参数:
+            duration: 输入文件的时长（秒），用于计算百分比，未知时为None
+        """
+        self.duration = duration
+        self.buffer = b""
+        self.fields = {}
+
+    def feed(self, data):
+        """
+        送入一段原始输出，返回本次解析出的进度快照列表
+
+        快照字段: out_time(秒), frame, fps, speed(倍速), percent, eta(秒), done
+        """
+        snapshots = []
+        self.buffer += data
+        lines = self.buffer.split(b"\n")
+        self.buffer = lines.pop()
+        if len(self.buffer) > MAX_BUFFER:
+            self.buffer = b""
+
+        for raw in lines:
+            line = raw.decode("utf-8", "replace").strip()
+            if "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            self.fields[key] = value
+            if key == "progress":
+                snapshots.append(self.snapshot(done=(value == "end")))
+                self.fields = {}
+        return snapshots
+
+    def snapshot(self, done=False):
+        fields = self.fields
+        # out_time_us 在部分旧版本中错误地以毫秒为单位输出同名字段，优先使用 out_time_us
+        out_time_us = _parse_float(fields.get("out_time_us")) or _parse_float(fields.get("out_time_ms"))
+        out_time = max(0.0, out_time_us / 1000000) if out_time_us is not None else None
+        speed = _parse_float(fields.get("speed", "").rstrip("x").strip())
+
+        percent = None
+        eta = None
+        if self.duration and out_time is not None:
+            percent = min(100.0, out_time / self.duration * 100)
+            if speed:
+                eta = max(0.0, (self.duration - out_time) / speed)
+        if done:
+            percent, eta = 100.0, 0.0
+
+        return {
+            "out_time": out_time,
+            "frame": int(_parse_float(fields.get("frame")) or 0),
+            "fps": _parse_float(fields.get("fps")),
+            "speed": speed,
+            "percent": percent,
+            "eta": eta,
+            "done": done,
+        }
+
+
+def frame_snapshot(frames, fps, elapsed, duration=None):
+    """
+    根据已处理的帧数生成与 ProgressParser 相同字段的进度快照
+
+    用于不经过 -progress 输出的处理方式（如Python超分管道）
+    """
+    out_time = frames / fps if fps else None
+    speed = out_time / elapsed if out_time is not None and elapsed > 0 else None
+    percent = None
+    eta = None
+    if duration and out_time is not None:
+        percent = min(100.0, out_time / duration * 100)
+        if speed:
+            eta = max(0.0, (duration - out_time) / speed)
+    return {
+        "out_time": out_time,
+        "frame": frames,
+        "fps": frames / elapsed if elapsed > 0 else None,
+        "speed": speed,
+        "percent": percent,
+        "eta": eta,
+        "done": False,
+    }
+
+
+class BatchEta:
+    """汇总所有文件的处理进度，按已处理的媒体时长估算批次剩余时间"""
+
+    def __init__(self, durations):
+        """
+        参数:
+            durations: {文件路径: 时长(秒)}，时长未知的文件按已知文件的平均时长估算
+        """
+        known = [d for d in durations.values() if d]
+        average = sum(known) / len(known) if known else 1.0
+        self.durations = {path: (d or average) for path, d in durations.items()}
+        self.done = {path: 0.0 for path in durations}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def update(self, path, out_time):
+        """记录文件当前已处理到的时间点"""
+        with self._lock:
+            if path in self.done and out_time is not None:
+                self.done[path] = min(self.durations[path], max(self.done[path], out_time))
+
+    def add(self, path, duration):
+        """批次运行中加入新文件，时长未知时按已知文件的平均时长估算"""
+        with self._lock:
+            if not duration:
+                duration = sum(self.durations.values()) / len(self.durations) if self.durations else 1.0
+            self.durations[path] = duration
+            self.done[path] = 0.0
+
+    def finish(self, path):
+        """文件处理结束（无论成功与否）"""
+        with self._lock:
+            if path in self.done:
+                self.done[path] = self.durations[path]
+
+    def skip(self, path):
+        """文件被跳过，不计入批次工作量，避免拉高处理速度的估算"""
+        with self._lock:
+            self.durations.pop(path, None)
+            self.done.pop(path, None)
+
+    def snapshot(self):
+        """返回批次的 percent 和 eta(秒)"""
+        with self._lock:
+            total = sum(self.durations.values())
+            processed = sum(self.done.values())
+        elapsed = time.time() - self.started
+        percent = processed / total * 100 if total else 100.0
+        eta = None
+        if processed > 0 and elapsed > 0:
+            eta = (total - processed) / (processed / elapsed)
+        return {"percent": percent, "eta": eta, "processed": processed, "total": total}
@@ -0,0 +1,127 @@
+"""
+多路输出（rendition）
+一个输入同时输出多个版本，每个版本可以有自己的超分倍率、质量等级和封装格式，
+例如原始分辨率的mp4和2倍超分的mkv。所有版本由同一个ffmpeg进程生成：
+只解码一次，用 split 滤镜把画面分给各个版本的缩放和编码器。
+此模块不依赖tkinter。
+"""
+
+import re
+
+# 同一倍率和格式的多个版本按质量区分文件名
+QUALITY_TAGS = {"高": "high", "中": "medium", "低": "low"}
+
+# 表示原始分辨率（不超分）的倍率写法
+NATIVE_SCALES = ("1x", "原始", "native")
+
+SCALE_PATTERN = re.compile(r"^\d+(\.\d+)?x$")
+
+
+class Rendition:
+    """一个输出版本，值为None的字段沿用批次的设置"""
+
+    def __init__(self, output_format=None, quality=None, sr_scale=None):
+        self.output_format = output_format
+        self.quality = quality
+        self.sr_scale = sr_scale  # "2x" 等超分倍率，"1x" 表示原始分辨率
+
+    def describe(self):
+        parts = [self.sr_scale or "", self.quality or "", self.output_format or ""]
+        return ":".join(p for p in parts if p) or "默认"
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("output_format"), data.get("quality"), data.get("sr_scale"))
+
+
+def parse_rendition(text, formats, qualities):
+    """
+    解析 "2x:中:mkv" 形式的版本说明
+
+    各部分用冒号分隔、顺序不限，可以省略；倍率写 1x 表示原始分辨率
+
+    参数:
+        formats: 可选的输出格式
+        qualities: 可选的质量等级，或 {别名: 质量等级} 字典
+
+    返回:
+        Rendition，无法识别时抛出ValueError
+    """
+    rendition = Rendition()
+    for part in (p.strip() for p in text.split(":")):
+        if not part:
+            continue
+        if part.lower() in formats:
+            rendition.output_format = part.lower()
+        elif part in qualities or part.lower() in qualities:
+            key = part if part in qualities else part.lower()
+            rendition.quality = qualities[key] if isinstance(qualities, dict) else key
+        elif part.lower() in NATIVE_SCALES:
+            rendition.sr_scale = "1x"
+        elif SCALE_PATTERN.match(part.lower()):
+            rendition.sr_scale = part.lower()
+        else:
+            raise ValueError(f"无法识别的输出版本: {part}（示例: 2x:中:mkv）")
+    return rendition
+
+
+def check_duplicates(renditions):
+    """重复的版本说明会输出到同一个文件，发现时抛出ValueError"""
+    seen = set()
+    for rendition in renditions:
+        key = (rendition.sr_scale, rendition.quality, rendition.output_format)
+        if key in seen:
+            raise ValueError(f"重复的输出版本: {rendition.describe()}")
+        seen.add(key)
+    return renditions
+
+
+def parse_renditions(text, formats, qualities):
+    """解析逗号分隔的多个版本说明，空文本返回空列表，有重复的版本时抛出ValueError"""
+    return check_duplicates([parse_rendition(part, formats, qualities) for part in text.split(",") if part.strip()])
+
+
+def rendition_settings(settings, rendition):
+    """返回按版本覆盖了格式、质量和倍率的设置副本"""
+    variant = type(settings).from_dict(settings.to_dict())
+    variant.renditions = None
+    if rendition.output_format:
+        variant.output_format = rendition.output_format
+    if rendition.quality:
+        variant.quality = rendition.quality
+    if rendition.sr_scale:
+        variant.sr_enabled = rendition.sr_scale != "1x"
+        if variant.sr_enabled:
+            variant.sr_scale = rendition.sr_scale
+    return variant
+
+
+def expand_renditions(settings, renditions=None):
+    """
+    返回每个版本的设置列表；没有配置多路输出时只有批次设置本身
+
+    参数:
+        renditions: Rendition列表，默认使用 settings.renditions
+
+    倍率和格式相同的版本在文件名中加上质量标记，避免输出互相覆盖；
+    沿用批次设置后仍完全相同的版本（如 "2x:mkv" 和 "2x:高:mkv"）再加上序号
+    """
+    if renditions is None:
+        renditions = [Rendition.from_dict(data) for data in settings.renditions or []]
+    if not renditions:
+        return [settings]
+    variants = [rendition_settings(settings, rendition) for rendition in renditions]
+    keys = [(v.sr_enabled and v.sr_scale, v.output_format) for v in variants]
+    for variant, key in zip(variants, keys):
+        if keys.count(key) > 1:
+            variant.output_tag = f"_{QUALITY_TAGS.get(variant.quality, variant.quality)}"
+    tags = {}
+    for variant, key in zip(variants, keys):
+        full_key = key + (variant.output_tag,)
+        tags[full_key] = tags.get(full_key, 0) + 1
+        if tags[full_key] > 1:
+            variant.output_tag += f"_{tags[full_key]}"
+    return variants
@@ -0,0 +1,177 @@
+"""
+样本编码预览
+从文件中均匀截取几段短片段，使用与正式转码完全相同的命令编码（包括多路输出和Python超分管道），
+测量编码速度并推算整个文件的耗时和输出大小，用于在开始批量转码前比较质量和超分设置。
+此模块不依赖tkinter。
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from encode_pool import cpu_count, split_thread_budget
+from progress import format_eta
+from renditions import expand_renditions
+
+# 默认的样本数和每段时长（秒）
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 5
+
+
+def sample_offsets(duration, count=SAMPLE_COUNT, length=SAMPLE_SECONDS):
+    """
+    在文件中均匀选取样本的开始时间
+
+    返回:
+        [(开始时间, 时长), ...]；文件短于全部样本总长时只取一段覆盖整个文件
+    """
+    if not duration or duration <= count * length:
+        return [(0.0, duration or length)]
+    step = duration / (count + 1)
+    return [(round(step * (i + 1) - length / 2, 3), length) for i in range(count)]
+
+
+def sample_command(cmd, start, length, sample_file):
+    """
+    把正式转码命令改为只编码一段样本
+
+    -ss 放在 -i 之前，由分离器直接跳到目标时间之前的关键帧再解码，不需要从头读起；
+    输出路径替换为临时文件
+    """
+    index = cmd.index("-i")
+    return (cmd[:index] + ["-ss", f"{start:.3f}"] + cmd[index:index + 2] +
+            ["-t", f"{length:.3f}"] + cmd[index + 2:-1] + [sample_file])
+
+
+def trim_options(start, length):
+    """截取样本的输入参数，放在 -i 之前，多路输出的全部版本都只编码这一段"""
+    return ["-ss", f"{start:.3f}", "-t", f"{length:.3f}"]
+
+
+def encode_sample(engine, input_file, cmd, variants, piped, threads, start, length, sample_base):
+    """
+    按正式转码的方式编码一段样本
+
+    返回:
+        (ffmpeg退出码, 样本文件列表)；Python超分管道无法确定视频尺寸时退出码为None
+    """
+    if engine.settings.renditions:
+        # 多路输出：与 encode_renditions 相同，一个进程同时输出全部版本
+        targets = [(variant, f"{sample_base}_{index}{os.path.splitext(variant.output_file(input_file))[1]}")
+                   for index, variant in enumerate(variants)]
+        rendition_cmd, _ = engine.build_rendition_command(input_file, targets, threads)
+        index = rendition_cmd.index("-i")
+        rendition_cmd = rendition_cmd[:index] + trim_options(start, length) + rendition_cmd[index:]
+        return_code = engine.run_ffmpeg(rendition_cmd, input_file, duration=length, on_snapshot=lambda snapshot: None)
+        return return_code, [sample_file for _, sample_file in targets]
+
+    sample_file = f"{sample_base}.{engine.settings.output_format}"
+    if piped:
+        return_code = engine.run_pipe_sr(input_file, sample_file, threads, input_options=trim_options(start, length))
+        return return_code, [sample_file]
+    return_code = engine.run_ffmpeg(sample_command(cmd, start, length, sample_file),
+                                    input_file, duration=length, on_snapshot=lambda snapshot: None)
+    return return_code, [sample_file]
+
+
+def run_sample_preview(engine, input_file, count=SAMPLE_COUNT, length=SAMPLE_SECONDS, threads=None):
+    """
+    编码若干段样本并推算整个文件的转码耗时和大小
+
+    参数:
+        engine: ConverterEngine实例
+        input_file: 输入文件路径
+        count: 样本数
+        length: 每段样本的时长（秒）
+        threads: 编码线程数，默认与批量转码时每个任务分到的线程数相同
+
+    返回:
+        结果字典，包含各样本的测量值、平均编码速度（相对实时的倍数）、
+        推算的整个文件耗时（秒）和输出大小（字节，多路输出时为全部版本之和）；样本编码失败时 success 为False
+    """
+    settings = engine.settings
+    if threads is None:
+        threads = split_thread_budget(cpu_count(), engine.resolved_jobs())
+
+    duration = engine.get_metadata(input_file).get("duration")
+    output_file = settings.output_file(input_file)
+    cmd = engine.build_command(input_file, output_file, threads)
+    plan = engine.get_stream_plan(input_file)
+    variants = expand_renditions(settings)
+    piped = bool(engine.pipe_sr) and not plan.video_copy and not settings.renditions
+
+    result = {
+        "input": input_file,
+        "duration": duration,
+        "plan": plan.mode,
+        "threads": threads,
+        "renditions": len(variants),
+        "upscaler": engine.pipe_sr.upscaler if piped else None,
+        "samples": [],
+        "success": True,
+        "speed": None,
+        "projected_time": None,
+        "projected_size": None,
+    }
+
+    temp_dir = tempfile.mkdtemp(prefix="video_converter_preview_")
+    try:
+        for index, (start, sample_length) in enumerate(sample_offsets(duration, count, length)):
+            sample_base = os.path.join(temp_dir, f"sample_{index}")
+            engine.log(f"样本编码 {index + 1}: {os.path.basename(input_file)} 从 {start:.1f}s 起 {sample_length:.1f}s")
+
+            started = time.perf_counter()
+            return_code, sample_files = encode_sample(engine, input_file, cmd, variants, piped, threads,
+                                                      start, sample_length, sample_base)
+            if return_code is None:
+                # 与正式转码相同，Python超分管道无法确定视频尺寸时改用ffmpeg的缩放滤镜
+                piped = False
+                result["upscaler"] = None
+                return_code, sample_files = encode_sample(engine, input_file, cmd, variants, piped, threads,
+                                                          start, sample_length, sample_base)
+            elapsed = time.perf_counter() - started
+
+            if return_code != 0 or not all(os.path.exists(f) for f in sample_files):
+                engine.log(f"样本编码失败，返回代码: {return_code}")
+                result["success"] = False
+                break
+            result["samples"].append({
+                "start": start,
+                "length": sample_length,
+                "elapsed": round(elapsed, 3),
+                "bytes": sum(os.path.getsize(f) for f in sample_files),
+            })
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    samples = result["samples"]
+    if result["success"] and samples:
+        total_length = sum(s["length"] for s in samples)
+        total_elapsed = sum(s["elapsed"] for s in samples)
+        total_bytes = sum(s["bytes"] for s in samples)
+        result["speed"] = round(total_length / total_elapsed, 3) if total_elapsed else None
+        if duration:
+            if result["speed"]:
+                result["projected_time"] = round(duration / result["speed"], 1)
+            result["projected_size"] = int(total_bytes / total_length * duration)
+    return result
+
+
+def describe_preview(result):
+    """返回适合在预览窗口和命令行中显示的中文摘要"""
+    name = os.path.basename(result["input"])
+    if not result["success"]:
+        return f"样本预览: {name} 编码失败"
+    parts = [f"样本预览: {name}（{len(result['samples'])} 段，{result['threads']} 线程）"]
+    if result.get("renditions", 1) > 1:
+        parts.append(f"{result['renditions']} 个版本")
+    if result.get("upscaler"):
+        parts.append(f"放大器 {result['upscaler']}")
+    if result["speed"]:
+        parts.append(f"编码速度 {result['speed']:.2f}x")
+    if result["projected_time"] is not None:
+        parts.append(f"预计耗时 {format_eta(result['projected_time'])}")
+    if result["projected_size"] is not None:
+        parts.append(f"预计大小 {result['projected_size'] / 1024 ** 2:.1f} MB")
+    return "，".join(parts)
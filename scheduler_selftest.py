@@ -0,0 +1,100 @@
+"""
+优先级调度自测
+用转码引擎的进程控制和内存预算运行只有一个槽位的批次，其中的"转码"是等待一段时间的Python子进程。
+批次运行中加入一个高优先级任务，检查：
+  - 没有内存预算时，低优先级任务被挂起让位，高优先级任务先完成；
+  - 预算只够一个任务时，占用内存预留的低优先级任务不被挂起，两个任务都能完成而不会互相等待。
+需要POSIX的SIGSTOP/SIGCONT，不需要ffmpeg。此模块不依赖tkinter。
+
+示例:
+    python scheduler_selftest.py
+"""
+
+import subprocess
+import sys
+import threading
+
+from converter_engine import ConversionSettings, ConverterEngine
+from job_scheduler import CAN_SUSPEND, URGENT_PRIORITY, JobScheduler
+from memory_governor import MemoryGovernor
+
+# 每个任务的子进程运行时间（秒）
+JOB_SECONDS = 1.0
+
+# 每个任务预留的内存（字节）
+JOB_MEMORY = 512 * 1024 * 1024
+
+# 每个场景的超时（秒）
+TIMEOUT = 30
+
+
+def run_scenario(budget, log=print):
+    """
+    运行一个场景：低优先级任务开始后加入高优先级任务，budget 为0表示不限制内存
+
+    返回:
+        (是否在超时前结束, 任务完成的顺序)
+    """
+    engine = ConverterEngine(None, ConversionSettings("."), log=log)
+    engine.memory_governor = MemoryGovernor(budget, log=log)
+    started = threading.Event()
+    finished = []
+
+    def worker(item, threads):
+        with engine.reserve_memory(item, JOB_MEMORY):
+            process = subprocess.Popen([sys.executable, "-c", f"import time; time.sleep({JOB_SECONDS})"])
+            engine.track_process(item, process)
+            started.set()
+            return_code = process.wait()
+            engine.untrack_process(item, process)
+        return return_code == 0
+
+    def on_finish(item, success, progress):
+        finished.append(item)
+
+    scheduler = JobScheduler(1, 1, worker, engine, on_finish=on_finish)
+    scheduler.submit("low")
+    runner = threading.Thread(target=scheduler.run, daemon=True)
+    runner.start()
+    if started.wait(TIMEOUT):
+        scheduler.submit("urgent", URGENT_PRIORITY)
+    runner.join(TIMEOUT)
+    if runner.is_alive():
+        scheduler.cancel_all()
+        return False, finished
+    return True, finished
+
+
+def run_selftest(log=print):
+    """运行自测，返回发现的问题列表（为空表示通过）"""
+    problems = []
+
+    completed, order = run_scenario(0, log=log)
+    if not completed:
+        problems.append(f"没有内存预算时批次在 {TIMEOUT} 秒内没有结束")
+    elif order != ["urgent", "low"]:
+        problems.append(f"没有内存预算时高优先级任务没有先完成: {order}")
+
+    completed, order = run_scenario(JOB_MEMORY + JOB_MEMORY // 2, log=log)
+    if not completed:
+        problems.append(f"预算只够一个任务时批次在 {TIMEOUT} 秒内没有结束（挂起的任务仍占用内存预留）")
+    elif sorted(order) != ["low", "urgent"]:
+        problems.append(f"预算只够一个任务时没有全部完成: {order}")
+    return problems
+
+
+def main():
+    if not CAN_SUSPEND:
+        print("当前平台不支持挂起进程，跳过调度自测")
+        return 0
+    problems = run_selftest()
+    if problems:
+        for problem in problems:
+            print(f"失败: {problem}")
+        return 1
+    print("调度自测通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
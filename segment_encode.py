@@ -0,0 +1,231 @@
+"""
+大文件分段并行编码
+在关键帧处把一个长视频划分为若干段，各段使用与整文件相同的视频参数并行编码，
+再用concat分离器无损拼接，并从原文件一次性复制或编码音频。
+临时文件保存在输出目录下的临时子目录中，结束后删除。
+此模块不依赖tkinter。
+"""
+
+import bisect
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from encode_pool import EncodePool, cpu_count
+
+# Windows下隐藏子进程的控制台窗口
+CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+# 每个分段的最短时长（秒），过短的分段会增加启动和拼接开销
+MIN_SEGMENT_SECONDS = 20
+
+# 每个并发任务分配的分段数，多于1可以平衡各段编码速度的差异
+SEGMENTS_PER_JOB = 2
+
+# 估算临时空间时预留的余量
+DISK_SAFETY_FACTOR = 1.5
+
+# 分段开始时间向前偏移，避免浮点舍入导致关键帧本身被丢弃
+SEEK_EPSILON = 0.001
+
+
+def probe_keyframes(ffprobe_path, input_file):
+    """
+    读取第一路视频流的数据包时间戳（不解码），返回 (起始时间, 全部帧时间列表, 关键帧时间列表)
+
+    读取失败时返回None
+    """
+    cmd = [
+        ffprobe_path,
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags:format=start_time",
+        "-of", "json",
+        input_file
+    ]
+    result = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        text=True,
+        creationflags=CREATE_NO_WINDOW
+    )
+    if result.returncode != 0:
+        return None
+    try:
+        data = json.loads(result.stdout)
+    except ValueError:
+        return None
+
+    frames = []
+    keyframes = []
+    for packet in data.get("packets", []):
+        try:
+            pts = float(packet["pts_time"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        frames.append(pts)
+        if "K" in packet.get("flags", ""):
+            keyframes.append(pts)
+    if not frames or not keyframes:
+        return None
+
+    try:
+        start_time = float(data.get("format", {}).get("start_time", 0))
+    except (TypeError, ValueError):
+        start_time = 0.0
+    return start_time, sorted(frames), sorted(keyframes)
+
+
+def plan_segments(frames, keyframes, segment_count):
+    """
+    在关键帧处划分分段
+
+    参数:
+        frames: 全部帧的显示时间（已排序）
+        keyframes: 关键帧的显示时间（已排序）
+        segment_count: 期望的分段数
+
+    返回:
+        [(开始时间, 帧数), ...]，按显示顺序排列
+    """
+    first, last = frames[0], frames[-1]
+    length = (last - first) / max(1, segment_count)
+    boundaries = [first]
+    for i in range(1, segment_count):
+        target = first + length * i
+        index = bisect.bisect_left(keyframes, target)
+        if index < len(keyframes) and keyframes[index] > boundaries[-1]:
+            boundaries.append(keyframes[index])
+
+    segments = []
+    for i, start in enumerate(boundaries):
+        lo = bisect.bisect_left(frames, start)
+        hi = bisect.bisect_left(frames, boundaries[i + 1]) if i + 1 < len(boundaries) else len(frames)
+        if hi > lo:
+            segments.append((start, hi - lo))
+    return segments
+
+
+class SegmentEncoder:
+    """使用转码引擎的参数对单个大文件进行分段并行编码"""
+
+    def __init__(self, engine, ffprobe_path):
+        self.engine = engine
+        self.ffprobe_path = ffprobe_path
+        self.log = engine.log
+
+    def should_segment(self, input_file, plan):
+        """文件足够长、视频需要重新编码时才分段"""
+        min_duration = self.engine.settings.segment_min_duration
+        if not min_duration or plan.video_copy:
+            return False
+        duration = self.engine.get_metadata(input_file).get("duration")
+        return bool(duration) and duration >= min_duration
+
+    def has_enough_space(self, input_file, temp_parent):
+        """按输入大小和超分倍率估算分段所需的临时空间"""
+        settings = self.engine.settings
+        scale = settings.sr_scale_value() if settings.sr_enabled else 1.0
+        needed = os.path.getsize(input_file) * scale * scale * DISK_SAFETY_FACTOR
+        free = shutil.disk_usage(temp_parent).free
+        if free < needed:
+            self.log(f"临时空间不足（需要约 {needed / 1024 ** 3:.1f} GB，可用 {free / 1024 ** 3:.1f} GB），改为整文件编码")
+            return False
+        return True
+
+    def encode(self, input_file, output_file, plan):
+        """
+        分段编码并拼接到output_file
+
+        返回:
+            ffmpeg退出码（0表示成功），无法分段时返回None，由调用方改为整文件编码
+        """
+        temp_parent = os.path.dirname(os.path.abspath(output_file))
+        if not self.has_enough_space(input_file, temp_parent):
+            return None
+
+        # 启用本地暂存时读取本地副本
+        source = self.engine.source_path(input_file)
+        probed = probe_keyframes(self.ffprobe_path, source)
+        if not probed:
+            self.log(f"无法读取关键帧信息，改为整文件编码: {os.path.basename(input_file)}")
+            return None
+        start_time, frames, keyframes = probed
+
+        # 各段都重新编码，并行数受硬件编码器的会话数限制
+        jobs = self.engine.encoding_jobs()
+        duration = frames[-1] - frames[0]
+        segment_count = max(1, min(jobs * SEGMENTS_PER_JOB, int(duration // MIN_SEGMENT_SECONDS)))
+        segments = plan_segments(frames, keyframes, segment_count)
+        if len(segments) < 2:
+            return None
+
+        pool = EncodePool(jobs=min(jobs, len(segments)), total_cores=cpu_count())
+        self.log(f"分段编码: {os.path.basename(input_file)} 分为 {len(segments)} 段，{pool.jobs} 段并行")
+
+        # 视频参数对所有分段相同，只计算一次
+        video_params = self.engine.get_video_params(input_file, plan, pool.threads_per_job)
+        temp_dir = tempfile.mkdtemp(prefix=".segments_", dir=temp_parent)
+        done = {}
+        lock = threading.Lock()
+
+        def on_snapshot(index, snapshot):
+            # 各段进度之和即为整个文件的进度
+            with lock:
+                done[index] = snapshot["out_time"] or 0.0
+                out_time = sum(done.values())
+            percent = min(100.0, out_time / duration * 100) if duration else None
+            self.engine.report_progress(input_file, dict(snapshot, out_time=out_time, percent=percent, eta=None))
+
+        def encode_segment(item, threads):
+            index, (start, frame_count) = item
+            segment_file = os.path.join(temp_dir, f"segment_{index:04d}.mkv")
+            cmd = [
+                self.engine.ffmpeg_path,
+                "-ss", f"{max(0.0, start - start_time - SEEK_EPSILON):.6f}",
+                "-i", source,
+                "-frames:v", str(frame_count),
+                "-an", "-sn", "-dn",
+            ] + video_params + ["-y", segment_file]
+            return_code = self.engine.run_ffmpeg(
+                cmd, input_file, on_snapshot=lambda snapshot: on_snapshot(index, snapshot)
+            )
+            return return_code == 0
+
+        try:
+            # 与整文件编码相同，先占用编码会话再预留内存，按并行的分段数计算
+            with self.engine.encoder_session(input_file, pool.jobs):
+                if self.engine.memory_governor:
+                    scale = self.engine.get_sr_scale(input_file, quiet=True)
+                    estimate = self.engine.estimate_sr_memory(input_file, scale, pool.threads_per_job) * pool.jobs
+                    with self.engine.reserve_memory(input_file, estimate):
+                        progress = pool.run(list(enumerate(segments)), encode_segment)
+                else:
+                    progress = pool.run(list(enumerate(segments)), encode_segment)
+            if progress.failed:
+                self.log(f"分段编码失败: {progress.failed} 段未成功")
+                return 1
+
+            # 使用concat分离器无损拼接视频，并从原文件处理音频
+            list_file = os.path.join(temp_dir, "segments.txt")
+            with open(list_file, 'w', encoding='utf-8') as f:
+                for index in range(len(segments)):
+                    path = os.path.join(temp_dir, f"segment_{index:04d}.mkv").replace("'", "'\\''")
+                    f.write(f"file '{path}'\n")
+
+            cmd = [
+                self.engine.ffmpeg_path,
+                "-f", "concat", "-safe", "0", "-i", list_file,
+                "-i", source,
+                "-map", "0:v:0", "-map", "1:a:0?",
+                "-c:v", "copy",
+            ] + self.engine.get_audio_params(plan) + ["-y", output_file]
+            self.log(f"拼接分段: {os.path.basename(output_file)}")
+            return self.engine.run_ffmpeg(cmd, input_file, on_snapshot=lambda snapshot: None)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
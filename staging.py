@@ -0,0 +1,367 @@
+"""
+本地暂存
+输入和输出目录位于网络共享（SMB/NFS）时，ffmpeg直接读写共享常常受I/O限制而不是CPU限制。
+暂存区在当前任务编码的同时把接下来的几个输入预取到本机的暂存目录，ffmpeg只读写本地磁盘，
+编码完成的输出由后台线程复制到输出目录（先写入隐藏的临时文件，完成后再重命名）。
+预取和开始编码前用 shutil.disk_usage 按输入大小和估算的输出大小检查暂存目录和输出目录的剩余空间：
+本地空间不足时暂缓预取，输出目录空间不足时不开始编码，避免半截文件写满共享。
+此模块不依赖tkinter。
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import socket
+import threading
+
+from output_manifest import partial_path
+
+# 默认预取的输入文件数
+DEFAULT_PREFETCH = 2
+
+# 暂存目录和输出目录都保留的剩余空间（字节）
+RESERVE_BYTES = 1024 ** 3
+
+# 重新编码时输出相对于输入的估算大小（按目标像素数与源像素数之比放大），偏保守以免空间估算不足
+OUTPUT_SIZE_FACTOR = 1.5
+
+# 空间不足时重新检查的间隔（秒）
+SPACE_RECHECK_INTERVAL = 5.0
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def free_space(path):
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+
+def estimate_output_size(plan, input_size, variants=1):
+    """
+    按转码计划估算输出大小（字节）
+
+    参数:
+        plan: JobPlan，直接复制视频流时输出与输入大小相近
+        input_size: 输入文件大小
+        variants: 多路输出的版本数
+    """
+    if plan.stream_plan.video_copy:
+        return input_size * variants
+    ratio = 1.0
+    if plan.width and plan.target_width:
+        ratio = max(1.0, plan.target_width * plan.target_height / (plan.width * plan.height))
+    return int(input_size * ratio * OUTPUT_SIZE_FACTOR * variants)
+
+
+def remove_stale_staging(directory, log=print):
+    """
+    删除本机上已退出的进程留下的暂存子目录（进程崩溃或被强制结束时不会执行 close()）
+
+    Windows上无法安全地判断进程是否仍在运行，不做清理
+    """
+    if os.name == 'nt':
+        return
+    from job_journal import process_alive
+
+    host = socket.gethostname()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        prefix, _, pid = name.rpartition("-")
+        if prefix != f"staging-{host}" or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        if process_alive(host, int(pid)):
+            continue
+        path = os.path.join(directory, name)
+        log(f"删除残留的暂存目录: {path}")
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class StagingArea:
+    """在本地暂存目录中预取输入、接收ffmpeg的输出，并在后台把输出复制到输出目录"""
+
+    def __init__(self, directory, output_dir, prefetch=DEFAULT_PREFETCH, reserve=RESERVE_BYTES, log=print):
+        """
+        参数:
+            directory: 本地暂存目录，本次运行的文件放在其中以主机名和进程号命名的子目录里，结束时删除
+            output_dir: 最终的输出目录，用于检查剩余空间
+            prefetch: 提前复制到本地的输入文件数
+            reserve: 两个目录都保留的剩余空间（字节）
+        """
+        remove_stale_staging(directory, log)
+        self.root = os.path.join(os.path.abspath(directory), f"staging-{socket.gethostname()}-{os.getpid()}")
+        self.input_dir = os.path.join(self.root, "inputs")
+        self.output_dir = os.path.join(self.root, "outputs")
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.final_dir = output_dir
+        self.prefetch = max(0, prefetch)
+        self.reserve = reserve
+        self.log = log
+
+        self.upcoming = []  # 按计划顺序等待预取的输入
+        self.estimates = {}  # 输入 -> 估算的输出大小
+        self.copying = set()  # 正在预取的输入
+        self.staged = {}  # 已预取、尚未开始编码的输入 -> 本地副本
+        self.in_use = {}  # 正在编码的输入 -> 本地副本（空间不足或复制失败时为None，直接读取原文件）
+        self.discarded = set()  # 预取过程中被取消的输入
+        self.copy_queue = []  # 等待复制到输出目录的 (输入, 本地输出, 最终输出, 回调)
+        self.pending_bytes = 0  # 等待复制到输出目录的字节数
+        self.sequence = 0
+        self.failed = []  # 复制到输出目录失败的输入
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.threads = [threading.Thread(target=self.prefetch_loop, daemon=True),
+                        threading.Thread(target=self.copy_loop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def local_name(self, path):
+        """本地文件名：路径的哈希加原文件名，保留扩展名以便ffmpeg识别格式"""
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+        return f"{digest}_{os.path.basename(path)}"
+
+    def schedule(self, items):
+        """
+        按处理顺序登记需要预取的输入
+
+        参数:
+            items: [(输入文件, 估算的输出大小)]
+        """
+        with self.cond:
+            for input_file, estimate in items:
+                self.estimates[input_file] = estimate
+                self.discarded.discard(input_file)
+                if input_file not in self.upcoming:
+                    self.upcoming.append(input_file)
+            self.cond.notify_all()
+
+    def local_input(self, input_file):
+        """返回正在编码的输入的本地副本，没有时返回None"""
+        with self.cond:
+            return self.in_use.get(input_file)
+
+    def local_output(self, output_file):
+        """返回ffmpeg在暂存目录中写入的临时输出路径"""
+        return os.path.join(self.output_dir, partial_path(self.local_name(output_file)))
+
+    def has_local_space(self, input_file):
+        """暂存目录能否容纳该输入及其输出（调用方需持有锁）"""
+        free = free_space(self.root)
+        if free is None:
+            return False
+        # 正在编码的文件的输出仍在增长，按估算大小预留
+        committed = sum(self.estimates.get(f, 0) for f in self.in_use)
+        needed = file_size(input_file) + self.estimates.get(input_file, 0) + self.reserve
+        return free - committed >= needed
+
+    def copy_in(self, input_file):
+        """把输入复制到暂存目录，返回本地路径，失败时返回None"""
+        local = os.path.join(self.input_dir, self.local_name(input_file))
+        tmp_path = f"{local}.tmp"
+        try:
+            shutil.copyfile(input_file, tmp_path)
+            os.replace(tmp_path, local)
+            return local
+        except OSError as e:
+            self.log(f"预取输入失败，直接读取原文件: {os.path.basename(input_file)}（{str(e)}）")
+            for path in (tmp_path, local):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return None
+
+    def prefetch_loop(self):
+        while True:
+            with self.cond:
+                while True:
+                    if self.stopped:
+                        return
+                    candidate = None
+                    if self.upcoming and len(self.staged) + len(self.copying) < self.prefetch:
+                        # 按顺序预取，空间不足时等待正在编码的文件完成，不跳过
+                        if self.has_local_space(self.upcoming[0]):
+                            candidate = self.upcoming.pop(0)
+                    if candidate:
+                        break
+                    self.cond.wait(SPACE_RECHECK_INTERVAL)
+                self.copying.add(candidate)
+            local = self.copy_in(candidate)
+            with self.cond:
+                self.copying.discard(candidate)
+                if local and candidate in self.discarded:
+                    self.discarded.discard(candidate)
+                    self._remove(local)
+                elif local:
+                    self.staged[candidate] = local
+                self.cond.notify_all()
+
+    def acquire(self, input_file):
+        """
+        开始编码前调用，返回ffmpeg应读取的路径（本地副本或原文件）
+
+        输出目录的剩余空间不足以容纳估算的输出和正在等待复制的输出时，等待复制完成后重新检查；
+        没有等待复制的输出时抛出OSError，不开始编码
+        """
+        self.check_output_space(input_file)
+        with self.cond:
+            if input_file in self.upcoming:
+                self.upcoming.remove(input_file)
+            self.discarded.discard(input_file)
+            while input_file in self.copying:
+                self.cond.wait()
+            local = self.staged.pop(input_file, None)
+            copy_now = local is None and self.has_local_space(input_file)
+            self.in_use[input_file] = local
+            self.cond.notify_all()
+        if copy_now:
+            # 尚未预取（例如第一批任务或运行中加入的文件）时立即复制
+            local = self.copy_in(input_file)
+            with self.cond:
+                self.in_use[input_file] = local
+        elif local is None:
+            self.log(f"暂存目录空间不足，直接读取原文件: {os.path.basename(input_file)}")
+        return local or input_file
+
+    def check_output_space(self, input_file):
+        estimate = self.estimates.get(input_file, 0)
+        with self.cond:
+            while True:
+                free = free_space(self.final_dir)
+                if free is None or free - self.pending_bytes - estimate >= self.reserve:
+                    return
+                if not self.copy_queue:
+                    raise OSError(errno.ENOSPC, f"输出目录空间不足（可用 {free / 1024 ** 3:.1f} GB，"
+                                                f"估算需要 {(estimate + self.reserve) / 1024 ** 3:.1f} GB）")
+                self.cond.wait(SPACE_RECHECK_INTERVAL)
+
+    def release(self, input_file):
+        """文件处理结束后删除输入的本地副本（包括输出已是最新、预取后未使用的副本）"""
+        with self.cond:
+            local = self.in_use.pop(input_file, None)
+            if local:
+                self._remove(local)
+            self._forget(input_file)
+
+    def discard(self, input_file):
+        """文件被取消：不再预取，删除尚未使用的本地副本"""
+        with self.cond:
+            self._forget(input_file)
+
+    def _forget(self, input_file):
+        """从预取队列中移除并删除已预取的副本（调用方需持有锁）"""
+        if input_file in self.upcoming:
+            self.upcoming.remove(input_file)
+        if input_file in self.copying:
+            self.discarded.add(input_file)
+        local = self.staged.pop(input_file, None)
+        if local:
+            self._remove(local)
+        self.cond.notify_all()
+
+    def copy_out(self, input_file, local_output, output_file, on_done=None):
+        """
+        把编码完成的本地输出加入复制队列，立即返回
+
+        本地输出先改名，调用方随后清理临时文件时不会删除它；复制完成后调用 on_done(是否成功)
+        """
+        with self.cond:
+            self.sequence += 1
+            queued = f"{local_output}.{self.sequence}.queued"
+        os.replace(local_output, queued)
+        with self.cond:
+            self.copy_queue.append((input_file, queued, output_file, on_done))
+            self.pending_bytes += file_size(queued)
+            self.cond.notify_all()
+
+    def copy_loop(self):
+        while True:
+            with self.cond:
+                while not self.copy_queue and not self.stopped:
+                    self.cond.wait()
+                if not self.copy_queue:
+                    return
+                input_file, queued, output_file, on_done = self.copy_queue[0]
+            success = self.publish(queued, output_file)
+            # 先调用回调再移出队列，drain 返回时全部回调都已完成
+            if on_done:
+                on_done(success)
+            with self.cond:
+                if self.copy_queue and self.copy_queue[0][1] == queued:
+                    self.copy_queue.pop(0)
+                self.pending_bytes = max(0, self.pending_bytes - file_size(queued))
+                if not success and input_file not in self.failed:
+                    self.failed.append(input_file)
+                self._remove(queued)
+                self.cond.notify_all()
+
+    def publish(self, queued, output_file):
+        """复制到输出目录中的隐藏临时文件，完成后重命名为最终文件"""
+        size = file_size(queued)
+        free = free_space(os.path.dirname(output_file))
+        if free is not None and free - size < self.reserve:
+            self.log(f"输出目录空间不足，无法复制 {os.path.basename(output_file)}"
+                     f"（需要 {size / 1024 ** 3:.1f} GB，可用 {free / 1024 ** 3:.1f} GB）")
+            return False
+        temp_output = partial_path(output_file)
+        try:
+            shutil.copyfile(queued, temp_output)
+            os.replace(temp_output, output_file)
+            return True
+        except OSError as e:
+            self.log(f"复制输出失败: {os.path.basename(output_file)}（{str(e)}）")
+            self._remove(temp_output)
+            return False
+
+    def drain(self):
+        """
+        等待全部输出复制完成
+
+        返回:
+            复制失败的输入文件列表
+        """
+        with self.cond:
+            while self.copy_queue:
+                self.cond.wait()
+            failed, self.failed = self.failed, []
+        return failed
+
+    def abandon(self):
+        """
+        中断时放弃尚未开始复制的输出
+
+        返回:
+            输出未能复制到输出目录的输入文件列表（包括正在复制的文件）
+        """
+        with self.cond:
+            self.stopped = True
+            abandoned = [item[0] for item in self.copy_queue]
+            del self.copy_queue[1:]
+            self.cond.notify_all()
+        return abandoned
+
+    def close(self):
+        """停止后台线程（正在复制的文件会复制完），删除本次运行的暂存目录"""
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,63 @@
+"""
+启动耗时跟踪
+记录启动过程中各阶段的耗时，窗口显示和后台初始化完成后汇总为一行写入日志。
+设置环境变量 VIDEO_CONVERTER_TRACE=1 时，每个阶段结束时立即打印到标准错误。
+此模块不依赖tkinter，应尽早导入，使计时从程序开始运行时算起。
+"""
+
+import os
+import sys
+import threading
+import time
+
+# 本模块被导入的时间，作为启动计时的起点
+PROCESS_START = time.perf_counter()
+
+# 设置后实时打印各阶段耗时的环境变量
+TRACE_ENV = "VIDEO_CONVERTER_TRACE"
+
+
+class StartupTrace:
+    """记录启动阶段耗时，阶段可以在不同线程中并行进行"""
+
+    def __init__(self, echo=None):
+        self.echo = bool(os.environ.get(TRACE_ENV)) if echo is None else echo
+        self.phases = []  # (阶段名, 耗时秒, 结束时距启动的秒数)
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - PROCESS_START
+
+    def phase(self, name):
+        """用作上下文管理器，记录一个阶段的耗时"""
+        return _Phase(self, name)
+
+    def record(self, name, duration):
+        finished = self.elapsed()
+        with self._lock:
+            self.phases.append((name, duration, finished))
+        if self.echo:
+            sys.stderr.write(f"[启动] {name}: {duration * 1000:.0f} ms（累计 {finished * 1000:.0f} ms）\n")
+
+    def mark(self, name):
+        """记录一个时间点（如窗口显示），耗时为距启动的时间"""
+        self.record(name, self.elapsed())
+
+    def summary(self):
+        with self._lock:
+            parts = [f"{name} {duration * 1000:.0f}ms" for name, duration, _ in self.phases]
+        return "启动耗时: " + "，".join(parts)
+
+
+class _Phase:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.record(self.name, time.perf_counter() - self.start)
+        return False
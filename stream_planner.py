@@ -0,0 +1,114 @@
+"""
+流复制规划
+根据探测到的元数据判断每路流是否已经符合输出要求，
+符合时直接复制（-c copy），只对需要修复或转换的流重新编码。
+此模块不依赖tkinter。
+"""
+
+# 目标视频格式：H.264 + yuv420p（修复iPhone绿屏所需的像素格式）
+TARGET_VIDEO_CODEC = "h264"
+TARGET_PIX_FMT = "yuv420p"
+TARGET_AUDIO_CODEC = "aac"
+
+# 各容器可以直接封装的编码
+CONTAINER_VIDEO_CODECS = {
+    "mp4": {"h264"},
+    "mov": {"h264"},
+    "mkv": {"h264"},
+    "avi": {"h264"},
+}
+CONTAINER_AUDIO_CODECS = {
+    "mp4": {"aac"},
+    "mov": {"aac"},
+    "mkv": {"aac"},
+    "avi": set(),  # AVI中封装AAC兼容性差，始终重新编码
+}
+
+
+class StreamPlan:
+    """单个文件的流处理方案"""
+
+    def __init__(self, video_copy=False, audio_copy=False, has_audio=True, reasons=None):
+        self.video_copy = video_copy
+        self.audio_copy = audio_copy
+        self.has_audio = has_audio
+        self.reasons = reasons or []
+
+    @property
+    def mode(self):
+        """返回方案名称：remux / copy_audio / copy_video / reencode"""
+        audio_done = self.audio_copy or not self.has_audio
+        if self.video_copy and audio_done:
+            return "remux"
+        if self.video_copy:
+            return "copy_video"
+        if self.audio_copy:
+            return "copy_audio"
+        return "reencode"
+
+    def describe(self):
+        """返回适合在预览窗口中显示的中文说明"""
+        labels = {
+            "remux": "直接复制（仅重新封装）",
+            "copy_video": "复制视频，重新编码音频",
+            "copy_audio": "重新编码视频，复制音频",
+            "reencode": "完全重新编码",
+        }
+        text = labels[self.mode]
+        if self.reasons:
+            text += f"（{'；'.join(self.reasons)}）"
+        return text
+
+    def to_dict(self):
+        return {
+            "mode": self.mode,
+            "video_copy": self.video_copy,
+            "audio_copy": self.audio_copy,
+            "reasons": list(self.reasons),
+        }
+
+
+def plan_streams(metadata, settings):
+    """
+    根据元数据和转码设置生成流处理方案
+
+    参数:
+        metadata: probe_cache 生成的元数据字典，未知时传入None
+        settings: ConversionSettings实例
+
+    返回:
+        StreamPlan实例；元数据未知或禁用流复制时返回完全重新编码的方案
+    """
+    if not metadata or not settings.allow_stream_copy:
+        return StreamPlan()
+
+    reasons = []
+    container = settings.output_format
+
+    # 视频流：超分需要经过滤镜，必须重新编码
+    video_copy = True
+    if settings.sr_enabled:
+        video_copy = False
+        reasons.append("启用了超分辨率")
+    elif metadata.get("video_codec") != TARGET_VIDEO_CODEC:
+        video_copy = False
+        reasons.append(f"视频编码为{metadata.get('video_codec') or '未知'}")
+    elif metadata.get("pix_fmt") != TARGET_PIX_FMT:
+        video_copy = False
+        reasons.append(f"像素格式为{metadata.get('pix_fmt') or '未知'}")
+    elif metadata.get("video_codec") not in CONTAINER_VIDEO_CODECS.get(container, set()):
+        video_copy = False
+        reasons.append(f"{container}容器不支持直接封装该视频")
+
+    # 音频流
+    has_audio = bool(metadata.get("audio_codec"))
+    audio_copy = False
+    if has_audio:
+        if metadata.get("audio_codec") != TARGET_AUDIO_CODEC:
+            reasons.append(f"音频编码为{metadata.get('audio_codec')}")
+        elif metadata.get("audio_codec") not in CONTAINER_AUDIO_CODECS.get(container, set()):
+            reasons.append(f"{container}容器不支持直接封装该音频")
+        else:
+            audio_copy = True
+
+    return StreamPlan(video_copy=video_copy, audio_copy=audio_copy, has_audio=has_audio, reasons=reasons)
@@ -0,0 +1,290 @@
+"""
+转码任务的性能遥测
+为每个任务记录各阶段耗时（探测、排队、编码、收尾）、平均帧率和速度倍数、输入输出字节数和压缩比，
+以及ffmpeg子进程的CPU用户态/内核态时间和峰值内存（POSIX上来自 wait4）。
+记录逐行追加到JSON Lines文件，并汇总写入Prometheus textfile collector格式的 .prom 文件，
+便于按机器跟踪吞吐量并发现性能下降。同一台机器上同时运行的多个进程在文件锁下读取、合并并重写 .prom 文件，
+累计指标不会因互相覆盖而减小。
+此模块不依赖tkinter。
+"""
+
+import contextlib
+import json
+import os
+import socket
+import threading
+import time
+
+from probe_cache import cache_dir
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+JSONL_NAME = "jobs.jsonl"
+PROM_NAME = "video_converter.prom"
+
+# 指标名前缀
+METRIC_PREFIX = "video_converter"
+
+# 累计指标和最近值指标：(名称, 说明)
+COUNTERS = [
+    ("jobs_total", "已结束的转码任务数"),
+    ("encode_seconds_total", "编码阶段的累计耗时（秒）"),
+    ("queue_wait_seconds_total", "任务排队等待的累计时间（秒）"),
+    ("media_seconds_total", "已成功转码的媒体时长（秒）"),
+    ("input_bytes_total", "已成功转码的输入字节数"),
+    ("output_bytes_total", "已成功转码的输出字节数"),
+    ("cpu_seconds_total", "ffmpeg子进程的累计CPU时间（秒）"),
+]
+GAUGES = [
+    ("last_job_timestamp_seconds", "最近一个任务结束的时间戳"),
+    ("last_job_speed", "最近一个成功任务的速度（相对实时的倍数）"),
+    ("last_job_fps", "最近一个成功任务的平均编码帧率"),
+    ("last_job_peak_rss_bytes", "最近一个成功任务中ffmpeg进程的峰值内存（字节）"),
+]
+
+
+def default_telemetry_dir():
+    return os.path.join(cache_dir(), "telemetry")
+
+
+def new_job_stats():
+    """单个任务在运行过程中累计的统计，由转码引擎在每个ffmpeg进程结束时更新"""
+    return {
+        "encode_seconds": 0.0,  # 各ffmpeg进程耗时之和
+        "encode_wall": None,  # 编码阶段的实际耗时，分段编码时小于各进程耗时之和
+        "finalize_seconds": 0.0,
+        "frames": 0,
+        "processes": 0,
+        "cpu_user": None,
+        "cpu_sys": None,
+        "peak_rss": None,
+    }
+
+
+def add_process_usage(stats, elapsed, frames, usage):
+    """把一个ffmpeg进程的耗时、帧数和资源使用计入任务统计"""
+    stats["encode_seconds"] += elapsed
+    stats["frames"] += frames or 0
+    stats["processes"] += 1
+    if usage:
+        stats["cpu_user"] = (stats["cpu_user"] or 0.0) + usage["cpu_user"]
+        stats["cpu_sys"] = (stats["cpu_sys"] or 0.0) + usage["cpu_sys"]
+        # 分段编码时多个进程并行运行，记录其中最大的单个进程
+        stats["peak_rss"] = max(stats["peak_rss"] or 0, usage["peak_rss"])
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def total_size(paths):
+    """返回一个或多个输出文件的总大小，任一文件不存在时返回None"""
+    sizes = [file_size(path) for path in (paths if isinstance(paths, list) else [paths])]
+    return sum(sizes) if None not in sizes else None
+
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+
+def job_record(input_file, output_file, state, stats, duration=None, probe_seconds=None,
+               queue_wait=None, **extra):
+    """
+    生成一个任务的遥测记录
+
+    参数:
+        output_file: 输出文件路径，多路输出时为路径列表
+        state: done/skipped/failed/cancelled
+        stats: new_job_stats() 累计的统计
+        duration: 输入文件的媒体时长（秒）
+        probe_seconds: 探测该文件元数据的耗时（缓存命中时为0）
+        queue_wait: 从加入队列到开始处理的等待时间
+        extra: 其他字段（编码器、预设、批次ID等）
+    """
+    input_bytes = file_size(input_file)
+    output_bytes = total_size(output_file) if state == "done" else None
+    encode_seconds = stats["encode_wall"] if stats["encode_wall"] is not None else stats["encode_seconds"]
+    record = {
+        "time": round(time.time(), 3),
+        "host": socket.gethostname(),
+        "input": input_file,
+        "output": output_file,
+        "state": state,
+        "phases": {
+            "probe": _round(probe_seconds),
+            "queue_wait": _round(queue_wait),
+            "encode": _round(encode_seconds),
+            "finalize": _round(stats["finalize_seconds"]),
+        },
+        "duration": _round(duration),
+        "frames": stats["frames"] or None,
+        "fps": _round(stats["frames"] / encode_seconds, 2) if stats["frames"] and encode_seconds else None,
+        "speed": _round(duration / encode_seconds) if duration and encode_seconds else None,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "compression_ratio": _round(input_bytes / output_bytes) if input_bytes and output_bytes else None,
+        "processes": stats["processes"],
+        "cpu_user": _round(stats["cpu_user"]),
+        "cpu_sys": _round(stats["cpu_sys"]),
+        "peak_rss": stats["peak_rss"],
+    }
+    record.update(extra)
+    return record
+
+
+def describe_record(record):
+    """返回一行便于阅读的任务统计"""
+    parts = [f"编码 {record['phases']['encode']:.1f}s" if record["phases"]["encode"] is not None else "编码 -"]
+    if record["fps"]:
+        parts.append(f"{record['fps']:.0f} fps")
+    if record["speed"]:
+        parts.append(f"{record['speed']:.2f}x")
+    if record["compression_ratio"]:
+        parts.append(f"压缩比 {record['compression_ratio']:.2f}")
+    if record["cpu_user"] is not None:
+        parts.append(f"CPU {record['cpu_user'] + record['cpu_sys']:.1f}s")
+    if record["peak_rss"]:
+        parts.append(f"峰值内存 {record['peak_rss'] / 1024 / 1024:.0f} MB")
+    return "，".join(parts)
+
+
+def _series(name, labels=None):
+    label_text = ",".join(f'{key}="{value}"' for key, value in sorted((labels or {}).items()))
+    return f"{METRIC_PREFIX}_{name}{{{label_text}}}" if label_text else f"{METRIC_PREFIX}_{name}"
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """跨进程的排他锁：POSIX上使用 fcntl.flock，Windows上使用 msvcrt.locking；无法加锁时不加锁继续"""
+    try:
+        f = open(path, 'a+b')
+    except OSError:
+        yield
+        return
+    locked = False
+    try:
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                locked = True
+            elif msvcrt:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                locked = True
+        except OSError:
+            pass
+        yield
+    finally:
+        if locked:
+            try:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            except OSError:
+                pass
+        f.close()
+
+
+class TelemetrySink:
+    """把任务记录写入JSON Lines文件，并维护Prometheus textfile collector文件"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_telemetry_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.jsonl_path = os.path.join(self.directory, JSONL_NAME)
+        self.prom_path = os.path.join(self.directory, PROM_NAME)
+        self.lock_path = self.prom_path + ".lock"
+        self._lock = threading.Lock()
+        # 累计指标从已有的 .prom 文件继续，多次运行之间保持单调递增
+        self.values = self.load_prom()
+
+    def load_prom(self):
+        values = {}
+        try:
+            with open(self.prom_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith("#") or not line.strip():
+                        continue
+                    series, _, value = line.strip().rpartition(" ")
+                    try:
+                        values[series] = float(value)
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return values
+
+    def write(self, record):
+        """
+        追加一条任务记录并更新指标文件
+
+        其他进程可能在本进程启动后更新过 .prom 文件，每次更新前在文件锁下重新读取，
+        在最新的累计值上加上本任务的值后再写回
+        """
+        with self._lock, file_lock(self.lock_path):
+            try:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"写入遥测记录失败: {str(e)}")
+            if os.path.exists(self.prom_path):
+                self.values = self.load_prom()
+            self.update_metrics(record)
+            self.save_prom()
+
+    def _add(self, name, value, labels=None):
+        if value is None:
+            return
+        series = _series(name, labels)
+        self.values[series] = self.values.get(series, 0.0) + value
+
+    def update_metrics(self, record):
+        phases = record["phases"]
+        self._add("jobs_total", 1, {"state": record["state"]})
+        self._add("queue_wait_seconds_total", phases["queue_wait"])
+        if record["state"] in ("done", "failed", "cancelled"):
+            self._add("encode_seconds_total", phases["encode"])
+            self._add("cpu_seconds_total", record["cpu_user"], {"mode": "user"})
+            self._add("cpu_seconds_total", record["cpu_sys"], {"mode": "sys"})
+        self.values[_series("last_job_timestamp_seconds")] = record["time"]
+        if record["state"] == "done":
+            self._add("media_seconds_total", record["duration"])
+            self._add("input_bytes_total", record["input_bytes"])
+            self._add("output_bytes_total", record["output_bytes"])
+            for name, key in (("last_job_speed", "speed"), ("last_job_fps", "fps"),
+                              ("last_job_peak_rss_bytes", "peak_rss")):
+                if record[key] is not None:
+                    self.values[_series(name)] = record[key]
+
+    def save_prom(self):
+        """原子写入 .prom 文件，node_exporter 不会读到写了一半的内容"""
+        lines = []
+        for metrics, kind in ((COUNTERS, "counter"), (GAUGES, "gauge")):
+            for name, help_text in metrics:
+                prefix = f"{METRIC_PREFIX}_{name}"
+                series = sorted(s for s in self.values if s == prefix or s.startswith(prefix + "{"))
+                if not series:
+                    continue
+                lines.append(f"# HELP {prefix} {help_text}")
+                lines.append(f"# TYPE {prefix} {kind}")
+                # repr 保留完整精度，累计值重新读入时不丢失
+                lines.extend(f"{s} {float(self.values[s])!r}" for s in series)
+        try:
+            tmp_path = f"{self.prom_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.prom_path)
+        except OSError as e:
+            print(f"写入指标文件失败: {str(e)}")
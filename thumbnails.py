@@ -0,0 +1,219 @@
+"""
+关键帧缩略图
+为预览窗格生成缩略图条和缩略图表：在文件中均匀选取几个时间点，每个时间点只跳转到最近的关键帧
+并解码这一帧（-skip_frame nokey），不需要完整解码，长达数小时的4K文件也只需几十毫秒。
+生成的PNG保存在缓存目录中，路径记录在元数据缓存的同一条目下，文件变化后自动失效。
+缩略图由单个后台线程按需生成，最近请求的文件优先。
+此模块不依赖tkinter。
+"""
+
+import hashlib
+import os
+import subprocess
+import threading
+
+from probe_cache import cache_dir, file_fingerprint
+
+# Windows下隐藏子进程的控制台窗口
+CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+# 缩略图条（列表中的文件）和缩略图表（选中的文件）的布局：(列数, 行数)
+STRIP_LAYOUT = (4, 1)
+SHEET_LAYOUT = (3, 3)
+
+# 每一格的高度（像素）
+THUMB_HEIGHT = 54
+
+# 单个文件生成缩略图的超时（秒）
+THUMB_TIMEOUT = 30
+
+# 等待生成的请求上限，超过后丢弃最早的请求（已滚出视野的行）
+MAX_PENDING = 200
+
+# 缓存目录中保留的缩略图文件数上限
+MAX_FILES = 5000
+
+
+def thumbnail_dir():
+    return os.path.join(cache_dir(), "thumbnails")
+
+
+def thumbnail_times(duration, count):
+    """在时长内均匀选取时间点，时长未知时只取开头"""
+    if not duration or duration <= 0:
+        return [0.0]
+    return [duration * (i + 0.5) / count for i in range(count)]
+
+
+def grid_layout(count, columns):
+    """返回 xstack 的布局字符串，每格大小相同"""
+    cells = []
+    for i in range(count):
+        x = "+".join(["w0"] * (i % columns)) or "0"
+        y = "+".join(["h0"] * (i // columns)) or "0"
+        cells.append(f"{x}_{y}")
+    return "|".join(cells)
+
+
+def thumbnail_command(ffmpeg_path, input_file, output_file, times, columns, height=THUMB_HEIGHT):
+    """
+    构建生成缩略图的ffmpeg命令
+
+    每个时间点作为一个单独的输入：-ss 在输入前直接跳转到关键帧，-skip_frame nokey 让解码器
+    跳过所有非关键帧，因此每个输入只解码一帧；各帧缩放到相同高度后拼接为网格
+    """
+    cmd = [ffmpeg_path, "-hide_banner", "-nostdin", "-v", "error"]
+    for t in times:
+        cmd.extend(["-skip_frame", "nokey", "-noaccurate_seek", "-threads", "1",
+                    "-ss", f"{t:.3f}", "-i", input_file])
+    graph = [f"[{i}:v:0]scale=-2:{height},setsar=1[t{i}]" for i in range(len(times))]
+    if len(times) == 1:
+        graph.append("[t0]null[out]")
+    else:
+        inputs = "".join(f"[t{i}]" for i in range(len(times)))
+        layout = grid_layout(len(times), columns)
+        graph.append(f"{inputs}xstack=inputs={len(times)}:layout={layout}[out]")
+    cmd.extend(["-filter_complex", ";".join(graph), "-map", "[out]", "-frames:v", "1", "-y", output_file])
+    return cmd
+
+
+def generate_thumbnail(ffmpeg_path, input_file, output_file, times, columns, height=THUMB_HEIGHT):
+    """生成缩略图并原子写入 output_file，返回是否成功"""
+    tmp_path = f"{os.path.splitext(output_file)[0]}.{os.getpid()}.tmp.png"
+    try:
+        result = subprocess.run(
+            thumbnail_command(ffmpeg_path, input_file, tmp_path, times, columns, height),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+            timeout=THUMB_TIMEOUT, creationflags=CREATE_NO_WINDOW
+        )
+        if result.returncode != 0 or not os.path.exists(tmp_path):
+            return False
+        os.replace(tmp_path, output_file)
+        return True
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+class ThumbnailService:
+    """在后台按需生成缩略图，结果记录在元数据缓存中"""
+
+    def __init__(self, ffmpeg_path, cache=None, on_ready=None, directory=None, height=THUMB_HEIGHT):
+        """
+        参数:
+            ffmpeg_path: ffmpeg可执行文件路径
+            cache: ProbeCache实例，缩略图路径记录在其 "thumbnails" 字段中（可选）
+            on_ready: 缩略图生成后的回调 on_ready(input_file, layout, png_path)，在后台线程中调用
+            directory: 保存PNG的目录，默认使用缓存目录下的 thumbnails
+        """
+        self.ffmpeg_path = ffmpeg_path
+        self.cache = cache
+        self.on_ready = on_ready
+        self.directory = directory or thumbnail_dir()
+        self.height = height
+        self.pending = []  # (文件, 布局, 时长)，末尾的请求最先处理
+        self.failed = set()
+        self.cond = threading.Condition()
+        self.worker = None
+        self.stopped = False
+        self.generated = 0
+
+    def png_path(self, input_file, layout):
+        """缩略图文件名由路径、文件指纹和布局决定，文件变化后生成新文件"""
+        key = f"{os.path.abspath(input_file)}|{file_fingerprint(input_file)}|{layout[0]}x{layout[1]}|{self.height}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+    def get(self, input_file, layout=STRIP_LAYOUT):
+        """返回已生成的缩略图路径，没有时返回None"""
+        if not self.cache:
+            return None
+        entry = self.cache.get(input_file, field="thumbnails") or {}
+        path = entry.get(f"{layout[0]}x{layout[1]}")
+        return path if path and os.path.exists(path) else None
+
+    def request(self, input_file, duration=None, layout=STRIP_LAYOUT):
+        """
+        请求生成缩略图；已有缓存时直接返回其路径，否则加入队列并返回None
+
+        重复请求同一文件会把它移到队列最前面
+        """
+        cached = self.get(input_file, layout)
+        if cached or (input_file, layout) in self.failed:
+            return cached
+        with self.cond:
+            self.pending = [p for p in self.pending if p[:2] != (input_file, layout)]
+            self.pending.append((input_file, layout, duration))
+            del self.pending[:-MAX_PENDING]
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.worker_loop, daemon=True)
+                self.worker.start()
+            self.cond.notify()
+        return None
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.pending = []
+            self.cond.notify()
+
+    def worker_loop(self):
+        saved = True
+        while True:
+            with self.cond:
+                if self.stopped:
+                    return
+                item = self.pending.pop() if self.pending else None
+                if item is None and saved:
+                    self.cond.wait()
+                    continue
+            if item is None:
+                # 队列清空时把新的缩略图记录写入磁盘，写入时不持有锁，不阻塞界面线程的请求
+                if self.cache:
+                    self.cache.save()
+                saved = True
+                continue
+            self.generate(*item)
+            saved = False
+
+    def generate(self, input_file, layout, duration):
+        if self.get(input_file, layout):
+            return
+        columns, rows = layout
+        times = thumbnail_times(duration, columns * rows)
+        path = self.png_path(input_file, layout)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError:
+            return
+        if not generate_thumbnail(self.ffmpeg_path, input_file, path, times, columns, self.height):
+            self.failed.add((input_file, layout))
+            return
+        if self.cache:
+            entry = dict(self.cache.get(input_file, field="thumbnails") or {})
+            entry[f"{layout[0]}x{layout[1]}"] = path
+            self.cache.put(input_file, entry, field="thumbnails")
+        self.generated += 1
+        if self.generated % 100 == 1:
+            self.prune()
+        if self.on_ready:
+            self.on_ready(input_file, layout, path)
+
+    def prune(self):
+        """缩略图文件超过上限时删除最旧的文件（其缓存记录在读取时因文件不存在而失效）"""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".png")]
+        except OSError:
+            return
+        if len(names) <= MAX_FILES:
+            return
+        try:
+            paths = sorted((os.path.join(self.directory, n) for n in names), key=os.path.getmtime)
+            for path in paths[:len(paths) - MAX_FILES]:
+                os.remove(path)
+        except OSError:
+            pass
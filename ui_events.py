@@ -0,0 +1,126 @@
+"""
+线程安全的界面事件总线
+工作线程不直接调用Tk，而是把事件投递到队列中，由Tk主循环定时取出执行。
+进度类事件按键合并，只以固定频率刷新最新值；日志在内存中有上限，完整日志写入滚动日志文件。
+此模块本身不导入tkinter，只使用传入的根窗口的 after 方法。
+"""
+
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from probe_cache import cache_dir
+
+# 主循环检查事件队列的间隔（毫秒）
+POLL_INTERVAL_MS = 50
+
+# 合并事件（进度、状态）的最小刷新间隔（秒）
+COALESCE_INTERVAL = 0.2
+
+# 每次最多处理的事件数，避免事件过多时阻塞界面
+MAX_EVENTS_PER_TICK = 500
+
+# 等待显示的日志行上限，界面卡顿时丢弃最旧的行（完整内容仍在日志文件中）
+MAX_PENDING_LOG_LINES = 5000
+
+# 滚动日志文件的大小和保留数量
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+
+
+def create_file_logger(log_dir=None):
+    """创建写入滚动日志文件的logger，返回 (logger, 日志文件路径)"""
+    log_dir = log_dir or os.path.join(cache_dir(), "logs")
+    log_path = os.path.join(log_dir, "video_converter.log")
+    logger = logging.getLogger("video_converter")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        except OSError as e:
+            print(f"无法创建日志文件: {str(e)}")
+    return logger, log_path
+
+
+class UiEventBus:
+    """工作线程向Tk主线程投递事件的队列"""
+
+    def __init__(self, root, poll_interval_ms=POLL_INTERVAL_MS, coalesce_interval=COALESCE_INTERVAL):
+        self.root = root
+        self.poll_interval_ms = poll_interval_ms
+        self.coalesce_interval = coalesce_interval
+        self.events = queue.Queue()
+        self.coalesced = {}
+        self.last_flush = 0.0
+        self.log_lines = collections.deque(maxlen=MAX_PENDING_LOG_LINES)
+        self.log_handler = None
+        self._lock = threading.Lock()
+
+    def call(self, fn, *args, **kwargs):
+        """在主线程中执行 fn，可在任意线程调用"""
+        self.events.put((fn, args, kwargs))
+
+    def coalesce(self, key, fn, *args):
+        """投递可合并的事件：同一个key只保留最新一次，按固定频率在主线程执行"""
+        with self._lock:
+            self.coalesced[key] = (fn, args)
+
+    def discard(self, key):
+        """丢弃尚未执行的合并事件，用于在最终状态之前清除过期的进度"""
+        with self._lock:
+            self.coalesced.pop(key, None)
+
+    def post_log(self, message):
+        """投递一行日志，由主线程批量写入界面"""
+        self.log_lines.append(message)
+
+    def start(self, log_handler=None):
+        """
+        开始在主循环中定时处理事件
+
+        参数:
+            log_handler: 接收日志行列表的函数，在主线程中批量调用
+        """
+        self.log_handler = log_handler
+        self.root.after(self.poll_interval_ms, self.drain)
+
+    def drain(self):
+        """处理排队的事件（在主线程中运行）"""
+        try:
+            for _ in range(MAX_EVENTS_PER_TICK):
+                try:
+                    fn, args, kwargs = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                self._dispatch(fn, *args, **kwargs)
+
+            now = time.time()
+            if now - self.last_flush >= self.coalesce_interval:
+                self.last_flush = now
+                with self._lock:
+                    pending, self.coalesced = self.coalesced, {}
+                for fn, args in pending.values():
+                    self._dispatch(fn, *args)
+
+            if self.log_lines and self.log_handler:
+                lines = [self.log_lines.popleft() for _ in range(len(self.log_lines))]
+                self._dispatch(self.log_handler, lines)
+        finally:
+            self.root.after(self.poll_interval_ms, self.drain)
+
+    @staticmethod
+    def _dispatch(fn, *args, **kwargs):
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"处理界面事件时出错: {str(e)}")
@@ -1,830 +1,1130 @@
-import os
-import sys
-import subprocess
-import threading
-import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
-from tkinter.scrolledtext import ScrolledText
-import shutil
-
-# 尝试导入拖放处理模块
-try:
-    from tkdnd_handler import DragDropHandler, install_tkdnd_guide
-    TKDND_AVAILABLE = True
-except ImportError:
-    TKDND_AVAILABLE = False
-
-class VideoConverter:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("视频批量转码工具")
-        self.root.geometry("900x650")  # 增加窗口尺寸
-        self.root.resizable(True, True)
-        
-        # 设置窗口图标（如果可用）
-        try:
-            icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icon.ico")
-            if os.path.exists(icon_path):
-                self.root.iconbitmap(icon_path)
-        except:
-            pass
-        
-        # 设置应用风格主题
-        self.setup_styles()
-        
-        self.setup_ui()
-        self.video_files = []
-        self.ffmpeg_path = self.check_ffmpeg()
-        
-        # 初始化输出目录为 "converted_videos" 子文件夹
-        self.output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "converted_videos")
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-        self.output_dir_var.set(self.output_dir)
-        
-        # 设置文件拖放处理
-        self.setup_drag_drop()
-    
-    def setup_styles(self):
-        """设置应用程序的视觉风格"""
-        style = ttk.Style()
-        
-        # 尝试设置更现代的主题
-        available_themes = style.theme_names()
-        preferred_themes = ['vista', 'clam', 'winnative', 'default']
-        
-        for theme in preferred_themes:
-            if theme in available_themes:
-                style.theme_use(theme)
-                break
-        
-        # 定制组件样式 - 确保可见性
-        bg_color = "#f0f0f0"
-        button_bg = "#d0d0d0"
-        accent_color = "#2c6eaf"
-        text_color = "#000000"
-        
-        # 确保组件样式清晰可见
-        style.configure('TLabelframe', padding=8, relief='solid', borderwidth=1, background=bg_color)
-        style.configure('TLabelframe.Label', font=('Arial', 10, 'bold'), foreground=text_color, background=bg_color)
-        style.configure('TFrame', background=bg_color)
-        style.configure('TLabel', font=('Arial', 9), foreground=text_color, background=bg_color)
-        
-        # 使按钮更加醒目
-        style.configure('TButton', 
-                        font=('Arial', 9, 'bold'), 
-                        foreground=text_color,
-                        padding=8, 
-                        background=button_bg, 
-                        relief='raised',
-                        borderwidth=2)
-        
-        # 鼠标悬停效果
-        style.map('TButton',
-                  foreground=[('active', text_color)],
-                  background=[('active', button_bg)],
-                  relief=[('pressed', 'sunken')])
-                 
-        # 主要操作按钮
-        style.configure('Accent.TButton', 
-                        background=accent_color, 
-                        foreground='white',
-                        padding=8,
-                        font=('Arial', 10, 'bold'))
-        
-        # 鼠标悬停效果 (主要按钮)
-        style.map('Accent.TButton',
-                  background=[('active', '#1d5a98')],
-                  foreground=[('active', 'white')])
-        
-        style.configure('TCheckbutton', font=('Arial', 9), foreground=text_color, background=bg_color)
-        style.configure('TCombobox', padding=2)
-        style.configure('Horizontal.TProgressbar', background=accent_color)
-        
-        # 确保ScrolledText也有好的可读性
-        self.root.option_add("*Text.Background", "#ffffff")
-        self.root.option_add("*Text.Foreground", "#000000")
-        
-        # 区域边框颜色
-        style.configure('Card.TFrame', background="#ffffff", relief="solid", borderwidth=1)
-    
-    def setup_ui(self):
-        # 创建主框架，使用两列布局
-        main_frame = ttk.Frame(self.root, padding=10)
-        main_frame.pack(fill=tk.BOTH, expand=True)
-        
-        # 创建左右布局
-        left_panel = ttk.Frame(main_frame)
-        left_panel.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
-        
-        right_panel = ttk.Frame(main_frame)
-        right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=False, padx=(5, 0), ipadx=5)
-        right_panel.configure(width=280)  # 固定右侧面板宽度
-        
-        # ===== 左侧面板 =====
-        # 顶部信息区域 - 使用鲜明的背景色
-        info_frame = ttk.Frame(left_panel, style='Card.TFrame')
-        info_frame.pack(fill=tk.X, pady=(0, 10))
-        
-        # 使标题更加突出
-        info_label = ttk.Label(
-            info_frame, 
-            text="视频批量转码与超分辨率工具",
-            font=('Arial', 12, 'bold'),
-            foreground="#2c6eaf",
-            padding=8
-        )
-        info_label.pack(anchor=tk.W)
-        
-        # 增强描述文本对比度
-        desc_label = ttk.Label(
-            info_frame, 
-            text="此工具可以修复iPhone录制的绿屏视频，并支持批量转码与超分辨率处理",
-            foreground="#000000",
-            background="#ffffff",
-            padding=(8, 0, 8, 8),
-            wraplength=550
-        )
-        desc_label.pack(anchor=tk.W)
-        
-        # 创建拖放区域
-        drop_frame = ttk.LabelFrame(left_panel, text="文件列表", padding=8)
-        drop_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
-        
-        # 添加一个文件操作工具栏
-        file_toolbar = ttk.Frame(drop_frame)
-        file_toolbar.pack(fill=tk.X, pady=(0, 5))
-        
-        self.drop_label = ttk.Label(file_toolbar, text="拖放视频文件到此处或使用下方按钮添加文件")
-        self.drop_label.pack(side=tk.LEFT)
-        
-        # 添加文件数量指示器
-        self.file_count_var = tk.StringVar(value="0 个文件")
-        ttk.Label(file_toolbar, textvariable=self.file_count_var).pack(side=tk.RIGHT)
-        
-        # 拖放区
-        self.drop_area = ScrolledText(drop_frame, height=12, width=70, state='disabled')
-        self.drop_area.pack(fill=tk.BOTH, expand=True)
-        self.drop_area.configure(font=('Consolas', 10), background='#f9f9f9')
-        
-        # 文件操作按钮行 - 增加padding确保按钮可见
-        file_actions = ttk.Frame(drop_frame)
-        file_actions.pack(fill=tk.X, pady=(5, 0))
-        
-        # 给按钮添加更明显的样式和间距 - 使用标准tk.Button提高兼容性
-        add_button = tk.Button(
-            file_actions, 
-            text="添加文件", 
-            command=self.add_files,
-            font=('Arial', 9, 'bold'),
-            relief='raised',
-            bg='#e1e1e1',
-            borderwidth=2,
-            padx=10,
-            pady=5
-        )
-        add_button.pack(side=tk.LEFT, padx=5, pady=5)
-        
-        clear_button = tk.Button(
-            file_actions, 
-            text="清空列表", 
-            command=self.clear_files,
-            font=('Arial', 9, 'bold'),
-            relief='raised',
-            bg='#e1e1e1',
-            borderwidth=2,
-            padx=10,
-            pady=5
-        ) 
-        clear_button.pack(side=tk.LEFT, padx=5, pady=5)
-        
-        # 使用标准tk.Button代替ttk.Button确保颜色正确显示
-        start_button = tk.Button(
-            file_actions, 
-            text="开始处理", 
-            command=self.start_conversion,
-            font=('Arial', 10, 'bold'),
-            bg='#2c6eaf',  # 确保使用鲜明的蓝色
-            fg='white',
-            relief='raised',
-            borderwidth=2,
-            padx=10,
-            pady=5
-        )
-        start_button.pack(side=tk.RIGHT, padx=5, pady=5)
-        
-        # 设置按钮悬停效果
-        start_button.bind("<Enter>", lambda e: e.widget.config(bg='#1d5a98'))
-        start_button.bind("<Leave>", lambda e: e.widget.config(bg='#2c6eaf'))
-        
-        # 进度与日志区域 - 使用Notebook标签页组织
-        notebook = ttk.Notebook(left_panel)
-        notebook.pack(fill=tk.BOTH, expand=True)
-        
-        # 进度标签页
-        progress_frame = ttk.Frame(notebook, padding=10)
-        notebook.add(progress_frame, text="处理进度")
-        
-        self.progress_var = tk.DoubleVar()
-        progress_label_frame = ttk.Frame(progress_frame)
-        progress_label_frame.pack(fill=tk.X, pady=(0, 5))
-        
-        ttk.Label(progress_label_frame, text="转码进度:").pack(side=tk.LEFT)
-        self.progress_percent = tk.StringVar(value="0%")
-        ttk.Label(progress_label_frame, textvariable=self.progress_percent, font=('Arial', 9, 'bold')).pack(side=tk.RIGHT)
-        
-        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100, style='Horizontal.TProgressbar')
-        self.progress_bar.pack(fill=tk.X, pady=(0, 8))
-        
-        self.status_var = tk.StringVar(value="准备就绪")
-        ttk.Label(progress_frame, textvariable=self.status_var).pack(anchor=tk.W, pady=(0, 10))
-        
-        # 输出预览区域
-        preview_frame = ttk.LabelFrame(progress_frame, text="输出预览")
-        preview_frame.pack(fill=tk.BOTH, expand=True)
-        
-        self.preview_text = ScrolledText(preview_frame, height=6, width=70)
-        self.preview_text.pack(fill=tk.BOTH, expand=True, pady=5)
-        self.preview_text.config(state='disabled', font=('Consolas', 9))
-        
-        # 日志标签页
-        log_frame = ttk.Frame(notebook, padding=10)
-        notebook.add(log_frame, text="处理日志")
-        
-        self.log_text = ScrolledText(log_frame, height=12, width=70)
-        self.log_text.pack(fill=tk.BOTH, expand=True)
-        self.log_text.config(state='disabled', font=('Consolas', 9))
-        
-        # ===== 右侧面板 - 设置区域 =====
-        # 基本设置框架
-        settings_frame = ttk.LabelFrame(right_panel, text="基本设置", padding=10)
-        settings_frame.pack(fill=tk.X, pady=(0, 10))
-        
-        # 输出目录设置 - 确保按钮明显
-        ttk.Label(settings_frame, text="输出目录:", foreground="#000000").pack(anchor=tk.W, pady=(0, 5))
-        
-        dir_frame = ttk.Frame(settings_frame)
-        dir_frame.pack(fill=tk.X, pady=(0, 10))
-        
-        self.output_dir_var = tk.StringVar()
-        ttk.Entry(dir_frame, textvariable=self.output_dir_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
-        # 使用tk.Button确保颜色一致
-        browse_button = tk.Button(
-            dir_frame, 
-            text="浏览", 
-            command=self.browse_output_dir,
-            font=('Arial', 9, 'bold'),
-            bg='#e1e1e1',
-            relief='raised',
-            borderwidth=2,
-            width=6
-        )
-        browse_button.pack(side=tk.RIGHT)
-        
-        # 输出格式设置
-        format_frame = ttk.Frame(settings_frame)
-        format_frame.pack(fill=tk.X, pady=(0, 5))
-        
-        ttk.Label(format_frame, text="输出格式:").pack(side=tk.LEFT)
-        self.format_var = tk.StringVar(value="mp4")
-        ttk.Combobox(format_frame, textvariable=self.format_var, values=["mp4", "mov", "avi", "mkv"], width=8, state="readonly").pack(side=tk.RIGHT)
-        
-        # 质量设置
-        quality_frame = ttk.Frame(settings_frame)
-        quality_frame.pack(fill=tk.X, pady=(0, 5))
-        
-        ttk.Label(quality_frame, text="输出质量:").pack(side=tk.LEFT)
-        self.quality_var = tk.StringVar(value="高")
-        ttk.Combobox(quality_frame, textvariable=self.quality_var, values=["低", "中", "高"], width=8, state="readonly").pack(side=tk.RIGHT)
-        
-        # 超分辨率设置框架
-        sr_frame = ttk.LabelFrame(right_panel, text="超分辨率设置", padding=10)
-        sr_frame.pack(fill=tk.X, pady=(0, 10))
-        
-        # 启用超分辨率
-        self.sr_enabled_var = tk.BooleanVar(value=False)
-        sr_check = ttk.Checkbutton(
-            sr_frame, 
-            text="启用超分辨率处理", 
-            variable=self.sr_enabled_var,
-            command=self.toggle_sr_options
-        )
-        sr_check.pack(anchor=tk.W, pady=(0, 5))
-        
-        # 超分辨率控制区
-        sr_controls = ttk.Frame(sr_frame)
-        sr_controls.pack(fill=tk.X)
-        
-        # 超分倍率
-        scale_frame = ttk.Frame(sr_controls)
-        scale_frame.pack(fill=tk.X, pady=(0, 5))
-        
-        ttk.Label(scale_frame, text="超分倍率:").pack(side=tk.LEFT)
-        self.sr_scale_var = tk.StringVar(value="2x")
-        self.sr_scale_combo = ttk.Combobox(
-            scale_frame, 
-            textvariable=self.sr_scale_var,
-            values=["1.5x", "2x", "3x", "4x"], 
-            width=8, 
-            state="disabled"
-        )
-        self.sr_scale_combo.pack(side=tk.RIGHT)
-        
-        # 超分算法
-        algorithm_frame = ttk.Frame(sr_controls)
-        algorithm_frame.pack(fill=tk.X, pady=(0, 5))
-        
-        ttk.Label(algorithm_frame, text="超分算法:").pack(side=tk.LEFT)
-        self.sr_algorithm_var = tk.StringVar(value="lanczos")
-        self.sr_algorithm_combo = ttk.Combobox(
-            algorithm_frame, 
-            textvariable=self.sr_algorithm_var,
-            values=["lanczos", "bicubic", "bilinear", "neighbor"],
-            width=8, 
-            state="disabled"
-        )
-        self.sr_algorithm_combo.pack(side=tk.RIGHT)
-        
-        # 添加警告标签
-        warning_frame = ttk.Frame(sr_frame, style='Card.TFrame')
-        warning_frame.pack(fill=tk.X, pady=(5, 0))
-        warning_frame.configure(padding=5)
-        
-        warning_label = ttk.Label(
-            warning_frame, 
-            text="⚠️ 警告: 高倍率可能导致转码失败或内存不足",
-            foreground="red",
-            font=('Arial', 8)
-        )
-        warning_label.pack(anchor=tk.W)
-        
-        # 提示框
-        tip_frame = ttk.LabelFrame(right_panel, text="使用提示", padding=10)
-        tip_frame.pack(fill=tk.X, pady=(0, 10))
-        
-        tips = [
-            "• 推荐使用1.5x-2x超分辨率获得最佳效果",
-            "• 超分辨率会显著增加处理时间和文件大小",
-            "• 如果转码失败，请尝试降低超分倍率",
-            "• 高质量转码参数适合用于最终输出",
-            "• 中低质量选项处理速度更快，文件更小"
-        ]
-        
-        for tip in tips:
-            ttk.Label(tip_frame, text=tip, wraplength=250, justify=tk.LEFT, font=('Arial', 8)).pack(anchor=tk.W, pady=1)
-        
-        # 添加关于/版本信息
-        version_frame = ttk.Frame(right_panel)
-        version_frame.pack(fill=tk.X, side=tk.BOTTOM, pady=(10, 0))
-        ttk.Label(version_frame, text="视频批量转码工具 v1.1", font=('Arial', 8), foreground='gray').pack(side=tk.LEFT)
-        
-    def setup_drag_drop(self):
-        """设置拖放功能"""
-        if TKDND_AVAILABLE:
-            try:
-                # 使用TkinterDnD库实现拖放
-                self.dnd_handler = DragDropHandler(self.root, self.drop_area, self.handle_dropped_files)
-                if self.dnd_handler.tkdnd_available:
-                    self.drop_label.config(text="拖放视频文件到此处")
-                    self.log("已启用拖放功能")
-                else:
-                    self.setup_fallback_drop()
-            except Exception as e:
-                self.log(f"设置拖放功能时出错: {str(e)}")
-                self.setup_fallback_drop()
-        else:
-            # 使用备用方法
-            self.setup_fallback_drop()
-            self.log("拖放功能未启用。如需启用，请安装TkinterDnD2库")
-    
-    def setup_fallback_drop(self):
-        """设置备用拖放方法（实际上只是绑定点击事件）"""
-        self.drop_area.config(state='normal')
-        self.drop_area.bind("<Button-1>", lambda e: self.add_files())
-        self.drop_area.config(state='disabled')
-    
-    def handle_dropped_files(self, file_paths):
-        """处理拖放的文件列表"""
-        if file_paths:
-            for file_path in file_paths:
-                if file_path not in self.video_files and self.is_video_file(file_path):
-                    self.video_files.append(file_path)
-            self.update_drop_area()
-    
-    @staticmethod
-    def is_video_file(file_path):
-        """检查文件是否为视频文件"""
-        video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.m4v', '.wmv', '.flv', '.webm']
-        _, ext = os.path.splitext(file_path.lower())
-        return ext in video_extensions
-    
-    def browse_output_dir(self):
-        directory = filedialog.askdirectory()
-        if directory:
-            self.output_dir_var.set(directory)
-            self.output_dir = directory
-    
-    def add_files(self):
-        files = filedialog.askopenfilenames(
-            title="选择视频文件",
-            filetypes=(
-                ("视频文件", "*.mp4 *.mov *.avi *.mkv *.m4v *.wmv *.flv *.webm"),
-                ("所有文件", "*.*")
-            )
-        )
-        
-        if files:
-            for file in files:
-                if file not in self.video_files:
-                    self.video_files.append(file)
-            self.update_drop_area()
-    
-    def clear_files(self):
-        self.video_files = []
-        self.update_drop_area()
-    
-    def update_drop_area(self):
-        self.drop_area.config(state='normal')
-        self.drop_area.delete(1.0, tk.END)
-        
-        for i, file in enumerate(self.video_files, 1):
-            filename = os.path.basename(file)
-            self.drop_area.insert(tk.END, f"{i}. {filename}\n")
-        
-        self.drop_area.config(state='disabled')
-        
-        # 更新文件计数
-        count = len(self.video_files)
-        self.file_count_var.set(f"{count} 个文件")
-        
-        # 更新预览窗口
-        self.update_preview()
-    
-    def update_preview(self):
-        """更新输出预览窗口"""
-        if not self.video_files:
-            return
-        
-        self.preview_text.config(state='normal')
-        self.preview_text.delete(1.0, tk.END)
-        
-        # 显示最多3个示例输出
-        samples = min(3, len(self.video_files))
-        
-        for i in range(samples):
-            filename = os.path.basename(self.video_files[i])
-            name, ext = os.path.splitext(filename)
-            output_format = self.format_var.get()
-            
-            # 如果启用了超分，展示效果
-            if self.sr_enabled_var.get():
-                name = f"{name}_SR{self.sr_scale_var.get()}"
-            
-            output_file = f"{name}_fixed.{output_format}"
-            
-            self.preview_text.insert(tk.END, f"输入: {filename}\n")
-            self.preview_text.insert(tk.END, f"输出: {output_file}\n")
-            
-            if i < samples - 1:
-                self.preview_text.insert(tk.END, f"\n")
-        
-        if len(self.video_files) > 3:
-            self.preview_text.insert(tk.END, f"...(还有 {len(self.video_files) - 3} 个文件)\n")
-        
-        self.preview_text.config(state='disabled')
-    
-    def log(self, message):
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, f"{message}\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state='disabled')
-        print(message)
-    
-    def check_ffmpeg(self):
-        """检查系统中是否安装了ffmpeg"""
-        try:
-            # 尝试查找ffmpeg
-            if os.name == 'nt':  # Windows
-                # 尝试在当前目录和PATH中查找
-                local_ffmpeg = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ffmpeg.exe')
-                if os.path.exists(local_ffmpeg):
-                    self.log(f"找到本地ffmpeg: {local_ffmpeg}")
-                    return local_ffmpeg
-                
-                # 在PATH中查找
-                result = subprocess.run(['where', 'ffmpeg'], 
-                                      stdout=subprocess.PIPE, 
-                                      stderr=subprocess.PIPE, 
-                                      text=True, 
-                                      creationflags=subprocess.CREATE_NO_WINDOW)
-                if result.returncode == 0:
-                    ffmpeg_path = result.stdout.strip().split('\n')[0]
-                    self.log(f"找到系统ffmpeg: {ffmpeg_path}")
-                    return ffmpeg_path
-            else:  # Linux/Mac
-                result = subprocess.run(['which', 'ffmpeg'], 
-                                      stdout=subprocess.PIPE, 
-                                      stderr=subprocess.PIPE, 
-                                      text=True)
-                if result.returncode == 0:
-                    ffmpeg_path = result.stdout.strip()
-                    self.log(f"找到系统ffmpeg: {ffmpeg_path}")
-                    return ffmpeg_path
-            
-            # 如果没有找到ffmpeg，显示警告并提供下载链接
-            messagebox.showwarning(
-                "未找到FFmpeg", 
-                "在系统中未找到FFmpeg。请下载并安装FFmpeg，或将它放在程序同目录下。\n"
-                "FFmpeg下载链接: https://ffmpeg.org/download.html"
-            )
-            return None
-        except Exception as e:
-            self.log(f"检查ffmpeg出错: {str(e)}")
-            return None
-    
-    def get_ffmpeg_params(self):
-        """根据质量设置返回ffmpeg参数"""
-        quality = self.quality_var.get()
-        
-        if quality == "高":
-            return ["-c:v", "libx264", "-preset", "slow", "-crf", "18", "-c:a", "aac", "-b:a", "192k"]
-        elif quality == "中":
-            return ["-c:v", "libx264", "-preset", "medium", "-crf", "23", "-c:a", "aac", "-b:a", "128k"]
-        else:  # 低
-            return ["-c:v", "libx264", "-preset", "fast", "-crf", "28", "-c:a", "aac", "-b:a", "96k"]
-    
-    def get_sr_params(self):
-        """获取超分辨率参数"""
-        if not self.sr_enabled_var.get():
-            return []
-        
-        # 解析超分倍率
-        scale_str = self.sr_scale_var.get().replace('x', '')
-        try:
-            scale = float(scale_str)
-        except ValueError:
-            scale = 2.0  # 默认值
-        
-        # 获取视频文件信息，检查原始分辨率
-        try:
-            # 使用ffprobe获取当前处理的视频尺寸（假设只处理一个文件）
-            if len(self.video_files) > 0:
-                input_file = self.video_files[0]  # 使用第一个文件作为检查对象
-                cmd = [
-                    self.ffmpeg_path.replace("ffmpeg", "ffprobe") if "ffmpeg" in self.ffmpeg_path else self.ffmpeg_path,
-                    "-v", "error",
-                    "-select_streams", "v:0",
-                    "-show_entries", "stream=width,height",
-                    "-of", "csv=p=0",
-                    input_file
-                ]
-                
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-                )
-                
-                if result.returncode == 0 and result.stdout.strip():
-                    width, height = map(int, result.stdout.strip().split(','))
-                    
-                    # 检查超分后的分辨率是否过大
-                    target_width = int(width * scale)
-                    target_height = int(height * scale)
-                    
-                    # 计算所需内存（估算值，假设YUV420格式，每像素1.5字节，30fps，5秒缓冲）
-                    est_memory_mb = (target_width * target_height * 1.5 * 30 * 5) / (1024 * 1024)
-                    
-                    # 如果估计内存使用超过2GB或分辨率超过4K，发出警告并降低超分倍率
-                    if est_memory_mb > 2048 or target_width > 3840 or target_height > 2160:
-                        original_scale = scale
-                        # 降低超分倍率至安全值
-                        max_scale = min(3840 / width, 2160 / height, 2.0)
-                        scale = min(scale, max_scale)
-                        
-                        # 记录警告日志
-                        self.log(f"警告: 源视频分辨率{width}x{height}，应用{original_scale}x超分后分辨率过大")
-                        self.log(f"自动调整超分倍率为{scale:.1f}x以确保稳定性")
-                        
-                        # 更新UI显示
-                        self.sr_scale_var.set(f"{scale:.1f}x")
-        except Exception as e:
-            self.log(f"分辨率检查错误: {str(e)}")
-        
-        # 获取超分算法
-        algorithm = self.sr_algorithm_var.get()
-        
-        # 附加线程限制以避免内存溢出
-        threads_param = ["-threads", "4"]  # 限制使用的线程数
-        
-        # 计算新的宽度和高度 (在ffmpeg中使用过滤器进行计算)
-        filter_complex = f"scale=iw*{scale}:ih*{scale}:flags={algorithm}"
-        
-        return threads_param + ["-filter_complex", filter_complex]
-
-    def toggle_sr_options(self):
-        """启用或禁用超分选项"""
-        state = "readonly" if self.sr_enabled_var.get() else "disabled"
-        self.sr_scale_combo.config(state=state)
-        self.sr_algorithm_combo.config(state=state)
-        
-        # 更新预览
-        self.update_preview()
-
-    def fix_iphone_video(self, input_file, output_file):
-        """修复iPhone绿屏视频并转码到指定格式，可选超分辨率处理"""
-        if not self.ffmpeg_path:
-            self.log("错误: 未找到FFmpeg，无法进行转码")
-            return False
-        
-        try:
-            # 获取质量设置的参数
-            quality_params = self.get_ffmpeg_params()
-            
-            # 获取超分辨率参数(如果启用)
-            sr_params = self.get_sr_params() if self.sr_enabled_var.get() else []
-            
-            # 指定内存使用限制
-            memory_params = []
-            if self.sr_enabled_var.get():
-                # 当使用超分辨率时，设置较低的缓冲大小，避免内存溢出
-                memory_params = [
-                    "-max_muxing_queue_size", "1024",  # 减少多路复用队列大小
-                ]
-            
-            # 构建FFmpeg命令
-            cmd = [
-                self.ffmpeg_path,
-                "-i", input_file,
-                "-pix_fmt", "yuv420p",  # 修复绿屏问题
-            ]
-            
-            # 添加内存参数(如果需要)
-            cmd.extend(memory_params)
-            
-            # 添加超分辨率参数(如果有)
-            if sr_params:
-                cmd.extend(sr_params)
-            
-            # 添加质量参数和输出文件
-            cmd.extend(quality_params)
-            cmd.extend([
-                "-y",  # 自动覆盖输出文件
-                output_file
-            ])
-            
-            self.log(f"执行命令: {' '.join(cmd)}")
-            
-            # 创建子进程并捕获输出
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            )
-            
-            # 读取输出
-            for line in iter(process.stdout.readline, ''):
-                if not line:
-                    break
-                # 在日志中记录进度信息（可选择性过滤掉一些信息）
-                if "frame=" in line or "speed=" in line:
-                    self.status_var.set(line.strip())
-                else:
-                    self.log(line.strip())
-            
-            # 等待进程完成
-            process.stdout.close()
-            return_code = process.wait()
-            
-            if return_code == 0:
-                self.log(f"成功转码: {os.path.basename(input_file)}")
-                if self.sr_enabled_var.get():
-                    self.log(f"应用了{self.sr_scale_var.get()}超分辨率，算法: {self.sr_algorithm_var.get()}")
-                return True
-            elif return_code == 3221225477 and self.sr_enabled_var.get():
-                # 这是Windows中的内存访问错误（0xC0000005）
-                self.log(f"转码失败: 可能是因为内存不足导致FFmpeg崩溃")
-                self.log(f"建议: 请尝试使用较低的超分辨率倍率（1.5x或2x）")
-                return False
-            else:
-                self.log(f"转码失败: {os.path.basename(input_file)}, 返回代码: {return_code}")
-                return False
-                
-        except Exception as e:
-            self.log(f"转码错误: {str(e)}")
-            return False
-
-    def start_conversion(self):
-        if not self.video_files:
-            messagebox.showinfo("提示", "请先添加视频文件")
-            return
-        
-        if not self.ffmpeg_path:
-            messagebox.showerror("错误", "未找到FFmpeg，无法进行转码")
-            return
-        
-        # 禁用所有按钮，防止重复点击 - 递归查找所有按钮
-        def disable_buttons(parent):
-            for widget in parent.winfo_children():
-                if isinstance(widget, tk.Button):
-                    widget.config(state='disabled')
-                # 递归检查子框架
-                if widget.winfo_children():
-                    disable_buttons(widget)
-        
-        disable_buttons(self.root)
-        
-        # 创建输出目录（如果不存在）
-        if not os.path.exists(self.output_dir):
-            try:
-                os.makedirs(self.output_dir)
-            except Exception as e:
-                messagebox.showerror("错误", f"创建输出目录失败: {str(e)}")
-                
-                # 重新启用所有按钮
-                def enable_buttons(parent):
-                    for widget in parent.winfo_children():
-                        if isinstance(widget, tk.Button):
-                            widget.config(state='normal')
-                        # 递归检查子框架
-                        if widget.winfo_children():
-                            enable_buttons(widget)
-                
-                enable_buttons(self.root)
-                return
-        
-        # 在新线程中执行转码，避免阻塞UI
-        threading.Thread(target=self.conversion_thread, daemon=True).start()
-    
-    def conversion_thread(self):
-        try:
-            total_files = len(self.video_files)
-            successful_count = 0
-            
-            for i, input_file in enumerate(self.video_files):
-                # 更新进度
-                progress_percent = (i / total_files) * 100
-                self.progress_var.set(progress_percent)
-                self.progress_percent.set(f"{int(progress_percent)}%")
-                self.status_var.set(f"正在处理 {i+1}/{total_files}: {os.path.basename(input_file)}")
-                
-                # 确定输出文件名
-                filename = os.path.basename(input_file)
-                name, _ = os.path.splitext(filename)
-                output_format = self.format_var.get()
-                
-                # 如果启用了超分，在文件名中添加标记
-                if self.sr_enabled_var.get():
-                    name = f"{name}_SR{self.sr_scale_var.get()}"
-                
-                output_file = os.path.join(self.output_dir, f"{name}_fixed.{output_format}")
-                
-                # 执行转码
-                self.log(f"开始处理: {filename} -> {os.path.basename(output_file)}")
-                success = self.fix_iphone_video(input_file, output_file)
-                
-                if success:
-                    successful_count += 1
-            
-            # 完成转码
-            self.progress_var.set(100)
-            self.progress_percent.set("100%")
-            self.status_var.set(f"转码完成: {successful_count}/{total_files} 个文件成功转码")
-            messagebox.showinfo("完成", f"转码完成\n成功: {successful_count}/{total_files}")
-            
-        except Exception as e:
-            self.log(f"转码过程中发生错误: {str(e)}")
-            messagebox.showerror("错误", f"转码过程中发生错误: {str(e)}")
-        
-        finally:
-            # 重新启用所有按钮
-            def enable_buttons(parent):
-                for widget in parent.winfo_children():
-                    if isinstance(widget, tk.Button):
-                        widget.config(state='normal')
-                    # 递归检查子框架
-                    if widget.winfo_children():
-                        enable_buttons(widget)
-            
-            enable_buttons(self.root)
-
-def main():
-    # 尝试使用TkinterDnD初始化窗口
-    try:
-        from tkinterdnd2 import TkinterDnD
-        print("使用TkinterDnD初始化窗口")
-        root = TkinterDnD.Tk()
-    except ImportError:
-        print("未找到TkinterDnD库，使用标准Tk")
-        root = tk.Tk()
-    
-    app = VideoConverter(root)
-    root.mainloop()
-
-if __name__ == "__main__":
-    main() 
\ No newline at end of file
+import os
+import sys
+import threading
+
+# 尽早开始计时，包括导入tkinter和各模块的时间
+from startup_trace import StartupTrace
+
+import tkinter as tk
+from tkinter import filedialog, ttk, messagebox
+from tkinter.scrolledtext import ScrolledText
+
+from autotune import parse_deadline
+from converter_engine import (
+    ConversionSettings, ConverterEngine, find_ffmpeg, ffprobe_path_for, is_video_file,
+    OUTPUT_FORMATS, QUALITY_LEVELS, SR_SCALES, SR_ALGORITHMS,
+)
+from file_list_view import VirtualFileList
+from job_journal import JobJournal
+from job_scheduler import CAN_SUSPEND, URGENT_PRIORITY
+from ffmpeg_caps import load_capabilities
+from file_scanner import FileSet, scan_paths
+from probe_cache import ProbeCache, probe_files
+from progress import format_eta
+from renditions import parse_renditions
+from telemetry import TelemetrySink
+from thumbnails import SHEET_LAYOUT, STRIP_LAYOUT, ThumbnailService
+from ui_events import UiEventBus, create_file_logger
+from stream_planner import plan_streams
+
+# 启用分段并行编码时，达到该时长（秒）的文件才分段
+SEGMENT_MIN_DURATION = 600
+
+# 日志窗口最多保留的行数，更早的日志只保存在日志文件中
+MAX_LOG_LINES = 2000
+
+# 预览窗格缓存的缩略图图片数上限
+MAX_THUMBNAIL_IMAGES = 60
+
+# 界面中的调度顺序选项
+JOB_ORDER_LABELS = {
+    "耗时长的优先": "longest",
+    "耗时短的优先": "shortest",
+    "按添加顺序": "input",
+}
+
+class VideoConverter:
+    def __init__(self, root, trace=None):
+        self.root = root
+        self.trace = trace or StartupTrace()
+        
+        # 工作线程通过事件总线更新界面，完整日志写入滚动日志文件
+        self.events = UiEventBus(root)
+        self.file_logger, self.log_file_path = create_file_logger()
+        self.root.title("视频批量转码工具")
+        self.root.geometry("900x650")  # 增加窗口尺寸
+        self.root.resizable(True, True)
+        
+        # 设置窗口图标（如果可用）
+        try:
+            icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icon.ico")
+            if os.path.exists(icon_path):
+                self.root.iconbitmap(icon_path)
+        except:
+            pass
+        
+        # 设置应用风格主题
+        with self.trace.phase("构建界面"):
+            self.setup_styles()
+            self.setup_ui()
+        self.video_files = FileSet()
+        self.scanning = 0  # 正在后台扫描的拖放批次数
+        self.sample_results = {}  # 输入文件 -> 样本预览摘要
+        self.engine = None  # 正在运行的批次的转码引擎，用于暂停、取消和调整优先级
+        self.paused = False
+        
+        # 文件元数据在添加文件时于后台探测，转码时直接使用
+        self.metadata = {}
+        
+        # 初始化输出目录为 "converted_videos" 子文件夹（在后台创建）
+        self.output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "converted_videos")
+        self.output_dir_var.set(self.output_dir)
+        
+        # ffmpeg、元数据缓存和任务日志在后台初始化，窗口先显示出来；
+        # 任务日志记录每个文件的状态，程序意外退出后可以恢复未完成的批次
+        self.ffmpeg_path = None
+        self.probe_cache = None
+        self.journal = None
+        self.telemetry = None
+        self.thumbnails = None  # 关键帧缩略图，只为滚动到视野中的文件生成
+        self.thumbnail_images = {}  # PNG路径 -> PhotoImage，预览窗格中的图片需要保持引用
+        self.resume_batch = None
+        self.ready = threading.Event()
+        self.window_shown = False
+        self.startup_steps = 2  # 窗口显示和后台初始化都完成后汇总启动耗时
+        
+        # 开始在主循环中处理工作线程投递的事件
+        self.events.start(log_handler=self.append_log_lines)
+        threading.Thread(target=self.background_init, daemon=True).start()
+        
+        # 窗口显示后再加载拖放支持（Tcl扩展只能在主线程中加载）
+        self.root.bind("<Map>", self.on_window_shown)
+        self.root.after(1000, self.on_window_shown)
+    
+    def on_window_shown(self, event=None):
+        if self.window_shown or (event is not None and event.widget is not self.root):
+            return
+        self.window_shown = True
+        self.root.unbind("<Map>")
+        self.trace.mark("窗口显示")
+        self.root.after_idle(self.finish_window)
+    
+    def finish_window(self):
+        self.setup_drag_drop()
+        self.report_startup()
+    
+    def report_startup(self):
+        self.startup_steps -= 1
+        if self.startup_steps == 0:
+            self.log(self.trace.summary())
+    
+    def background_init(self):
+        """在后台查找ffmpeg、加载元数据缓存、创建输出目录并打开任务日志"""
+        resume = None
+        try:
+            with self.trace.phase("查找FFmpeg"):
+                self.ffmpeg_path = find_ffmpeg(log=self.log)
+            if not self.ffmpeg_path:
+                self.events.call(self.warn_missing_ffmpeg)
+            
+            with self.trace.phase("元数据缓存"):
+                self.probe_cache = ProbeCache()
+            if self.ffmpeg_path:
+                self.thumbnails = ThumbnailService(self.ffmpeg_path, self.probe_cache,
+                                                   on_ready=self.on_thumbnail_ready)
+            
+            with self.trace.phase("输出目录"):
+                try:
+                    os.makedirs(self.output_dir, exist_ok=True)
+                except OSError as e:
+                    self.log(f"创建输出目录失败: {str(e)}")
+            
+            with self.trace.phase("任务日志"):
+                try:
+                    self.journal = JobJournal()
+                    resume = self.journal.unfinished_batch()
+                except Exception as e:
+                    self.journal = None
+                    self.log(f"无法打开任务日志，中断后将无法恢复: {str(e)}")
+            
+            try:
+                self.telemetry = TelemetrySink()
+            except OSError as e:
+                self.log(f"无法创建性能记录目录: {str(e)}")
+        except Exception as e:
+            self.log(f"初始化出错: {str(e)}")
+        finally:
+            self.ready.set()
+            self.events.call(self.finish_startup, resume)
+        
+        # 首次使用某个ffmpeg时探测其能力，结果缓存到磁盘，开始转码时不再等待（不计入启动时间）
+        if self.ffmpeg_path:
+            load_capabilities(self.ffmpeg_path, log=self.log)
+    
+    def finish_startup(self, resume):
+        """后台初始化完成后在主线程中调用"""
+        self.trace.mark("初始化完成")
+        self.report_startup()
+        # 初始化完成前添加的文件此时才能探测
+        self.start_probe()
+        if resume:
+            self.offer_resume(resume)
+    
+    def offer_resume(self, resume):
+        """启动时发现被中断的批次，询问是否继续"""
+        batch_id, settings, pending = resume
+        if messagebox.askyesno("恢复批次", f"上次的批量转码被中断，还有 {len(pending)} 个文件未完成。\n是否继续转码这些文件？"):
+            self.resume_batch = (batch_id, ConversionSettings.from_dict(settings))
+            self.video_files.clear()
+            self.video_files.add_many(pending)
+            self.update_drop_area()
+            self.start_probe()
+            self.start_conversion()
+        else:
+            self.journal.discard_batch(batch_id)
+
+    def setup_styles(self):
+        """设置应用程序的视觉风格"""
+        style = ttk.Style()
+        
+        # 尝试设置更现代的主题
+        available_themes = style.theme_names()
+        preferred_themes = ['vista', 'clam', 'winnative', 'default']
+        
+        for theme in preferred_themes:
+            if theme in available_themes:
+                style.theme_use(theme)
+                break
+        
+        # 定制组件样式 - 确保可见性
+        bg_color = "#f0f0f0"
+        button_bg = "#d0d0d0"
+        accent_color = "#2c6eaf"
+        text_color = "#000000"
+        
+        # 确保组件样式清晰可见
+        style.configure('TLabelframe', padding=8, relief='solid', borderwidth=1, background=bg_color)
+        style.configure('TLabelframe.Label', font=('Arial', 10, 'bold'), foreground=text_color, background=bg_color)
+        style.configure('TFrame', background=bg_color)
+        style.configure('TLabel', font=('Arial', 9), foreground=text_color, background=bg_color)
+        
+        # 使按钮更加醒目
+        style.configure('TButton', 
+                        font=('Arial', 9, 'bold'), 
+                        foreground=text_color,
+                        padding=8, 
+                        background=button_bg, 
+                        relief='raised',
+                        borderwidth=2)
+        
+        # 鼠标悬停效果
+        style.map('TButton',
+                  foreground=[('active', text_color)],
+                  background=[('active', button_bg)],
+                  relief=[('pressed', 'sunken')])
+                 
+        # 主要操作按钮
+        style.configure('Accent.TButton', 
+                        background=accent_color, 
+                        foreground='white',
+                        padding=8,
+                        font=('Arial', 10, 'bold'))
+        
+        # 鼠标悬停效果 (主要按钮)
+        style.map('Accent.TButton',
+                  background=[('active', '#1d5a98')],
+                  foreground=[('active', 'white')])
+        
+        style.configure('TCheckbutton', font=('Arial', 9), foreground=text_color, background=bg_color)
+        style.configure('TCombobox', padding=2)
+        style.configure('Horizontal.TProgressbar', background=accent_color)
+        
+        # 确保ScrolledText也有好的可读性
+        self.root.option_add("*Text.Background", "#ffffff")
+        self.root.option_add("*Text.Foreground", "#000000")
+        
+        # 区域边框颜色
+        style.configure('Card.TFrame', background="#ffffff", relief="solid", borderwidth=1)
+    
+    def setup_ui(self):
+        # 创建主框架，使用两列布局
+        main_frame = ttk.Frame(self.root, padding=10)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 创建左右布局
+        left_panel = ttk.Frame(main_frame)
+        left_panel.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        
+        right_panel = ttk.Frame(main_frame)
+        right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=False, padx=(5, 0), ipadx=5)
+        right_panel.configure(width=280)  # 固定右侧面板宽度
+        
+        # ===== 左侧面板 =====
+        # 顶部信息区域 - 使用鲜明的背景色
+        info_frame = ttk.Frame(left_panel, style='Card.TFrame')
+        info_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        # 使标题更加突出
+        info_label = ttk.Label(
+            info_frame, 
+            text="视频批量转码与超分辨率工具",
+            font=('Arial', 12, 'bold'),
+            foreground="#2c6eaf",
+            padding=8
+        )
+        info_label.pack(anchor=tk.W)
+        
+        # 增强描述文本对比度
+        desc_label = ttk.Label(
+            info_frame, 
+            text="此工具可以修复iPhone录制的绿屏视频，并支持批量转码与超分辨率处理",
+            foreground="#000000",
+            background="#ffffff",
+            padding=(8, 0, 8, 8),
+            wraplength=550
+        )
+        desc_label.pack(anchor=tk.W)
+        
+        # 创建拖放区域
+        drop_frame = ttk.LabelFrame(left_panel, text="文件列表", padding=8)
+        drop_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        
+        # 添加一个文件操作工具栏
+        file_toolbar = ttk.Frame(drop_frame)
+        file_toolbar.pack(fill=tk.X, pady=(0, 5))
+        
+        self.drop_label = ttk.Label(file_toolbar, text="拖放视频文件到此处或使用下方按钮添加文件")
+        self.drop_label.pack(side=tk.LEFT)
+        
+        # 添加文件数量指示器
+        self.file_count_var = tk.StringVar(value="0 个文件")
+        ttk.Label(file_toolbar, textvariable=self.file_count_var).pack(side=tk.RIGHT)
+        
+        # 拖放区：只绘制可见行，大量文件时保持响应
+        self.file_list = VirtualFileList(drop_frame, on_visible=self.on_rows_visible,
+                                         on_select=lambda item: self.update_preview())
+        self.file_list.pack(fill=tk.BOTH, expand=True)
+        self.drop_area = self.file_list.canvas
+        
+        # 文件操作按钮行 - 增加padding确保按钮可见
+        file_actions = ttk.Frame(drop_frame)
+        file_actions.pack(fill=tk.X, pady=(5, 0))
+        
+        # 给按钮添加更明显的样式和间距 - 使用标准tk.Button提高兼容性
+        add_button = tk.Button(
+            file_actions, 
+            text="添加文件", 
+            command=self.add_files,
+            font=('Arial', 9, 'bold'),
+            relief='raised',
+            bg='#e1e1e1',
+            borderwidth=2,
+            padx=10,
+            pady=5
+        )
+        add_button.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        add_folder_button = tk.Button(
+            file_actions, 
+            text="添加文件夹", 
+            command=self.add_folder,
+            font=('Arial', 9, 'bold'),
+            relief='raised',
+            bg='#e1e1e1',
+            borderwidth=2,
+            padx=10,
+            pady=5
+        )
+        add_folder_button.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        clear_button = tk.Button(
+            file_actions, 
+            text="清空列表", 
+            command=self.clear_files,
+            font=('Arial', 9, 'bold'),
+            relief='raised',
+            bg='#e1e1e1',
+            borderwidth=2,
+            padx=10,
+            pady=5
+        ) 
+        clear_button.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # 使用标准tk.Button代替ttk.Button确保颜色正确显示
+        start_button = tk.Button(
+            file_actions, 
+            text="开始处理", 
+            command=self.start_conversion,
+            font=('Arial', 10, 'bold'),
+            bg='#2c6eaf',  # 确保使用鲜明的蓝色
+            fg='white',
+            relief='raised',
+            borderwidth=2,
+            padx=10,
+            pady=5
+        )
+        start_button.pack(side=tk.RIGHT, padx=5, pady=5)
+        
+        # 设置按钮悬停效果
+        start_button.bind("<Enter>", lambda e: e.widget.config(bg='#1d5a98'))
+        start_button.bind("<Leave>", lambda e: e.widget.config(bg='#2c6eaf'))
+        
+        # 样本预览按钮：只编码几段短片段，估算整个文件的耗时和大小
+        sample_button = tk.Button(
+            file_actions, 
+            text="样本预览", 
+            command=self.start_sample_preview,
+            font=('Arial', 9, 'bold'),
+            relief='raised',
+            bg='#e1e1e1',
+            borderwidth=2,
+            padx=10,
+            pady=5
+        )
+        sample_button.pack(side=tk.RIGHT, padx=5, pady=5)
+        
+        # 批次控制按钮行：只在转码期间可用，不受 set_buttons_state 影响
+        batch_actions = ttk.Frame(drop_frame)
+        batch_actions.pack(fill=tk.X)
+        
+        self.pause_button = tk.Button(batch_actions, text="暂停", command=self.toggle_pause)
+        self.pause_button.pack(side=tk.LEFT, padx=5, pady=(0, 5))
+        if not CAN_SUSPEND:
+            self.pause_button.pack_forget()  # Windows上无法挂起ffmpeg进程
+        urgent_button = tk.Button(batch_actions, text="优先处理所选", command=self.prioritize_selected)
+        urgent_button.pack(side=tk.LEFT, padx=5, pady=(0, 5))
+        cancel_button = tk.Button(batch_actions, text="取消所选", command=self.cancel_selected)
+        cancel_button.pack(side=tk.LEFT, padx=5, pady=(0, 5))
+        cancel_all_button = tk.Button(batch_actions, text="取消全部", command=self.cancel_all)
+        cancel_all_button.pack(side=tk.LEFT, padx=5, pady=(0, 5))
+        self.batch_buttons = [self.pause_button, urgent_button, cancel_button, cancel_all_button]
+        self.set_batch_controls('disabled')
+        
+        # 进度与日志区域 - 使用Notebook标签页组织
+        notebook = ttk.Notebook(left_panel)
+        notebook.pack(fill=tk.BOTH, expand=True)
+        
+        # 进度标签页
+        progress_frame = ttk.Frame(notebook, padding=10)
+        notebook.add(progress_frame, text="处理进度")
+        
+        self.progress_var = tk.DoubleVar()
+        progress_label_frame = ttk.Frame(progress_frame)
+        progress_label_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(progress_label_frame, text="转码进度:").pack(side=tk.LEFT)
+        self.progress_percent = tk.StringVar(value="0%")
+        ttk.Label(progress_label_frame, textvariable=self.progress_percent, font=('Arial', 9, 'bold')).pack(side=tk.RIGHT)
+        
+        self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100, style='Horizontal.TProgressbar')
+        self.progress_bar.pack(fill=tk.X, pady=(0, 8))
+        
+        self.status_var = tk.StringVar(value="准备就绪")
+        ttk.Label(progress_frame, textvariable=self.status_var).pack(anchor=tk.W, pady=(0, 10))
+        
+        # 输出预览区域
+        preview_frame = ttk.LabelFrame(progress_frame, text="输出预览")
+        preview_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.preview_text = ScrolledText(preview_frame, height=6, width=70)
+        self.preview_text.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.preview_text.config(state='disabled', font=('Consolas', 9))
+        
+        # 日志标签页
+        log_frame = ttk.Frame(notebook, padding=10)
+        notebook.add(log_frame, text="处理日志")
+        
+        self.log_text = ScrolledText(log_frame, height=12, width=70)
+        self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.log_text.config(state='disabled', font=('Consolas', 9))
+        
+        # ===== 右侧面板 - 设置区域 =====
+        # 基本设置框架
+        settings_frame = ttk.LabelFrame(right_panel, text="基本设置", padding=10)
+        settings_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        # 输出目录设置 - 确保按钮明显
+        ttk.Label(settings_frame, text="输出目录:", foreground="#000000").pack(anchor=tk.W, pady=(0, 5))
+        
+        dir_frame = ttk.Frame(settings_frame)
+        dir_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.output_dir_var = tk.StringVar()
+        ttk.Entry(dir_frame, textvariable=self.output_dir_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+        # 使用tk.Button确保颜色一致
+        browse_button = tk.Button(
+            dir_frame, 
+            text="浏览", 
+            command=self.browse_output_dir,
+            font=('Arial', 9, 'bold'),
+            bg='#e1e1e1',
+            relief='raised',
+            borderwidth=2,
+            width=6
+        )
+        browse_button.pack(side=tk.RIGHT)
+        
+        # 输出格式设置
+        format_frame = ttk.Frame(settings_frame)
+        format_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(format_frame, text="输出格式:").pack(side=tk.LEFT)
+        self.format_var = tk.StringVar(value="mp4")
+        ttk.Combobox(format_frame, textvariable=self.format_var, values=OUTPUT_FORMATS, width=8, state="readonly").pack(side=tk.RIGHT)
+        
+        # 质量设置
+        quality_frame = ttk.Frame(settings_frame)
+        quality_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(quality_frame, text="输出质量:").pack(side=tk.LEFT)
+        self.quality_var = tk.StringVar(value="高")
+        ttk.Combobox(quality_frame, textvariable=self.quality_var, values=QUALITY_LEVELS, width=8, state="readonly").pack(side=tk.RIGHT)
+        
+        # 多路输出：一次解码同时输出多个版本，例如 "1x:高:mp4, 2x:中:mkv"
+        renditions_frame = ttk.Frame(settings_frame)
+        renditions_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(renditions_frame, text="多路输出:").pack(side=tk.LEFT)
+        self.renditions_var = tk.StringVar(value="")
+        ttk.Entry(renditions_frame, textvariable=self.renditions_var, width=18).pack(side=tk.RIGHT)
+        
+        # 跳过已是最新的输出
+        self.skip_up_to_date_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(settings_frame, text="跳过未变化的文件", variable=self.skip_up_to_date_var).pack(anchor=tk.W, pady=(0, 5))
+        
+        # 已符合要求的流直接复制
+        self.stream_copy_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(settings_frame, text="可直接复制的流不重新编码", variable=self.stream_copy_var, command=self.update_preview).pack(anchor=tk.W, pady=(0, 5))
+        
+        # 大文件分段并行编码
+        self.segment_enabled_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="长视频分段并行编码(10分钟以上)", variable=self.segment_enabled_var).pack(anchor=tk.W, pady=(0, 5))
+        
+        # 并发任务数设置
+        jobs_frame = ttk.Frame(settings_frame)
+        jobs_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(jobs_frame, text="并行任务:").pack(side=tk.LEFT)
+        self.jobs_var = tk.StringVar(value="自动")
+        ttk.Combobox(jobs_frame, textvariable=self.jobs_var, values=["自动", "1", "2", "4", "8", "16"], width=8, state="readonly").pack(side=tk.RIGHT)
+        
+        # 调度顺序设置
+        order_frame = ttk.Frame(settings_frame)
+        order_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(order_frame, text="处理顺序:").pack(side=tk.LEFT)
+        self.job_order_var = tk.StringVar(value="耗时长的优先")
+        ttk.Combobox(order_frame, textvariable=self.job_order_var, values=list(JOB_ORDER_LABELS), width=12, state="readonly").pack(side=tk.RIGHT)
+        
+        # 完成时间设置，留空表示按质量等级的固定预设转码
+        deadline_frame = ttk.Frame(settings_frame)
+        deadline_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(deadline_frame, text="完成时间(HH:MM):").pack(side=tk.LEFT)
+        self.deadline_var = tk.StringVar(value="")
+        ttk.Entry(deadline_frame, textvariable=self.deadline_var, width=14).pack(side=tk.RIGHT)
+        
+        # 超分辨率设置框架
+        sr_frame = ttk.LabelFrame(right_panel, text="超分辨率设置", padding=10)
+        sr_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        # 启用超分辨率
+        self.sr_enabled_var = tk.BooleanVar(value=False)
+        sr_check = ttk.Checkbutton(
+            sr_frame, 
+            text="启用超分辨率处理", 
+            variable=self.sr_enabled_var,
+            command=self.toggle_sr_options
+        )
+        sr_check.pack(anchor=tk.W, pady=(0, 5))
+        
+        # 超分辨率控制区
+        sr_controls = ttk.Frame(sr_frame)
+        sr_controls.pack(fill=tk.X)
+        
+        # 超分倍率
+        scale_frame = ttk.Frame(sr_controls)
+        scale_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(scale_frame, text="超分倍率:").pack(side=tk.LEFT)
+        self.sr_scale_var = tk.StringVar(value="2x")
+        self.sr_scale_combo = ttk.Combobox(
+            scale_frame, 
+            textvariable=self.sr_scale_var,
+            values=SR_SCALES, 
+            width=8, 
+            state="disabled"
+        )
+        self.sr_scale_combo.pack(side=tk.RIGHT)
+        
+        # 超分算法
+        algorithm_frame = ttk.Frame(sr_controls)
+        algorithm_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(algorithm_frame, text="超分算法:").pack(side=tk.LEFT)
+        self.sr_algorithm_var = tk.StringVar(value="lanczos")
+        self.sr_algorithm_combo = ttk.Combobox(
+            algorithm_frame, 
+            textvariable=self.sr_algorithm_var,
+            values=SR_ALGORITHMS,
+            width=8, 
+            state="disabled"
+        )
+        self.sr_algorithm_combo.pack(side=tk.RIGHT)
+        
+        # 添加警告标签
+        warning_frame = ttk.Frame(sr_frame, style='Card.TFrame')
+        warning_frame.pack(fill=tk.X, pady=(5, 0))
+        warning_frame.configure(padding=5)
+        
+        warning_label = ttk.Label(
+            warning_frame, 
+            text="⚠️ 警告: 高倍率可能导致转码失败或内存不足",
+            foreground="red",
+            font=('Arial', 8)
+        )
+        warning_label.pack(anchor=tk.W)
+        
+        # 提示框
+        tip_frame = ttk.LabelFrame(right_panel, text="使用提示", padding=10)
+        tip_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        tips = [
+            "• 推荐使用1.5x-2x超分辨率获得最佳效果",
+            "• 超分辨率会显著增加处理时间和文件大小",
+            "• 如果转码失败，请尝试降低超分倍率",
+            "• 高质量转码参数适合用于最终输出",
+            "• 中低质量选项处理速度更快，文件更小"
+        ]
+        
+        for tip in tips:
+            ttk.Label(tip_frame, text=tip, wraplength=250, justify=tk.LEFT, font=('Arial', 8)).pack(anchor=tk.W, pady=1)
+        
+        # 添加关于/版本信息
+        version_frame = ttk.Frame(right_panel)
+        version_frame.pack(fill=tk.X, side=tk.BOTTOM, pady=(10, 0))
+        ttk.Label(version_frame, text="视频批量转码工具 v1.1", font=('Arial', 8), foreground='gray').pack(side=tk.LEFT)
+        
+    def setup_drag_drop(self):
+        """设置拖放功能（窗口显示后才导入TkinterDnD2，不拖慢启动）"""
+        with self.trace.phase("拖放"):
+            try:
+                from tkdnd_handler import DragDropHandler
+                # 使用TkinterDnD库实现拖放
+                self.dnd_handler = DragDropHandler(self.root, self.drop_area, self.handle_dropped_files)
+                if self.dnd_handler.tkdnd_available:
+                    self.drop_label.config(text="拖放视频文件、文件夹或文件清单到此处")
+                    self.log("已启用拖放功能")
+                else:
+                    # 使用备用方法
+                    self.setup_fallback_drop()
+                    self.log("拖放功能未启用。如需启用，请安装TkinterDnD2库")
+            except Exception as e:
+                self.log(f"设置拖放功能时出错: {str(e)}")
+                self.setup_fallback_drop()
+    
+    def setup_fallback_drop(self):
+        """设置备用拖放方法（实际上只是绑定双击事件，单击用于选中文件）"""
+        self.drop_area.bind("<Double-Button-1>", lambda e: self.add_files())
+    
+    def handle_dropped_files(self, file_paths):
+        """处理拖放的文件、目录和文件清单，在后台递归扫描并分块加入列表"""
+        if not file_paths:
+            return
+        self.scanning += 1
+        self.update_drop_area()
+        
+        def scan_thread():
+            try:
+                on_error = lambda path, e: self.log(f"无法读取文件清单 {os.path.basename(path)}: {str(e)}")
+                for chunk in scan_paths(file_paths, self.is_video_file, on_error=on_error):
+                    self.events.call(self.add_scanned_files, chunk)
+            finally:
+                self.events.call(self.finish_scan)
+        
+        threading.Thread(target=scan_thread, daemon=True).start()
+    
+    def add_scanned_files(self, chunk):
+        """在主线程中加入一块扫描结果，列表刷新合并为定时一次"""
+        if self.video_files.add_many(chunk):
+            self.events.coalesce("file_list", self.update_drop_area)
+    
+    def finish_scan(self):
+        self.scanning -= 1
+        self.events.discard("file_list")
+        self.update_drop_area()
+        self.start_probe()
+    
+    # 视频文件过滤规则与转码引擎共用
+    is_video_file = staticmethod(is_video_file)
+    
+    def browse_output_dir(self):
+        directory = filedialog.askdirectory()
+        if directory:
+            self.output_dir_var.set(directory)
+            self.output_dir = directory
+    
+    def add_files(self):
+        files = filedialog.askopenfilenames(
+            title="选择视频文件",
+            filetypes=(
+                ("视频文件", "*.mp4 *.mov *.avi *.mkv *.m4v *.wmv *.flv *.webm"),
+                ("所有文件", "*.*")
+            )
+        )
+        
+        if files:
+            self.video_files.add_many(files)
+            self.update_drop_area()
+            self.start_probe()
+    
+    def add_folder(self):
+        """递归添加文件夹中的所有视频文件"""
+        directory = filedialog.askdirectory(title="选择包含视频的文件夹")
+        if directory:
+            self.handle_dropped_files([directory])
+    
+    def start_probe(self):
+        """在后台并行探测尚无元数据的文件"""
+        pending = [f for f in self.video_files if f not in self.metadata]
+        if not pending or not self.ready.is_set() or not self.ffmpeg_path:
+            return
+        for file in pending:
+            self.metadata[file] = None  # 标记为探测中，避免重复探测
+        
+        def probe_thread():
+            results = probe_files(pending, ffprobe_path_for(self.ffmpeg_path), self.probe_cache)
+            self.metadata.update(results)
+            failed = [f for f, meta in results.items() if meta is None]
+            self.log(f"已读取 {len(results) - len(failed)} 个文件的元数据")
+            for file in failed:
+                self.log(f"无法读取元数据: {os.path.basename(file)}")
+            # 元数据就绪后刷新预览中的处理方式，并为可见的文件生成缩略图
+            self.events.call(self.on_rows_visible)
+        
+        threading.Thread(target=probe_thread, daemon=True).start()
+    
+    def clear_files(self):
+        self.video_files.clear()
+        self.sample_results = {}
+        self.update_drop_area()
+    
+    def update_drop_area(self):
+        self.file_list.set_items(self.video_files)
+        
+        # 更新文件计数
+        count = len(self.video_files)
+        self.file_count_var.set(f"{count} 个文件（扫描中）" if self.scanning else f"{count} 个文件")
+        
+        # 更新预览窗口
+        self.update_preview()
+    
+    def update_preview(self):
+        """更新输出预览窗口"""
+        if not self.video_files:
+            return
+        
+        self.preview_text.config(state='normal')
+        self.preview_text.delete(1.0, tk.END)
+        
+        # 显示最多3个示例输出：从选中的文件（没有选中时从第一个可见的文件）开始
+        samples = self.preview_files()
+        settings = self.collect_settings()
+        selected = self.file_list.selected_item()
+        if len(self.thumbnail_images) > MAX_THUMBNAIL_IMAGES:
+            self.thumbnail_images.clear()
+        # 后请求的缩略图先生成，倒序请求使排在前面的文件先出现；选中的文件显示缩略图表
+        images = {}
+        for input_file in reversed(samples):
+            images[input_file] = self.thumbnail_image(
+                input_file, SHEET_LAYOUT if input_file == selected else STRIP_LAYOUT)
+        
+        for i, input_file in enumerate(samples):
+            filename = os.path.basename(input_file)
+            output_file = ", ".join(os.path.basename(o) for o in settings.output_files(input_file))
+            
+            # 根据元数据展示每个文件的流处理方式
+            metadata = self.metadata.get(input_file)
+            plan = plan_streams(metadata, settings).describe() if metadata else "等待读取元数据"
+            
+            self.preview_text.insert(tk.END, f"输入: {filename}\n")
+            if images[input_file]:
+                self.preview_text.image_create(tk.END, image=images[input_file])
+                self.preview_text.insert(tk.END, "\n")
+            self.preview_text.insert(tk.END, f"输出: {output_file}\n")
+            self.preview_text.insert(tk.END, f"处理: {plan}\n")
+            if input_file in self.sample_results:
+                self.preview_text.insert(tk.END, f"{self.sample_results[input_file]}\n")
+            
+            if i < len(samples) - 1:
+                self.preview_text.insert(tk.END, f"\n")
+        
+        if len(self.video_files) > len(samples):
+            self.preview_text.insert(tk.END, f"...(还有 {len(self.video_files) - len(samples)} 个文件)\n")
+        
+        self.preview_text.config(state='disabled')
+    
+    def preview_files(self):
+        """返回预览窗格中显示的文件"""
+        if self.file_list.selected is not None:
+            start = self.file_list.selected
+        else:
+            start = self.file_list.visible_range[0]
+        start = min(start, max(0, len(self.video_files) - 3))
+        return [self.video_files[i] for i in range(start, min(start + 3, len(self.video_files)))]
+    
+    def thumbnail_image(self, input_file, layout):
+        """返回文件的缩略图，尚未生成时请求在后台生成并返回None"""
+        metadata = self.metadata.get(input_file)
+        if not self.thumbnails or not metadata:
+            return None
+        path = self.thumbnails.request(input_file, metadata.get("duration"), layout)
+        if not path:
+            return None
+        image = self.thumbnail_images.get(path)
+        if image is None:
+            try:
+                image = tk.PhotoImage(file=path)
+            except tk.TclError:
+                return None
+            self.thumbnail_images[path] = image
+        return image
+    
+    def on_rows_visible(self, items=None):
+        """文件列表滚动后为可见的文件预先请求缩略图条，并刷新预览"""
+        if self.thumbnails:
+            for input_file in reversed(items if items is not None else self.file_list.visible_items()):
+                metadata = self.metadata.get(input_file)
+                if metadata:
+                    self.thumbnails.request(input_file, metadata.get("duration"), STRIP_LAYOUT)
+        self.events.coalesce("preview", self.update_preview)
+    
+    def on_thumbnail_ready(self, input_file, layout, path):
+        """缩略图生成后（在后台线程中）刷新预览"""
+        self.events.coalesce("preview", self.update_preview)
+    
+    def log(self, message):
+        """记录一行日志，可在任意线程调用"""
+        self.file_logger.info(message)
+        self.events.post_log(message)
+        print(message)
+    
+    def append_log_lines(self, lines):
+        """将一批日志写入日志窗口，超出上限时删除最早的行（在主线程中调用）"""
+        self.log_text.config(state='normal')
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        if line_count > MAX_LOG_LINES:
+            self.log_text.delete('1.0', f'{line_count - MAX_LOG_LINES + 1}.0')
+        
+        self.log_text.see(tk.END)
+        self.log_text.config(state='disabled')
+    
+    def warn_missing_ffmpeg(self):
+        """没有找到ffmpeg时显示警告并提供下载链接"""
+        messagebox.showwarning(
+            "未找到FFmpeg", 
+            "在系统中未找到FFmpeg。请下载并安装FFmpeg，或将它放在程序同目录下。\n"
+            "FFmpeg下载链接: https://ffmpeg.org/download.html"
+        )
+    
+    def collect_settings(self):
+        """从界面控件读取本次批量转码的设置"""
+        value = self.jobs_var.get()
+        return ConversionSettings(
+            output_dir=self.output_dir,
+            output_format=self.format_var.get(),
+            quality=self.quality_var.get(),
+            sr_enabled=self.sr_enabled_var.get(),
+            sr_scale=self.sr_scale_var.get(),
+            sr_algorithm=self.sr_algorithm_var.get(),
+            jobs=int(value) if value.isdigit() else None,  # "自动"表示根据核心数决定
+            skip_up_to_date=self.skip_up_to_date_var.get(),
+            allow_stream_copy=self.stream_copy_var.get(),
+            segment_min_duration=SEGMENT_MIN_DURATION if self.segment_enabled_var.get() else None,
+            job_order=JOB_ORDER_LABELS.get(self.job_order_var.get(), "longest"),
+            deadline=self.get_deadline(),
+            renditions=[r.to_dict() for r in self.get_renditions()] or None,
+        )
+    
+    def get_deadline(self):
+        """解析完成时间输入框，留空或格式错误时返回None"""
+        text = self.deadline_var.get().strip()
+        if not text:
+            return None
+        try:
+            return parse_deadline(text)
+        except ValueError:
+            return None
+    
+    def get_renditions(self):
+        """解析多路输出输入框，留空或格式错误时返回空列表"""
+        try:
+            return parse_renditions(self.renditions_var.get(), OUTPUT_FORMATS, QUALITY_LEVELS)
+        except ValueError:
+            return []
+    
+    def toggle_sr_options(self):
+        """启用或禁用超分选项"""
+        state = "readonly" if self.sr_enabled_var.get() else "disabled"
+        self.sr_scale_combo.config(state=state)
+        self.sr_algorithm_combo.config(state=state)
+        
+        # 更新预览
+        self.update_preview()
+
+    def start_conversion(self):
+        if not self.video_files:
+            messagebox.showinfo("提示", "请先添加视频文件")
+            return
+        
+        if not self.ready.is_set():
+            # 后台初始化尚未完成（通常只有几十毫秒），稍后自动重试
+            self.root.after(100, self.start_conversion)
+            return
+        
+        if not self.ffmpeg_path:
+            messagebox.showerror("错误", "未找到FFmpeg，无法进行转码")
+            return
+        
+        if self.deadline_var.get().strip() and self.get_deadline() is None:
+            messagebox.showerror("错误", "完成时间格式应为 HH:MM 或 YYYY-MM-DD HH:MM")
+            return
+        
+        try:
+            parse_renditions(self.renditions_var.get(), OUTPUT_FORMATS, QUALITY_LEVELS)
+        except ValueError as e:
+            messagebox.showerror("错误", f"{str(e)}\n多个版本用逗号分隔，例如 1x:高:mp4, 2x:中:mkv")
+            return
+        
+        # 在主线程中读取界面控件，工作线程不访问Tk变量
+        batch_id = None
+        if self.resume_batch:
+            # 恢复的批次使用中断时保存的设置
+            batch_id, settings = self.resume_batch
+            self.resume_batch = None
+            self.log("使用中断批次保存的设置继续转码")
+        else:
+            settings = self.collect_settings()
+        
+        # 禁用所有按钮，防止重复点击
+        self.set_buttons_state('disabled')
+        
+        # 创建输出目录（如果不存在）
+        if not os.path.exists(settings.output_dir):
+            try:
+                os.makedirs(settings.output_dir)
+            except Exception as e:
+                messagebox.showerror("错误", f"创建输出目录失败: {str(e)}")
+                
+                # 重新启用所有按钮
+                self.set_buttons_state('normal')
+                return
+        
+        # 在新线程中执行转码，避免阻塞UI
+        threading.Thread(target=self.conversion_thread, args=(settings, batch_id), daemon=True).start()
+    
+    def start_sample_preview(self):
+        """对列表中选中的文件（未选中时为第一个文件）编码几段样本，在预览窗口中显示估算的耗时和大小"""
+        if not self.video_files:
+            messagebox.showinfo("提示", "请先添加视频文件")
+            return
+        
+        if not self.ready.is_set():
+            # 后台初始化尚未完成（通常只有几十毫秒），稍后自动重试
+            self.root.after(100, self.start_sample_preview)
+            return
+        
+        if not self.ffmpeg_path:
+            messagebox.showerror("错误", "未找到FFmpeg，无法进行转码")
+            return
+        
+        input_file = self.file_list.selected_item()
+        if input_file is None:
+            input_file = self.video_files[0]
+        settings = self.collect_settings()
+        self.set_buttons_state('disabled')
+        self.status_var.set(f"正在编码样本: {os.path.basename(input_file)}")
+        threading.Thread(target=self.sample_preview_thread, args=(input_file, settings), daemon=True).start()
+    
+    def sample_preview_thread(self, input_file, settings):
+        """在工作线程中按主线程读取的设置编码样本，结果通过事件总线显示"""
+        try:
+            from sample_preview import describe_preview, run_sample_preview
+            engine = ConverterEngine(
+                self.ffmpeg_path, settings, log=self.log,
+                metadata=self.metadata, probe_cache=self.probe_cache
+            )
+            result = run_sample_preview(engine, input_file)
+            # 注明样本使用的设置，修改设置后可以再次预览比较
+            label = f"质量 {settings.quality}"
+            if settings.sr_enabled:
+                label += f"，超分 {settings.sr_scale}"
+            summary = f"{describe_preview(result)} [{label}]"
+            self.log(summary)
+            self.sample_results[input_file] = summary
+            self.events.call(self.status_var.set, summary)
+            self.events.call(self.update_preview)
+        except Exception as e:
+            self.log(f"样本预览失败: {str(e)}")
+            self.events.call(self.status_var.set, "样本预览失败")
+        finally:
+            self.events.call(self.set_buttons_state, 'normal')
+    
+    def set_buttons_state(self, state):
+        """递归设置窗口中所有按钮的状态（批次控制按钮除外）"""
+        def apply(parent):
+            for widget in parent.winfo_children():
+                if isinstance(widget, tk.Button) and widget not in self.batch_buttons:
+                    widget.config(state=state)
+                # 递归检查子框架
+                if widget.winfo_children():
+                    apply(widget)
+        
+        apply(self.root)
+    
+    def set_batch_controls(self, state):
+        for button in self.batch_buttons:
+            button.config(state=state)
+        if state == 'disabled':
+            self.paused = False
+            self.pause_button.config(text="暂停")
+    
+    def toggle_pause(self):
+        """暂停时挂起正在运行的ffmpeg进程，继续时恢复"""
+        if not self.engine:
+            return
+        if self.paused:
+            self.engine.resume()
+            self.paused = False
+            self.pause_button.config(text="暂停")
+            self.status_var.set("已继续")
+        elif self.engine.pause():
+            self.paused = True
+            self.pause_button.config(text="继续")
+            self.status_var.set("已暂停")
+    
+    def get_selected_file(self):
+        input_file = self.file_list.selected_item()
+        if input_file is None:
+            messagebox.showinfo("提示", "请先在列表中单击选择一个文件")
+        return input_file
+    
+    def prioritize_selected(self):
+        """把选中的文件提到队列最前；不在当前批次中的文件（如转码开始后添加的）加入批次"""
+        engine = self.engine
+        input_file = self.get_selected_file()
+        if not engine or input_file is None:
+            return
+        if engine.set_priority(input_file, URGENT_PRIORITY):
+            self.log(f"优先处理: {os.path.basename(input_file)}")
+            return
+        
+        def add_thread():
+            # 加入批次前需要探测元数据，不在主线程中进行
+            if not engine.add_job(input_file, URGENT_PRIORITY):
+                self.log(f"无法优先处理 {os.path.basename(input_file)}: 文件已处理完成或批次已结束")
+        
+        threading.Thread(target=add_thread, daemon=True).start()
+    
+    def cancel_selected(self):
+        input_file = self.get_selected_file()
+        if self.engine and input_file is not None and not self.engine.cancel(input_file):
+            self.log(f"{os.path.basename(input_file)} 不在队列中或已处理完成")
+    
+    def cancel_all(self):
+        if self.engine and messagebox.askyesno("取消全部", "确定取消所有未完成的文件吗？正在转码的文件将被终止。"):
+            self.engine.cancel_all()
+    
+    def show_progress(self, input_file, file_progress, batch_progress):
+        """显示单个文件的进度、速度和批次的预计剩余时间"""
+        parts = [os.path.basename(input_file)]
+        if file_progress["percent"] is not None:
+            parts.append(f"{file_progress['percent']:.1f}%")
+        if file_progress["fps"]:
+            parts.append(f"{file_progress['fps']:.0f} fps")
+        if file_progress["speed"]:
+            parts.append(f"{file_progress['speed']:.2f}x")
+        self.status_var.set(" · ".join(parts))
+        
+        if batch_progress:
+            self.show_batch_progress(batch_progress)
+    
+    def show_batch_progress(self, batch_progress):
+        """按已处理的媒体时长更新总进度条和预计剩余时间"""
+        percent = batch_progress["percent"]
+        self.progress_var.set(percent)
+        self.progress_percent.set(f"{int(percent)}%  剩余 {format_eta(batch_progress['eta'])}")
+    
+    def conversion_thread(self, settings, batch_id=None):
+        """
+        在工作线程中运行批量转码，所有界面更新都通过事件总线投递到主线程
+        
+        settings 由 start_conversion 在主线程中读取；batch_id 为恢复的批次ID
+        """
+        try:
+            # 转码期间仍可继续添加文件，使用开始时的列表快照
+            video_files = list(self.video_files)
+            
+            def on_progress(input_file, file_progress, batch_progress):
+                # 进度更新频繁，只以固定频率显示最新值
+                self.events.coalesce("progress", self.show_progress, input_file, file_progress, batch_progress)
+            
+            engine = ConverterEngine(
+                self.ffmpeg_path, settings, log=self.log, on_progress=on_progress,
+                metadata=self.metadata, probe_cache=self.probe_cache, telemetry=self.telemetry
+            )
+            self.engine = engine
+            self.events.call(self.set_batch_controls, 'normal')
+            
+            def on_start(input_file, progress):
+                state = progress.snapshot()
+                self.events.coalesce(
+                    "status", self.status_var.set,
+                    f"正在处理 {state['completed'] + len(state['running'])}/{state['total']}: {os.path.basename(input_file)}"
+                )
+            
+            def on_finish(input_file, success, progress):
+                # 更新进度
+                self.events.coalesce("batch", self.show_batch_progress, engine.batch_eta.snapshot())
+            
+            progress, results = engine.run_batch(
+                video_files, on_start=on_start, on_finish=on_finish, journal=self.journal, batch_id=batch_id
+            )
+            successful_count = progress.succeeded
+            total_files = progress.total
+            cancelled_count = sum(1 for r in results if r["cancelled"])
+            
+            # 完成转码，先丢弃尚未显示的进度，避免覆盖最终状态
+            for key in ("progress", "status", "batch"):
+                self.events.discard(key)
+            self.events.call(self.progress_var.set, 100)
+            self.events.call(self.progress_percent.set, "100%")
+            summary = f"成功: {successful_count}/{total_files}"
+            if cancelled_count:
+                summary += f"，已取消: {cancelled_count}"
+            self.events.call(self.status_var.set, f"转码完成: {summary}")
+            self.events.call(messagebox.showinfo, "完成", f"转码完成\n{summary}")
+            
+        except Exception as e:
+            self.log(f"转码过程中发生错误: {str(e)}")
+            self.events.call(messagebox.showerror, "错误", f"转码过程中发生错误: {str(e)}")
+        
+        finally:
+            # 重新启用所有按钮
+            self.engine = None
+            self.events.call(self.set_batch_controls, 'disabled')
+            self.events.call(self.set_buttons_state, 'normal')
+
+def main():
+    trace = StartupTrace()
+    # 使用标准Tk创建窗口，TkinterDnD2在窗口显示后再加载到同一个解释器中
+    with trace.phase("创建窗口"):
+        root = tk.Tk()
+    
+    app = VideoConverter(root, trace)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+监视文件夹模式
+定期扫描输入目录，文件大小和修改时间在一段时间内保持不变后视为写入完成，
+交给固定数量的工作线程转码。新文件随时加入，已转码且未变化的文件由输出清单跳过；
+正在转码的文件再次被修改时，等当前转码结束后再重新处理，不会有两个任务同时写入同一个输出。
+此模块不依赖tkinter。
+"""
+
+import os
+import queue
+import threading
+import time
+
+from encode_pool import cpu_count, split_thread_budget
+from output_manifest import OutputManifest
+
+# 扫描输入目录的间隔（秒）
+POLL_INTERVAL = 1.0
+
+# 文件大小和修改时间保持不变多久后视为写入完成（秒）
+STABLE_SECONDS = 3.0
+
+
+class FolderWatcher:
+    """轮询输入目录，找出已经写入完成的视频文件"""
+
+    def __init__(self, input_dirs, is_candidate, exclude_dirs=(), stable_seconds=STABLE_SECONDS):
+        """
+        参数:
+            input_dirs: 监视的目录列表
+            is_candidate: 判断文件是否需要处理的函数（如 is_video_file）
+            exclude_dirs: 不扫描的目录，例如位于输入目录中的输出目录
+            stable_seconds: 文件保持不变多久后视为写入完成
+        """
+        self.input_dirs = [os.path.abspath(d) for d in input_dirs]
+        self.is_candidate = is_candidate
+        self.exclude_dirs = {os.path.abspath(d) for d in exclude_dirs}
+        self.stable_seconds = stable_seconds
+        self.observed = {}  # 路径 -> (大小, 修改时间, 首次观察到该状态的时间)
+        self.delivered = {}  # 路径 -> 交付时的 (大小, 修改时间)
+
+    def scan(self, now=None):
+        """
+        扫描一次输入目录
+
+        返回:
+            新近写入完成（或完成后又被修改）的文件路径列表
+        """
+        now = now if now is not None else time.monotonic()
+        seen = set()
+        ready = []
+        for input_dir in self.input_dirs:
+            if input_dir in self.exclude_dirs:
+                continue
+            try:
+                entries = list(os.scandir(input_dir))
+            except OSError:
+                continue
+            for entry in entries:
+                # 隐藏文件通常是正在传输的临时文件
+                if entry.name.startswith(".") or not self.is_candidate(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+
+                path = entry.path
+                seen.add(path)
+                state = (stat.st_size, stat.st_mtime_ns)
+                previous = self.observed.get(path)
+                if previous is None or previous[:2] != state:
+                    self.observed[path] = state + (now,)
+                    continue
+                if (stat.st_size > 0 and now - previous[2] >= self.stable_seconds
+                        and self.delivered.get(path) != state):
+                    self.delivered[path] = state
+                    ready.append(path)
+
+        # 已删除的文件不再跟踪
+        for path in list(self.observed):
+            if path not in seen:
+                del self.observed[path]
+                self.delivered.pop(path, None)
+        return sorted(ready)
+
+
+class WatchService:
+    """把监视到的文件交给固定数量的工作线程转码"""
+
+    def __init__(self, engine, input_dirs, is_candidate, stable_seconds=STABLE_SECONDS,
+                 poll_interval=POLL_INTERVAL, on_finish=None):
+        """
+        参数:
+            engine: ConverterEngine实例
+            input_dirs: 监视的目录列表
+            is_candidate: 判断文件是否需要处理的函数
+            stable_seconds: 文件保持不变多久后视为写入完成
+            poll_interval: 扫描间隔（秒）
+            on_finish: 每个文件处理完成后的回调 on_finish(input_file, success, latency)
+        """
+        self.engine = engine
+        self.settings = engine.settings
+        self.poll_interval = poll_interval
+        self.on_finish = on_finish
+        self.watcher = FolderWatcher(input_dirs, is_candidate, exclude_dirs=[self.settings.output_dir],
+                                     stable_seconds=stable_seconds)
+        self.jobs = engine.resolved_jobs()
+        self.threads_per_job = split_thread_budget(cpu_count(), self.jobs)
+        self.queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.workers = []
+        self.lock = threading.Lock()
+        self.queued = set()  # 已排队、尚未开始的文件
+        self.running = set()  # 正在转码的文件
+        self.rerun = {}  # 转码期间又被修改的文件 -> 发现修改的时间，当前转码结束后重新排队
+
+    def start(self):
+        if self.settings.skip_up_to_date:
+            self.engine.manifest = OutputManifest(self.settings.output_dir)
+        for _ in range(self.jobs):
+            worker = threading.Thread(target=self.worker_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        self.engine.log(f"开始监视: {', '.join(self.watcher.input_dirs)}（{self.jobs} 个并行任务）")
+
+    def dispatch(self, path, detected):
+        """把写入完成的文件交给工作线程；已排队的文件不重复排队，正在转码的文件在结束后重新排队"""
+        with self.lock:
+            if path in self.queued:
+                # 开始转码时才读取元数据，会处理到最新的内容
+                return
+            if path in self.running:
+                self.rerun[path] = detected
+                self.engine.log(f"文件在转码期间被修改，完成后重新处理: {os.path.basename(path)}")
+                return
+            self.queued.add(path)
+        self.queue.put((path, detected))
+
+    def stop(self):
+        """停止扫描，放弃尚未开始的文件，等待正在转码的文件完成"""
+        self.stop_event.set()
+        dropped = 0
+        with self.lock:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                dropped += 1
+            self.queued.clear()
+            self.rerun.clear()
+        if dropped:
+            self.engine.log(f"放弃 {dropped} 个尚未开始的文件")
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def run(self):
+        """持续扫描直到 stop() 被调用或收到 KeyboardInterrupt"""
+        self.start()
+        try:
+            while not self.stop_event.is_set():
+                for path in self.watcher.scan():
+                    self.engine.log(f"发现新文件: {os.path.basename(path)}")
+                    self.dispatch(path, time.monotonic())
+                self.stop_event.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            self.engine.log("正在停止监视，等待当前任务完成...")
+        finally:
+            self.stop()
+
+    def worker_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            input_file, detected = item
+            with self.lock:
+                self.queued.discard(input_file)
+                self.running.add(input_file)
+            success = False
+            started = time.monotonic()
+            try:
+                # 文件内容可能已变化，重新读取元数据
+                self.engine.metadata.pop(input_file, None)
+                self.engine.queued_at[input_file] = detected
+                outputs = self.settings.output_files(input_file)
+                success = self.engine.fix_iphone_video(input_file, outputs[0], self.threads_per_job)
+                if input_file in self.engine.skipped_files:
+                    self.engine.skipped_files.discard(input_file)
+                    state = "skipped"
+                else:
+                    state = "done" if success else "failed"
+                self.engine.record_job(input_file, outputs if len(outputs) > 1 else outputs[0], state, started)
+            except Exception as e:
+                self.engine.log(f"转码错误: {str(e)}")
+            finally:
+                with self.lock:
+                    self.running.discard(input_file)
+                    modified = self.rerun.pop(input_file, None)
+                if self.on_finish:
+                    self.on_finish(input_file, success, time.monotonic() - detected)
+                if modified is not None and not self.stop_event.is_set():
+                    self.dispatch(input_file, modified)